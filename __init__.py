@@ -1,20 +1,42 @@
 from .py.read_xmp_metadata import ReadXMPMetadata
+from .py.read_xmp_metadata_batch import ReadXMPMetadataBatch
 from .py.write_xmp_metadata import WriteXMPMetadataLossless
+from .py.write_xmp_metadata_lossless import WriteXMPMetadataLossless as WriteXMPMetadataLosslessAdvanced
 from .py.write_xmp_tensor import WriteXMPMetadataTensor
+from .py.query_xmp_index import QueryXMPIndex
+from .py.xmp_watcher import WatchXMPDirectory
+from .py.write_pipeline import XMPWriteQueue
+from .py.bulk_writer import WriteXMPMetadataBulk
+from .py.instrumentation import register_routes
 
 # Définition des mappings directement dans __init__.py
 NODE_CLASS_MAPPINGS = {
     "ReadXMPMetadata": ReadXMPMetadata,
+    "ReadXMPMetadataBatch": ReadXMPMetadataBatch,
     "WriteXMPMetadataLossless": WriteXMPMetadataLossless,
-    "WriteXMPMetadataTensor": WriteXMPMetadataTensor
+    "WriteXMPMetadataLosslessAdvanced": WriteXMPMetadataLosslessAdvanced,
+    "WriteXMPMetadataTensor": WriteXMPMetadataTensor,
+    "QueryXMPIndex": QueryXMPIndex,
+    "WatchXMPDirectory": WatchXMPDirectory,
+    "XMPWriteQueue": XMPWriteQueue,
+    "WriteXMPMetadataBulk": WriteXMPMetadataBulk
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "ReadXMPMetadata": "Read XMP Metadata",
+    "ReadXMPMetadataBatch": "Read XMP Metadata (Batch)",
     "WriteXMPMetadataLossless": "Write XMP Metadata (Lossless)",
-    "WriteXMPMetadataTensor": "Write XMP Metadata"
+    "WriteXMPMetadataLosslessAdvanced": "Write XMP Metadata (Lossless Advanced)",
+    "WriteXMPMetadataTensor": "Write XMP Metadata",
+    "QueryXMPIndex": "Query XMP Index",
+    "WatchXMPDirectory": "Watch XMP Directory",
+    "XMPWriteQueue": "XMP Write Queue",
+    "WriteXMPMetadataBulk": "Write XMP Metadata (Bulk)"
 }
 
+# Mesures des étapes exposées sur /too_xmp/metrics (uniquement si TOO_XMP_METRICS=1)
+register_routes()
+
 # Define the web directory for ComfyUI to find our JavaScript files
 WEB_DIRECTORY = "./web"
 
@@ -0,0 +1,97 @@
+"""
+Benchmark des presets d'encodage du nœud Write XMP Metadata.
+
+Pour chaque preset et chaque format (PNG, JPEG, WebP), mesure le temps d'encodage
+et la taille du fichier sur des images représentatives de générations: rendu
+"photo" (dégradés + grain) et illustration (aplats, contours nets), en 1024x1024
+et en 4K. Des images réelles peuvent être ajoutées avec --corpus.
+
+Usage: python benchmarks/bench_encoders.py [--corpus D:/outputs] [--repeat 3]
+"""
+import io
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from py.read_xmp_metadata_batch import IMAGE_EXTENSIONS
+from py.write_xmp_tensor import WriteXMPMetadataTensor
+
+FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+
+def generated_images(sizes):
+    rng = np.random.default_rng(0)
+    images = []
+    for width, height in sizes:
+        grid = (rng.random((6, 6, 3)) * 255).astype(np.uint8)
+        smooth = np.asarray(Image.fromarray(grid).resize((width, height), Image.BICUBIC), dtype=np.float32)
+        photo = np.clip(smooth + rng.normal(0, 6, smooth.shape), 0, 255).astype(np.uint8)
+        images.append((f"photo {width}x{height}", photo))
+
+        palette = rng.integers(0, 256, (16, 3), dtype=np.uint8)
+        labels = rng.integers(0, 16, (24, 24), dtype=np.uint8)
+        labels = np.asarray(Image.fromarray(labels).resize((width, height), Image.NEAREST))
+        images.append((f"illustration {width}x{height}", palette[labels]))
+    return images
+
+
+def folder_images(directory, limit):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        try:
+            with Image.open(os.path.join(directory, name)) as image:
+                images.append((name, np.asarray(image.convert("RGB"))))
+        except Exception:
+            continue
+        if len(images) >= limit:
+            break
+    return images
+
+
+def encode(array, image_format, options, repeat):
+    image = Image.fromarray(array)
+    timings = []
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        image.save(buffer, format=image_format, **options)
+        timings.append(time.perf_counter() - start)
+    return min(timings), buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="", help="Dossier d'images à ajouter (ex: sorties ComfyUI)")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-4k", action="store_true", help="Ne pas tester les images 4K")
+    args = parser.parse_args()
+
+    sizes = [(1024, 1024)] if args.no_4k else [(1024, 1024), (3840, 2160)]
+    images = generated_images(sizes)
+    if args.corpus:
+        images.extend(folder_images(args.corpus, args.limit))
+
+    presets = list(WriteXMPMetadataTensor.ENCODER_PRESETS)
+    for label, array in images:
+        print(f"\n{label}")
+        print(f"  {'format':<8}" + "".join(f"{preset:>22}" for preset in presets))
+        for name, image_format in FORMATS.items():
+            cells = []
+            for preset in presets:
+                options = WriteXMPMetadataTensor.encoder_settings(preset)[name]
+                seconds, size = encode(array, image_format, options, args.repeat)
+                cells.append(f"{seconds * 1000:8.0f} ms {size / 1024:8.0f} Ko")
+            print(f"  {name:<8}" + "".join(f"{cell:>22}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
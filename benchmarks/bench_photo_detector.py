@@ -0,0 +1,130 @@
+"""
+Benchmark de la détection photo/illustration du mode "Smart format".
+
+Compare l'ancienne heuristique (redimensionnement PIL 100x100 + np.unique(axis=0))
+à WriteXMPMetadataTensor._is_photo_like (sous-échantillonnage à pas fixe, couleurs
+24 bits): latence par image 1024x1024 et 4K, et taux d'accord entre les deux.
+Le corpus est synthétique (photos bruitées, aplats, dégradés), complété par les
+images d'un dossier avec --corpus.
+
+Usage: python benchmarks/bench_photo_detector.py [--corpus D:/images] [--repeat 20]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from py.read_xmp_metadata_batch import IMAGE_EXTENSIONS
+from py.write_xmp_tensor import WriteXMPMetadataTensor
+
+SIZES = {"1024x1024": (1024, 1024), "3840x2160": (2160, 3840)}
+
+
+def legacy_is_photo_like(img_array):
+    """Ancienne heuristique, telle qu'elle était dans write_xmp_tensor.py"""
+    try:
+        img_small = Image.fromarray(img_array).resize((100, 100))
+        img_array_small = np.array(img_small)
+        if len(img_array_small.shape) == 3:
+            std_dev = np.std(img_array_small)
+            flat = img_array_small.reshape(-1, img_array_small.shape[2])
+            unique_ratio = np.unique(flat, axis=0).shape[0] / flat.shape[0]
+            return std_dev > 40 and unique_ratio > 0.5
+        return False
+    except Exception:
+        return False
+
+
+def smooth_field(rng, height, width, cells=8):
+    """Champ RGB basse fréquence (interpolation d'une petite grille aléatoire)"""
+    grid = (rng.random((cells, cells, 3)) * 255).astype(np.uint8)
+    return np.asarray(Image.fromarray(grid).resize((width, height), Image.BICUBIC), dtype=np.float32)
+
+
+def synthetic_corpus(height, width, count, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for index in range(count):
+        kind = index % 4
+        if kind == 0:
+            # Photo: scène lisse + bruit de capteur
+            image = smooth_field(rng, height, width) + rng.normal(0, 10, (height, width, 3))
+        elif kind == 1:
+            # Illustration: aplats d'une petite palette
+            palette = rng.integers(0, 256, (12, 3))
+            labels = np.asarray(Image.fromarray(rng.integers(0, 12, (16, 16), dtype=np.uint8)).resize(
+                (width, height), Image.NEAREST))
+            image = palette[labels].astype(np.float32)
+        elif kind == 2:
+            # Rendu lisse sans bruit (dégradés)
+            image = smooth_field(rng, height, width, cells=4)
+        else:
+            # Illustration avec léger grain (cas limite)
+            palette = rng.integers(0, 256, (24, 3))
+            labels = np.asarray(Image.fromarray(rng.integers(0, 24, (32, 32), dtype=np.uint8)).resize(
+                (width, height), Image.NEAREST))
+            image = palette[labels] + rng.normal(0, 3, (height, width, 3))
+        corpus.append((f"synthétique-{kind}-{index}", np.clip(image, 0, 255).astype(np.uint8)))
+    return corpus
+
+
+def folder_corpus(directory, limit):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        try:
+            with Image.open(os.path.join(directory, name)) as image:
+                corpus.append((name, np.asarray(image.convert("RGB"))))
+        except Exception:
+            continue
+        if len(corpus) >= limit:
+            break
+    return corpus
+
+
+def best_time(function, image, repeat):
+    function(image)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(image)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="", help="Dossier d'images réelles à ajouter au corpus")
+    parser.add_argument("--count", type=int, default=16, help="Images synthétiques par taille")
+    parser.add_argument("--limit", type=int, default=200, help="Nombre maximal d'images du dossier")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    detector = WriteXMPMetadataTensor()
+
+    print(f"{'taille':<12}{'ancienne':>12}{'nouvelle':>12}{'accord':>10}")
+    for label, (height, width) in SIZES.items():
+        corpus = synthetic_corpus(height, width, args.count)
+        legacy = [best_time(legacy_is_photo_like, image, args.repeat) for _, image in corpus]
+        current = [best_time(detector._is_photo_like, image, args.repeat) for _, image in corpus]
+        agree = sum(legacy_is_photo_like(image) == detector._is_photo_like(image) for _, image in corpus)
+        print(f"{label:<12}{np.median(legacy) * 1000:>9.2f} ms{np.median(current) * 1000:>9.2f} ms"
+              f"{agree:>6}/{len(corpus)}")
+
+    if args.corpus:
+        corpus = folder_corpus(args.corpus, args.limit)
+        disagreements = [name for name, image in corpus
+                         if legacy_is_photo_like(image) != detector._is_photo_like(image)]
+        print(f"\n{args.corpus}: accord sur {len(corpus) - len(disagreements)}/{len(corpus)} image(s)")
+        for name in disagreements:
+            print(f"  désaccord: {name}")
+
+
+if __name__ == "__main__":
+    main()
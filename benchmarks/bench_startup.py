@@ -0,0 +1,86 @@
+"""
+Benchmark du coût de démarrage: import du paquet de nœuds tel que ComfyUI le charge,
+et instanciation répétée d'ExifToolManager (recherche d'ExifTool mémorisée).
+
+Chaque mesure d'import est faite dans un interpréteur neuf. Le script indique aussi
+les modules lourds (numpy, torch, PIL, watchdog) chargés par l'import, et échoue
+(code de retour 1) si le temps d'import médian dépasse --target-ms.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--target-ms 150]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["numpy", "torch", "PIL", "watchdog"]
+
+# Import du dossier du dépôt comme paquet (ComfyUI charge custom_nodes/<dossier>/__init__.py)
+CHILD = r"""
+import sys, json, time, importlib.util
+root = sys.argv[1]
+heavy = sys.argv[2].split(",")
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("too_xmp_metadata", root + "/__init__.py",
+                                              submodule_search_locations=[root])
+module = importlib.util.module_from_spec(spec)
+sys.modules["too_xmp_metadata"] = module
+spec.loader.exec_module(module)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "nodes": len(module.NODE_CLASS_MAPPINGS),
+                  "heavy": [name for name in heavy if name in sys.modules]}))
+"""
+
+
+def measure_import():
+    result = subprocess.run([sys.executable, "-c", CHILD, ROOT, ",".join(HEAVY_MODULES)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_discovery(count):
+    """Temps d'instanciation d'ExifToolManager: la première recherche, puis les suivantes (mémorisées)"""
+    sys.path.insert(0, ROOT)
+    from py.exiftool_manager import ExifToolManager
+
+    start = time.perf_counter()
+    ExifToolManager()
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        ExifToolManager()
+    following = (time.perf_counter() - start) / count
+    return first, following, ExifToolManager.get_exiftool_path(), ExifToolManager.get_exiftool_version()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=150.0, help="Temps d'import médian maximal")
+    args = parser.parse_args()
+
+    runs = [measure_import() for _ in range(args.repeat)]
+    median_ms = statistics.median(run["seconds"] for run in runs) * 1000
+    heavy = runs[-1]["heavy"]
+    print(f"Import du paquet ({runs[-1]['nodes']} nœuds): médiane {median_ms:.1f} ms "
+          f"(min {min(run['seconds'] for run in runs) * 1000:.1f} ms, {args.repeat} essais)")
+    print(f"Modules lourds chargés à l'import: {', '.join(heavy) if heavy else 'aucun'}")
+
+    first, following, path, version = measure_discovery(1000)
+    print(f"ExifToolManager(): 1er appel {first * 1000:.1f} ms, suivants {following * 1e6:.1f} µs "
+          f"(ExifTool: {path or 'non trouvé'}{f', version {version}' if version else ''})")
+
+    if median_ms > args.target_ms:
+        print(f"/!\\ Import plus lent que l'objectif ({median_ms:.1f} ms > {args.target_ms:.0f} ms)")
+        return 1
+    print(f"[OK] Import sous l'objectif de {args.target_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark de la conversion tenseur IMAGE -> uint8 du nœud Write XMP Metadata.
+
+Compare l'ancienne conversion (np.clip(i * 255, 0, 255).astype(np.uint8) image par image)
+à frames_to_uint8 (tampons réutilisés), en temps et en pic mémoire supplémentaire.
+Chaque mesure mémoire est faite dans un sous-processus (pic RSS, Linux/macOS).
+
+Usage: python benchmarks/bench_tensor_convert.py [--size 3840x2160] [--batch 4] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+
+from py.image_convert import frames_to_uint8
+
+
+def legacy_convert(images):
+    frames = images if len(images.shape) == 4 else images.unsqueeze(0)
+    return [np.clip(frame.cpu().numpy() * 255.0, 0, 255).astype(np.uint8) for frame in frames]
+
+
+CASES = {"legacy": legacy_convert, "frames_to_uint8": frames_to_uint8}
+
+
+def make_batch(width, height, batch, channels):
+    generator = torch.Generator().manual_seed(0)
+    images = torch.rand((batch, height, width, channels), generator=generator)
+    # Quelques valeurs hors de [0, 1] pour vérifier le clip (en place: pas de pic mémoire avant la mesure)
+    return images.mul_(1.1).sub_(0.05)
+
+
+def peak_rss_bytes():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_child(case, width, height, batch, channels):
+    """Mesure le pic mémoire ajouté par une conversion, dans un processus neuf"""
+    images = make_batch(width, height, batch, channels)
+    before = peak_rss_bytes()
+    arrays = CASES[case](images)
+    after = peak_rss_bytes()
+    output_bytes = sum(array.nbytes for array in arrays)
+    print(json.dumps({"extra_peak": after - before, "output_bytes": output_bytes}))
+
+
+def measure_memory(case, width, height, batch, channels):
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        return None
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", case, "--size", f"{width}x{height}",
+         "--batch", str(batch), "--channels", str(channels)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="3840x2160")
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", choices=sorted(CASES))
+    args = parser.parse_args()
+    width, height = (int(value) for value in args.size.lower().split("x"))
+
+    if args.child:
+        run_child(args.child, width, height, args.batch, args.channels)
+        return
+
+    # Sous Linux, le pic RSS d'un sous-processus part de celui du parent au moment du fork:
+    # les mesures mémoire sont donc faites avant d'allouer le batch dans ce processus.
+    memory = {case: measure_memory(case, width, height, args.batch, args.channels) for case in CASES}
+
+    images = make_batch(width, height, args.batch, args.channels)
+    reference = legacy_convert(images)
+    converted = frames_to_uint8(images)
+    expected = [array[..., 0] if array.shape[-1] == 1 else array for array in reference]
+    identical = all(np.array_equal(a, b) for a, b in zip(expected, converted))
+
+    print(f"Batch {args.batch} x {width}x{height}x{args.channels} - résultats identiques: {identical}")
+    print(f"{'conversion':<18}{'temps/batch':>14}{'temps/image':>14}{'pic mémoire en plus':>22}")
+    for case, convert in CASES.items():
+        convert(images)  # échauffement
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            convert(images)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        extra = f"{memory[case]['extra_peak'] / 2**20:.1f} Mo" if memory[case] else "n/a"
+        print(f"{case:<18}{best * 1000:>11.1f} ms{best * 1000 / args.batch:>11.1f} ms{extra:>22}")
+
+
+if __name__ == "__main__":
+    main()
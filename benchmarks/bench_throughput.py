@@ -0,0 +1,239 @@
+"""
+Benchmark de débit lecture/écriture des nœuds XMP, par backend, format et taille.
+
+Génère un corpus synthétique PNG/JPEG/WebP (plusieurs tailles d'image et nombres de
+tags, XMP inséré nativement, sans ExifTool), puis mesure la latence par fichier et
+le nombre de fichiers par seconde de:
+  - ExifToolManager.extract_metadata          (native, exiftool, et cache chaud)
+  - ExifToolManager.extract_all_xmp_metadata  (native, exiftool)
+  - le nœud Lossless                          (Splice, ExifTool)
+  - le nœud Write XMP Metadata (tenseur)      (Native, ExifTool)
+Les cas ExifTool sont ignorés si l'exécutable est absent, le cas tenseur si torch
+n'est pas installé. Tout fonctionne hors ligne.
+
+Les résultats sont écrits en JSON (--output) avec le commit courant, pour comparer
+deux versions: --compare ancien.json affiche l'écart de débit de chaque cas.
+
+Usage: python benchmarks/bench_throughput.py [--files 20] [--sizes 512x512,2048x2048]
+       [--tags 10,500] [--formats png,jpeg,webp] [--output results.json] [--compare base.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from PIL import Image
+
+from py.exiftool_manager import ExifToolManager
+from py.write_xmp_metadata_lossless import WriteXMPMetadataLossless
+from py.xmp_container import build_splice_plan, write_plan
+from py.xmp_packet import XMPDocument
+
+FORMATS = {"png": ("PNG", ".png"), "jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+
+
+def make_image(width, height, seed):
+    """Image lisse + bruit (compression réaliste, sans coût de génération excessif)"""
+    rng = np.random.default_rng(seed)
+    grid = (rng.random((6, 6, 3)) * 255).astype(np.uint8)
+    smooth = np.asarray(Image.fromarray(grid).resize((width, height), Image.BICUBIC), dtype=np.int16)
+    noise = rng.integers(-8, 9, smooth.shape, dtype=np.int16)
+    return np.clip(smooth + noise, 0, 255).astype(np.uint8)
+
+
+def make_corpus(directory, image_format, width, height, tag_count, files):
+    """Écrit `files` images avec un paquet XMP de `tag_count` tags et une description"""
+    pil_format, extension = FORMATS[image_format]
+    document = XMPDocument()
+    document.apply_edits([("XMP-dc:Subject", "+=", f"tag_{index:05d}") for index in range(tag_count)]
+                         + [("XMP-dc:Description", "=", "benchmark " * 20)])
+    packet = document.to_bytes()
+
+    encoded = io.BytesIO()
+    Image.fromarray(make_image(width, height, seed=width * height + tag_count)).save(encoded, format=pil_format)
+    plan = build_splice_plan(encoded, packet)
+    first = os.path.join(directory, f"image_00000{extension}")
+    with open(first, "wb") as output_file:
+        write_plan(encoded, output_file, plan)
+
+    paths = [first]
+    for index in range(1, files):
+        path = os.path.join(directory, f"image_{index:05d}{extension}")
+        shutil.copyfile(first, path)
+        paths.append(path)
+    return paths
+
+
+def measure(function, paths):
+    """Exécute function(chemin) sur chaque fichier, sortie console masquée"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for path in paths:
+            function(path)
+        seconds = time.perf_counter() - start
+    return {
+        "files": len(paths),
+        "seconds": round(seconds, 6),
+        "per_file_ms": round(seconds * 1000 / max(1, len(paths)), 4),
+        "files_per_sec": round(len(paths) / seconds, 2) if seconds else None,
+    }
+
+
+def read_cases(manager, has_exiftool):
+    cases = []
+    for backend in ("native", "exiftool"):
+        if backend == "exiftool" and not has_exiftool:
+            continue
+        cases.append((f"extract_metadata[{backend}]", backend,
+                      lambda path, backend=backend: manager.extract_metadata(path, backend=backend)))
+        cases.append((f"extract_all_xmp_metadata[{backend}]", backend,
+                      lambda path, backend=backend: manager.extract_all_xmp_metadata(path, backend=backend)))
+    return cases
+
+
+def write_cases(output_directory, tags, has_exiftool):
+    cases = []
+    lossless = WriteXMPMetadataLossless()
+    methods = ["Splice", "ExifTool"] if has_exiftool else ["Splice"]
+    for method in methods:
+        cases.append((f"lossless[{method}]", method,
+                      lambda path, method=method: lossless.write_xmp(
+                          path, tags, output_directory=os.path.join(output_directory, f"lossless_{method}"),
+                          write_method=method)))
+
+    try:
+        import torch
+        from py.write_xmp_tensor import WriteXMPMetadataTensor
+    except ImportError:
+        print("/!\\ torch non installé: cas du nœud tenseur ignorés")
+        return cases
+
+    tensor_writer = WriteXMPMetadataTensor()
+    backends = ["Native", "ExifTool"] if has_exiftool else ["Native"]
+    for backend in backends:
+        def write_tensor(path, backend=backend):
+            with Image.open(path) as image:
+                tensor = torch.from_numpy(np.asarray(image.convert("RGB"), dtype=np.float32) / 255.0)[None]
+            return tensor_writer.write_xmp(
+                tensor, tags, format_mode="Preserve format", input_image_path=path,
+                output_directory=os.path.join(output_directory, f"tensor_{backend}"), backend=backend)
+        cases.append((f"tensor_writer[{backend}]", backend, write_tensor))
+    return cases
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=False)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def case_key(result):
+    return (result["case"], result["format"], result["size"], result["tags"])
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = {case_key(result): result for result in json.load(baseline_file)["results"]}
+    print(f"\nComparaison avec {baseline_path} (fichiers/s)")
+    for result in results:
+        before = baseline.get(case_key(result))
+        if not before or not before["files_per_sec"] or not result["files_per_sec"]:
+            continue
+        change = (result["files_per_sec"] / before["files_per_sec"] - 1) * 100
+        print(f"  {result['case']:<36}{result['format']:<6}{result['size']:>11}{result['tags']:>6} tags"
+              f"{before['files_per_sec']:>10.1f} ->{result['files_per_sec']:>10.1f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20, help="Fichiers par corpus")
+    parser.add_argument("--sizes", default="512x512,2048x2048")
+    parser.add_argument("--tags", default="10,500", help="Nombres de tags par image")
+    parser.add_argument("--formats", default="png,jpeg,webp")
+    parser.add_argument("--output", default="", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", default="", help="Résultats JSON d'une version précédente")
+    parser.add_argument("--keep", action="store_true", help="Conserver le corpus généré")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(value) for value in size.lower().split("x")) for size in args.sizes.split(",") if size]
+    tag_counts = [int(value) for value in args.tags.split(",") if value]
+    formats = [value.strip().lower() for value in args.formats.split(",") if value.strip()]
+
+    manager = ExifToolManager()
+    has_exiftool = manager.exiftool_path is not None
+    if not has_exiftool:
+        print("/!\\ ExifTool non trouvé: cas ExifTool ignorés")
+    exiftool_version = ExifToolManager.get_exiftool_version()
+
+    workdir = tempfile.mkdtemp(prefix="xmp_bench_")
+    results = []
+    try:
+        for image_format in formats:
+            for width, height in sizes:
+                for tag_count in tag_counts:
+                    corpus = os.path.join(workdir, f"{image_format}_{width}x{height}_{tag_count}")
+                    os.makedirs(corpus)
+                    paths = make_corpus(corpus, image_format, width, height, tag_count, args.files)
+                    tags = ", ".join(f"new_{index}" for index in range(10))
+                    label = f"{image_format} {width}x{height}, {tag_count} tags"
+
+                    cases = read_cases(manager, has_exiftool)
+                    for name, backend, function in cases:
+                        # Lecture à froid: le cache est vidé avant chaque passe
+                        ExifToolManager.invalidate(*paths)
+                        results.append(dict(measure(function, paths), case=name, backend=backend,
+                                            format=image_format, size=f"{width}x{height}", tags=tag_count))
+                    # Lecture à chaud: mêmes fichiers, servis par le cache
+                    name, backend, function = cases[0]
+                    results.append(dict(measure(function, paths), case="extract_metadata[cached]", backend="cache",
+                                        format=image_format, size=f"{width}x{height}", tags=tag_count))
+
+                    for name, backend, function in write_cases(os.path.join(corpus, "out"), tags, has_exiftool):
+                        results.append(dict(measure(function, paths), case=name, backend=backend,
+                                            format=image_format, size=f"{width}x{height}", tags=tag_count))
+
+                    print(f"\n{label}")
+                    for result in results:
+                        if (result["format"], result["size"], result["tags"]) == (image_format, f"{width}x{height}", tag_count):
+                            print(f"  {result['case']:<36}{result['per_file_ms']:>10.2f} ms/fichier"
+                                  f"{result['files_per_sec'] or 0:>10.1f} fichiers/s")
+    finally:
+        ExifToolManager.shutdown()
+        if args.keep:
+            print(f"\nCorpus conservé dans {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "exiftool": exiftool_version,
+        "files_per_corpus": args.files,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\n[OK] Résultats écrits: {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
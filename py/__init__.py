@@ -0,0 +1,2 @@
+# Paquet des modules des nœuds (paquet classique et non espace de noms: "python -m py.bulk_writer"
+# et les benchmarks ne sont pas masqués par un module "py" installé, ex: le module py.py de pytest)
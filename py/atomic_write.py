@@ -0,0 +1,158 @@
+import os
+import uuid
+import threading
+import contextlib
+
+# fsync des fichiers écrits (puis une fois par dossier après les renommages), via TOO_XMP_FSYNC=1.
+# Sans fsync, le renommage atomique protège déjà d'un arrêt du processus, pas d'une coupure de courant.
+FSYNC = os.environ.get("TOO_XMP_FSYNC", "").strip().lower() in ("1", "true", "yes", "on")
+# Marqueur des fichiers temporaires (ignorés par le parcours des dossiers, l'index et la surveillance)
+TEMP_MARKER = ".xmptmp-"
+
+_locks_guard = threading.Lock()
+# Clé de chemin -> [verrou, nombre d'utilisateurs]
+_path_locks = {}
+
+
+def _lock_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def is_temp_file(path):
+    """Vrai pour un fichier temporaire d'écriture en cours (`.<nom>.xmptmp-<id><ext>`)"""
+    name = os.path.basename(path)
+    return name.startswith(".") and TEMP_MARKER in name
+
+
+def temp_path(output_path):
+    """
+    Chemin temporaire unique dans le dossier de destination (le renommage reste sur le même
+    volume, donc atomique). L'extension est conservée: PIL et ExifTool en déduisent le format.
+    """
+    directory, name = os.path.split(output_path)
+    base, extension = os.path.splitext(name)
+    return os.path.join(directory, f".{base}{TEMP_MARKER}{uuid.uuid4().hex[:12]}{extension}")
+
+
+@contextlib.contextmanager
+def path_locks(paths):
+    """
+    Verrouille des chemins de sortie pour la durée du bloc: deux écritures du même fichier
+    (workers de la file ComfyUI, écriture en masse) se suivent au lieu de s'entremêler.
+    Les verrous sont pris dans un ordre fixe (pas d'interblocage) et libérés dès qu'inutilisés.
+    """
+    entries = []
+    with _locks_guard:
+        for key in sorted({_lock_key(path) for path in paths}):
+            entry = _path_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            entries.append((key, entry))
+    acquired = []
+    try:
+        for _, entry in entries:
+            entry[0].acquire()
+            acquired.append(entry)
+        yield
+    finally:
+        for entry in reversed(acquired):
+            entry[0].release()
+        with _locks_guard:
+            for key, entry in entries:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del _path_locks[key]
+
+
+def _fsync_file(path):
+    # Ouverture en écriture: os.fsync échoue sur un descripteur en lecture seule sous Windows
+    with open(path, "r+b") as synced_file:
+        os.fsync(synced_file.fileno())
+
+
+def _fsync_directory(directory):
+    # Rend le renommage durable (POSIX uniquement, les dossiers ne s'ouvrent pas sous Windows)
+    if os.name != "posix":
+        return
+    descriptor = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class AtomicOutputs:
+    """
+    Écriture transactionnelle d'un ensemble de fichiers: chaque fichier est encodé, copié et
+    étiqueté sous un nom temporaire du dossier de destination, puis renommé d'un coup à sa
+    place (os.replace). Un plantage ou une erreur ne laisse donc jamais de fichier à moitié
+    écrit ou sans métadonnées sous le nom final: les temporaires sont supprimés.
+
+        with AtomicOutputs(output_paths) as outputs:
+            save(outputs.temp(output_path))   # renommés à la sortie du bloc, sans exception
+
+    Utilisé comme contexte, les chemins de sortie sont aussi verrouillés (voir path_locks).
+    Sans contexte (écriture en arrière-plan en plusieurs étapes), appeler commit() ou discard().
+    """
+
+    def __init__(self, output_paths, fsync=None):
+        self.output_paths = list(output_paths)
+        self.temp_paths = {path: temp_path(path) for path in self.output_paths}
+        self.fsync = FSYNC if fsync is None else fsync
+        self._locks = None
+
+    def temp(self, output_path):
+        """Chemin temporaire à écrire à la place d'output_path"""
+        return self.temp_paths[output_path]
+
+    def temps(self, output_paths=None):
+        """Chemins temporaires de plusieurs chemins de sortie (tous par défaut), dans l'ordre"""
+        return [self.temp_paths[path] for path in (self.output_paths if output_paths is None else output_paths)]
+
+    def commit(self):
+        """
+        Renomme les fichiers temporaires écrits à leur place définitive. Avec fsync, chaque
+        fichier est synchronisé avant son renommage, puis chaque dossier une seule fois.
+        Un fichier temporaire absent (non écrit) est ignoré; en cas d'échec, ceux qui restent
+        sont supprimés.
+        """
+        directories = set()
+        try:
+            for output_path, temporary in self.temp_paths.items():
+                if not os.path.exists(temporary):
+                    continue
+                if self.fsync:
+                    _fsync_file(temporary)
+                os.replace(temporary, output_path)
+                directories.add(os.path.dirname(output_path))
+            if self.fsync:
+                for directory in directories:
+                    _fsync_directory(directory)
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        """Supprime les fichiers temporaires restants (après un échec)"""
+        for temporary in self.temp_paths.values():
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"/!\\ Suppression du fichier temporaire impossible: {temporary} ({e})")
+
+    def __enter__(self):
+        self._locks = path_locks(self.output_paths)
+        self._locks.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.discard()
+        finally:
+            locks, self._locks = self._locks, None
+            locks.__exit__(exc_type, exc_value, traceback)
+        return False
@@ -0,0 +1,339 @@
+import os
+import csv
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from .exiftool_manager import ExifToolManager
+from .exiftool_command import ExifToolCommand
+from .write_xmp_metadata_lossless import WriteXMPMetadataLossless
+from .xmp_packet import UnsupportedXMPField
+from .xmp_sidecar import write_sidecar
+from .xmp_index import update_index
+from .atomic_write import AtomicOutputs
+from .instrumentation import timed
+from .tag_list import merge_tags, parse_tags
+
+# Colonnes (CSV) ou clés (JSONL) reconnues du manifeste, les autres sont des champs XMP personnalisés
+PATH_KEYS = ("path", "file", "SourceFile")
+TAG_KEYS = ("tags", "subject", "Subject")
+DESCRIPTION_KEYS = ("description", "Description")
+
+# Nombre de fichiers soumis aux workers à la fois (le manifeste de résultats est écrit au fil de l'eau)
+CHUNK_SIZE = 256
+
+
+def _first(row, keys):
+    for key in keys:
+        if key in row:
+            return row.pop(key)
+    return None
+
+
+def _manifest_rows(manifest_path):
+    """Lit les lignes d'un manifeste CSV ou JSONL (une image par ligne)"""
+    if manifest_path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        with open(manifest_path, "r", encoding="utf-8") as manifest:
+            for line_number, line in enumerate(manifest, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Ligne {line_number} du manifeste invalide: {e}")
+                if not isinstance(row, dict):
+                    raise ValueError(f"Ligne {line_number} du manifeste invalide: objet JSON attendu")
+                yield row
+    else:
+        with open(manifest_path, "r", encoding="utf-8-sig", newline="") as manifest:
+            for row in csv.DictReader(manifest):
+                # Les cellules vides d'un CSV ne modifient pas le champ correspondant
+                yield {key.strip(): value for key, value in row.items()
+                       if key and value is not None and value.strip()}
+
+
+def read_manifest(manifest_path):
+    """
+    Lit un manifeste CSV ou JSONL: chemin -> tags, description et champs personnalisés.
+    Les lignes d'un même fichier sont regroupées (tags cumulés, dernière valeur des autres champs).
+    Les chemins relatifs partent du dossier du manifeste.
+    Retourne une liste ordonnée de dicts {"path", "tags", "description", "fields"}.
+    """
+    base_directory = os.path.dirname(os.path.abspath(manifest_path))
+    entries = {}
+    for row in _manifest_rows(manifest_path):
+        row = dict(row)
+        path = _first(row, PATH_KEYS)
+        if not path:
+            continue
+        path = os.path.normpath(os.path.join(base_directory, str(path).strip().strip('"')))
+        entry = entries.setdefault(path, {"path": path, "tags": [], "description": None, "fields": {}})
+
+        entry["tags"] = merge_tags(entry["tags"], parse_tags(_first(row, TAG_KEYS)))
+        description = _first(row, DESCRIPTION_KEYS)
+        if description is not None:
+            entry["description"] = str(description)
+        fields = row.pop("fields", None)
+        if isinstance(fields, dict):
+            row.update(fields)
+        for key, value in row.items():
+            if value is not None:
+                entry["fields"][key] = ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+    return list(entries.values())
+
+
+def build_edits(entry, write_mode="Add to existing"):
+    """
+    Éditions (tag, opération, valeur) d'une entrée du manifeste, avec les mêmes
+    modes d'écriture que le nœud Lossless.
+    """
+    edits = []
+    tags = entry["tags"]
+    if write_mode == "Add to existing":
+        edits.extend(("XMP-dc:Subject", "+=", tag) for tag in tags)
+    elif write_mode == "Replace all":
+        # Le premier "=" remplace la liste existante, les suivants s'y ajoutent
+        edits.extend(("XMP-dc:Subject", "=", tag) for tag in tags)
+    else:
+        edits.extend(("XMP-dc:Subject", "-=", tag) for tag in tags)
+
+    values = dict(entry["fields"])
+    if entry["description"] is not None:
+        values["XMP-dc:Description"] = entry["description"]
+    for field, value in values.items():
+        field_name = field if ":" in field else f"XMP-dc:{field}"
+        edits.append((field_name, "=", "" if write_mode == "Delete specified" else value))
+    return edits
+
+
+def load_results(result_path):
+    """Chemins déjà traités avec succès d'après un manifeste de résultats existant"""
+    done = set()
+    if not os.path.exists(result_path):
+        return done
+    with open(result_path, "r", encoding="utf-8") as results:
+        for line in results:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # Dernière ligne tronquée par une interruption
+                continue
+            if result.get("status") in ("ok", "skipped"):
+                done.add(result.get("path"))
+    return done
+
+
+class BulkWriter:
+    """
+    Applique un manifeste à un ensemble de fichiers: une commande ExifTool par fichier
+    (ou un remplacement de bloc XMP / un sidecar), exécutées en parallèle sur le pool
+    de sessions ExifTool persistantes. Chaque résultat (statut, durée) est ajouté au
+    manifeste de résultats dès qu'il est connu, ce qui permet de reprendre après une
+    interruption en sautant les fichiers déjà traités.
+    """
+
+    def __init__(self, write_mode="Add to existing", output_mode="Tagged copy", write_method="ExifTool",
+                 output_directory="", sidecar_directory="", workers=0):
+        self.write_mode = write_mode
+        self.output_mode = output_mode
+        self.write_method = write_method
+        self.output_directory = output_directory
+        self.sidecar_directory = sidecar_directory
+        self.manager = ExifToolManager()
+        # Par défaut, autant de fichiers en cours que de sessions ExifTool dans le pool
+        self.workers = workers or ExifToolManager.get_pool_size() or os.cpu_count() or 1
+        self._lossless = WriteXMPMetadataLossless()
+        # Chemin source -> source dont la copie étiquetée occupe déjà son chemin de sortie
+        self._conflicts = {}
+
+    def _output_conflicts(self, entries):
+        """
+        Copies étiquetées en collision: deux fichiers de même nom venant de dossiers
+        différents auraient le même chemin de sortie dans output_directory. Le premier du
+        manifeste est écrit, les suivants sont signalés en échec au lieu de l'écraser.
+        Retourne {chemin source: chemin source déjà propriétaire de la sortie}.
+        """
+        if self.output_mode != "Tagged copy":
+            return {}
+        owners = {}
+        conflicts = {}
+        for entry in entries:
+            output_path = self._lossless.get_output_path(entry["path"], self.output_directory)
+            owner = owners.setdefault(os.path.normcase(os.path.abspath(output_path)), entry["path"])
+            if owner != entry["path"]:
+                conflicts[entry["path"]] = owner
+        return conflicts
+
+    def run(self, manifest_path, result_path="", resume=True):
+        """
+        Traite le manifeste et retourne un dict de statistiques
+        (total, ok, skipped, failed, resumed, seconds, result_path).
+        """
+        start = time.perf_counter()
+        entries = read_manifest(manifest_path)
+        result_path = result_path or f"{os.path.splitext(manifest_path)[0]}.results.jsonl"
+        done = load_results(result_path) if resume else set()
+        # Toutes les entrées (y compris déjà traitées) réservent leur sortie, dans l'ordre du manifeste
+        self._conflicts = self._output_conflicts(entries)
+        todo = [entry for entry in entries if entry["path"] not in done]
+
+        stats = {"total": len(entries), "ok": 0, "skipped": 0, "failed": 0,
+                 "resumed": len(entries) - len(todo), "result_path": result_path}
+        written = []
+        sidecar_mode = self.output_mode == "Sidecar (.xmp)"
+
+        with open(result_path, "a" if resume else "w", encoding="utf-8") as results, \
+                ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            for index in range(0, len(todo), CHUNK_SIZE):
+                for result in executor.map(self.write_entry, todo[index:index + CHUNK_SIZE]):
+                    stats[result["status"]] += 1
+                    results.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    if result["status"] == "ok":
+                        # En mode Sidecar, la sortie est le .xmp: c'est l'image qui est relue et indexée
+                        written.append(result["path"] if sidecar_mode else result["output"])
+                results.flush()
+                print(f"-> {min(index + CHUNK_SIZE, len(todo))}/{len(todo)} fichier(s) traité(s)")
+
+        if written:
+            ExifToolManager.invalidate(*written)
+            update_index(written, self.manager)
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    @timed("bulk.write_file")
+    def write_entry(self, entry):
+        """Écrit les métadonnées d'un fichier et retourne sa ligne du manifeste de résultats"""
+        start = time.perf_counter()
+        path = entry["path"]
+        edits = build_edits(entry, self.write_mode)
+        result = {"path": path, "output": None, "status": "ok", "error": None, "edits": len(edits)}
+        try:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Fichier non trouvé - {path}")
+            owner = self._conflicts.get(path)
+            if owner is not None:
+                raise ValueError(f"Même chemin de sortie que {owner} (fichiers de même nom), copie non écrite")
+            if not edits:
+                result["status"] = "skipped"
+            else:
+                result["output"] = self._write(path, edits)
+        except (OSError, ValueError, RuntimeError, UnsupportedXMPField) as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        return result
+
+    def _write(self, path, edits):
+        if self.output_mode == "Sidecar (.xmp)":
+            return write_sidecar(path, edits, self.sidecar_directory)
+
+        in_place = self.output_mode == "In place"
+        output_path = path if in_place else self._lossless.get_output_path(path, self.output_directory)
+        original_stat = os.stat(path)
+
+        # Écriture sous un nom temporaire puis renommage: en place, l'original reste intact
+        # tant que la nouvelle version n'est pas complète. Le verrou du chemin de sortie
+        # empêche deux workers de réécrire le même fichier en même temps.
+        with AtomicOutputs([output_path]) as outputs:
+            target = outputs.temp(output_path)
+            spliced = False
+            if self.write_method == "Splice":
+                spliced = self._lossless.write_spliced(path, target, edits)
+
+            if not spliced:
+                if not self.manager.exiftool_path:
+                    raise RuntimeError("ExifTool non trouvé")
+                shutil.copy2(path, target)
+                cmd = ExifToolCommand().edits(edits).files([target]).add("-overwrite_original")
+                result = self.manager.execute(cmd)
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr.strip() or f"Code de retour ExifTool {result.returncode}")
+
+            # Préserver les dates du fichier d'origine
+            os.utime(target, (original_stat.st_atime, original_stat.st_mtime))
+        return output_path
+
+
+class WriteXMPMetadataBulk:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "manifest_path": ("STRING", {"default": ""}),
+                "write_mode": (["Add to existing", "Replace all", "Delete specified"], {"default": "Add to existing"}),
+                "output_mode": (["Tagged copy", "In place", "Sidecar (.xmp)"], {"default": "Tagged copy"}),
+            },
+            "optional": {
+                "write_method": (["ExifTool", "Splice"], {"default": "ExifTool"}),
+                "output_directory": ("STRING", {"default": "./tagged"}),
+                "sidecar_directory": ("STRING", {"default": ""}),
+                "result_path": ("STRING", {"default": ""}),
+                "resume": ("BOOLEAN", {"default": True}),
+                "workers": ("INT", {"default": 0, "min": 0, "max": 64}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "INT", "INT")
+    RETURN_NAMES = ("result_path", "written", "failed")
+    FUNCTION = "write_bulk"
+    CATEGORY = "too/xmp-metadata"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        return float("nan")
+
+    def write_bulk(self, manifest_path, write_mode="Add to existing", output_mode="Tagged copy", write_method="ExifTool",
+                   output_directory="", sidecar_directory="", result_path="", resume=True, workers=0):
+        """
+        Applique un manifeste CSV ou JSONL (chemin -> tags, description, champs personnalisés)
+        à tout un dossier en une seule exécution. Les résultats sont écrits dans un manifeste
+        JSONL (statut et durée par fichier), utilisé pour reprendre après une interruption.
+        """
+        manifest_path = manifest_path.strip().strip('"')
+        if not manifest_path or not os.path.exists(manifest_path):
+            print(f"/!\\ Manifeste non trouvé: {manifest_path}")
+            return (f"Erreur: Manifeste non trouvé - {manifest_path}", 0, 0)
+
+        writer = BulkWriter(write_mode, output_mode, write_method, output_directory, sidecar_directory, workers)
+        try:
+            stats = writer.run(manifest_path, result_path.strip().strip('"'), resume)
+        except (OSError, ValueError) as e:
+            print(f"/!\\ Erreur lors de la lecture du manifeste: {e}")
+            return (f"Erreur: {e}", 0, 0)
+
+        print(f"[OK] {stats['ok']} fichier(s) écrit(s), {stats['skipped']} ignoré(s), {stats['failed']} échec(s), "
+              f"{stats['resumed']} déjà traité(s) en {stats['seconds']}s -> {stats['result_path']}")
+        return (stats["result_path"], stats["ok"], stats["failed"])
+
+
+WRITE_MODES = {"add": "Add to existing", "replace": "Replace all", "delete": "Delete specified"}
+OUTPUT_MODES = {"copy": "Tagged copy", "inplace": "In place", "sidecar": "Sidecar (.xmp)"}
+WRITE_METHODS = {"exiftool": "ExifTool", "splice": "Splice"}
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande: python -m py.bulk_writer manifeste.csv"""
+    parser = argparse.ArgumentParser(description="Écrit les métadonnées XMP d'un manifeste CSV/JSONL")
+    parser.add_argument("manifest", help="Manifeste CSV (colonnes path, tags, description, ...) ou JSONL")
+    parser.add_argument("--write-mode", choices=sorted(WRITE_MODES), default="add")
+    parser.add_argument("--output-mode", choices=sorted(OUTPUT_MODES), default="copy")
+    parser.add_argument("--method", choices=sorted(WRITE_METHODS), default="exiftool")
+    parser.add_argument("--output-directory", default="")
+    parser.add_argument("--sidecar-directory", default="")
+    parser.add_argument("--results", default="", help="Manifeste de résultats (défaut: <manifeste>.results.jsonl)")
+    parser.add_argument("--no-resume", action="store_true", help="Retraiter tous les fichiers")
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    writer = BulkWriter(WRITE_MODES[args.write_mode], OUTPUT_MODES[args.output_mode], WRITE_METHODS[args.method],
+                        args.output_directory, args.sidecar_directory, args.workers)
+    stats = writer.run(args.manifest, args.results, not args.no_resume)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
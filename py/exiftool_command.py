@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+
+def format_arg(arg):
+    """
+    Formate un argument pour un fichier d'arguments ExifTool (une ligne par argument).
+    ExifTool ignore les lignes vides et celles commençant par #, et retire les espaces
+    en début et fin de ligne: ces arguments sont alors écrits en chaîne C (#[CSTR]).
+    """
+    arg = str(arg)
+    if "\n" in arg or "\r" in arg or arg != arg.strip() or not arg or arg.startswith("#"):
+        # Les lignes préfixées par #[CSTR] sont décodées comme des chaînes C par ExifTool
+        escaped = (arg.replace("\\", "\\\\").replace("\t", "\\t")
+                   .replace("\r", "\\r").replace("\n", "\\n"))
+        return f"#[CSTR]{escaped}"
+    return arg
+
+
+def argfile_lines(args):
+    """Lignes du fichier d'arguments correspondant à une liste d'arguments"""
+    return [format_arg(arg) for arg in args]
+
+
+class ExifToolCommand:
+    """
+    Construction d'une commande ExifTool, transmise sous forme de fichier d'arguments (-@)
+    encodé en UTF-8: stdin de la session persistante, ou fichier temporaire pour une
+    exécution ponctuelle. Aucun shell n'est utilisé et la longueur de la commande n'est
+    pas limitée par celle de la ligne de commande du système (milliers de tags, longues
+    descriptions).
+    """
+
+    def __init__(self, args=None):
+        self.args = [str(arg) for arg in args] if args else []
+
+    def __iter__(self):
+        return iter(self.args)
+
+    def __len__(self):
+        return len(self.args)
+
+    def __repr__(self):
+        return f"ExifToolCommand({self.args!r})"
+
+    def add(self, *args):
+        """Ajoute des options ou arguments bruts"""
+        self.args.extend(str(arg) for arg in args)
+        return self
+
+    def edit(self, tag, operation, value):
+        """Ajoute une édition: -TAG=valeur, -TAG+=valeur ou -TAG-=valeur"""
+        self.args.append(f"-{tag}{operation}{value}")
+        return self
+
+    def edits(self, edits):
+        """Ajoute une liste d'éditions (tag, opération, valeur)"""
+        for tag, operation, value in edits:
+            self.edit(tag, operation, value)
+        return self
+
+    def tags_from_file(self, source_path, tags=("-all:all",), exclude=()):
+        """Recopie les métadonnées d'un autre fichier (-tagsFromFile), sauf les tags exclus"""
+        self.args.extend(["-tagsFromFile", str(source_path)])
+        self.args.extend(tags)
+        self.args.extend(f"--{tag}" for tag in dict.fromkeys(exclude))
+        return self
+
+    def files(self, paths):
+        """Ajoute les fichiers à traiter"""
+        self.args.extend(str(path) for path in paths)
+        return self
+
+    def to_argfile(self):
+        """Contenu du fichier d'arguments (octets UTF-8)"""
+        return ("\n".join(argfile_lines(self.args)) + "\n").encode("utf-8")
+
+    def write_argfile(self, directory=None):
+        """Écrit le fichier d'arguments dans un fichier temporaire et retourne son chemin"""
+        handle, path = tempfile.mkstemp(prefix="exiftool_", suffix=".args", dir=directory)
+        with os.fdopen(handle, "wb") as argfile:
+            argfile.write(self.to_argfile())
+        return path
@@ -1,123 +1,572 @@
 import os
+import json
+import atexit
+import shutil
+import sqlite3
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .exiftool_session import ExifToolPool, ExifToolError
+from .exiftool_command import ExifToolCommand
+from .xmp_container import NATIVE_EXTENSIONS, UnsupportedContainer, read_xmp_file
+from .xmp_packet import DATE_PROPERTIES, read_properties, from_xmp_date
+from .xmp_sidecar import find_sidecar, read_sidecar_properties
+from .metadata_cache import MetadataCache, file_fingerprint
+from .instrumentation import timer, count
 
 class ExifToolManager:
-    def __init__(self, console_debug=False):
+    # Pool de sessions ExifTool persistantes partagé par tous les nœuds du processus
+    _pool = None
+    _pool_lock = threading.Lock()
+    # Nombre de workers (None = TOO_XMP_EXIFTOOL_WORKERS s'il est défini, sinon nombre de CPU)
+    pool_size = None
+    # Chemin et version d'ExifTool, recherchés une seule fois par processus
+    _exiftool_path = None
+    _exiftool_version = None
+    _discovered = False
+    _discovery_lock = threading.Lock()
+    # Cache des lectures partagé (capacité et base SQLite optionnelle configurables par variables d'environnement)
+    _cache = None
+    _cache_lock = threading.Lock()
+    # Capacité du cache (None = TOO_XMP_CACHE_SIZE s'il est défini, sinon 1024 entrées)
+    cache_size = None
+    cache_db = os.environ.get("TOO_XMP_CACHE_DB", "") or None
+
+    def __init__(self, console_debug=False, sidecar_directory="", use_sidecars=True):
         self.exiftool_path = self.get_exiftool_path()
         self.console_debug = console_debug
+        # Les sidecars .xmp (à côté de l'image ou dans l'arborescence miroir) sont fusionnés à la lecture
+        self.sidecar_directory = sidecar_directory
+        self.use_sidecars = use_sidecars
         if not self.exiftool_path and console_debug:
             print("/!\\ ExifTool non trouvé. Installez-le pour utiliser les fonctionnalités XMP.")
     
-    @staticmethod
-    def get_exiftool_path():
-        """Trouve le chemin d'ExifTool, en cherchant d'abord dans le PATH, puis localement"""
-        try:
-            result = subprocess.run(['exiftool', '-ver'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-            if result.returncode == 0:
-                return "exiftool"
-        except Exception:
-            pass
+    @classmethod
+    def get_exiftool_path(cls, refresh=False):
+        """
+        Trouve le chemin d'ExifTool une seule fois par processus (résultat mémorisé):
+        variable d'environnement TOO_XMP_EXIFTOOL, puis le PATH (shutil.which), puis
+        l'exécutable local sous Windows. refresh=True relance la recherche (ex: après
+        une installation).
+        """
+        with cls._discovery_lock:
+            if refresh or not cls._discovered:
+                cls._exiftool_path, cls._exiftool_version = cls._discover_exiftool()
+                cls._discovered = True
+            return cls._exiftool_path
+
+    @classmethod
+    def get_exiftool_version(cls):
+        """Version d'ExifTool trouvée (ex: "12.70"), ou None"""
+        cls.get_exiftool_path()
+        return cls._exiftool_version
 
+    @staticmethod
+    def _discover_exiftool():
+        candidates = []
+        override = os.environ.get("TOO_XMP_EXIFTOOL", "").strip().strip('"')
+        if override:
+            candidates.append(shutil.which(override) or override)
+        candidates.append(shutil.which("exiftool"))
         if os.name == 'nt':
             module_path = os.path.dirname(os.path.abspath(__file__))
-            exiftool_local = os.path.join(module_path, "../exiftool/exiftool.exe")
-            if os.path.exists(exiftool_local):
-                return exiftool_local
-        return None
+            candidates.append(os.path.abspath(os.path.join(module_path, "../exiftool/exiftool.exe")))
+
+        for candidate in candidates:
+            if not candidate or not os.path.isfile(candidate):
+                continue
+            # Un seul lancement par processus: vérifie que l'exécutable fonctionne et lit sa version
+            try:
+                count("exiftool.spawns")
+                result = subprocess.run([candidate, '-ver'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True, check=False)
+            except OSError:
+                continue
+            if result.returncode == 0:
+                return candidate, result.stdout.strip() or None
+        return None, None
+
+    @classmethod
+    def get_pool(cls, exiftool_path):
+        """Retourne le pool ExifTool partagé, en le (re)créant si nécessaire"""
+        with cls._pool_lock:
+            if cls._pool is None or cls._pool.exiftool_path != exiftool_path:
+                if cls._pool is not None:
+                    cls._pool.close()
+                cls._pool = ExifToolPool(exiftool_path, size=cls.get_pool_size())
+            return cls._pool
+
+    @classmethod
+    def get_pool_size(cls):
+        """
+        Nombre de workers du pool: pool_size, sinon TOO_XMP_EXIFTOOL_WORKERS (lu à la création
+        du pool, une valeur invalide est ignorée), sinon None (nombre de CPU)
+        """
+        if cls.pool_size:
+            return cls.pool_size
+        value = os.environ.get("TOO_XMP_EXIFTOOL_WORKERS", "").strip()
+        if not value:
+            return None
+        try:
+            return max(0, int(value)) or None
+        except ValueError:
+            print(f"/!\\ TOO_XMP_EXIFTOOL_WORKERS invalide ({value!r}), nombre de CPU utilisé")
+            return None
+
+    @classmethod
+    def configure_pool(cls, size=None):
+        """Change le nombre de workers ExifTool (le pool est recréé au prochain appel)"""
+        cls.pool_size = size
+        cls.shutdown()
+
+    @classmethod
+    def shutdown(cls):
+        """Ferme tous les workers ExifTool (appelé automatiquement à la sortie)"""
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.close()
+                cls._pool = None
+
+    @classmethod
+    def get_cache(cls):
+        """Retourne le cache de métadonnées partagé, en le créant si nécessaire"""
+        with cls._cache_lock:
+            if cls._cache is None:
+                size = cls.get_cache_size()
+                try:
+                    cls._cache = MetadataCache(size, cls.cache_db)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"/!\\ Cache SQLite indisponible ({e}), cache en mémoire uniquement")
+                    cls._cache = MetadataCache(size)
+            return cls._cache
+
+    @classmethod
+    def get_cache_size(cls):
+        """Capacité du cache: cache_size, sinon TOO_XMP_CACHE_SIZE (une valeur invalide est ignorée), sinon 1024"""
+        if cls.cache_size is not None:
+            return cls.cache_size
+        value = os.environ.get("TOO_XMP_CACHE_SIZE", "").strip()
+        if not value:
+            return 1024
+        try:
+            return int(value)
+        except ValueError:
+            print(f"/!\\ TOO_XMP_CACHE_SIZE invalide ({value!r}), 1024 entrées utilisées")
+            return 1024
+
+    @classmethod
+    def configure_cache(cls, size=None, db_path=None):
+        """Change la capacité du cache et sa base SQLite (None = mémoire uniquement)"""
+        with cls._cache_lock:
+            if cls._cache is not None:
+                cls._cache.close()
+                cls._cache = None
+            if size is not None:
+                cls.cache_size = size
+            cls.cache_db = db_path
+
+    @classmethod
+    def invalidate(cls, *paths):
+        """Oublie les métadonnées en cache des fichiers modifiés (appelé par les nœuds d'écriture)"""
+        cache = cls.get_cache()
+        for path in paths:
+            cache.invalidate(path)
+
+    @staticmethod
+    def fingerprint(image_path, sidecar_directory="", use_sidecars=True):
+        """
+        Empreinte d'une image pour le cache et IS_CHANGED: (chemin réel, taille, mtime, inode)
+        du fichier, complétée par celle de son sidecar .xmp s'il est pris en compte.
+        Retourne None si le fichier n'existe pas.
+        """
+        fingerprint = file_fingerprint(image_path)
+        if fingerprint is None:
+            return None
+        sidecar = find_sidecar(image_path, sidecar_directory) if use_sidecars else None
+        return fingerprint + (file_fingerprint(sidecar) if sidecar else None,)
+
+    def _cache_variant(self, *variant):
+        """Variante de lecture: les mêmes fichiers lus avec d'autres options ont leurs propres entrées"""
+        sidecars = self.sidecar_directory if self.use_sidecars else None
+        return variant + (sidecars,)
 
-    def extract_metadata(self, image_path):
-        """Extrait les métadonnées XMP spécifiques d'une image"""
+    def _cached(self, image_path, variant, read):
+        """Retourne la lecture en cache si le fichier est inchangé, sinon lit et mémorise le résultat"""
+        fingerprint = self.fingerprint(image_path, self.sidecar_directory, self.use_sidecars)
+        if fingerprint is None:
+            return read()
+        cache = self.get_cache()
+        variant = self._cache_variant(*variant)
+        metadata = cache.get(fingerprint, variant)
+        if metadata is not None:
+            count("cache.hits")
+            return metadata
+        count("cache.misses")
+        metadata = read()
+        # Les erreurs ne sont pas mémorisées (ExifTool absent, fichier verrouillé...)
+        if "error" not in metadata:
+            cache.put(fingerprint, variant, metadata)
+        return metadata
+
+    def execute(self, args):
+        """
+        Exécute une commande ExifTool (liste d'arguments ou ExifToolCommand, sans le chemin
+        de l'exécutable) via la session persistante. Retourne un subprocess.CompletedProcess.
+        """
+        args = list(args)
         if not self.exiftool_path:
-            return {"error": "ExifTool non trouvé"}
+            return subprocess.CompletedProcess(args, 1, "", "ExifTool non trouvé")
 
+        count("exiftool.commands")
         try:
-            result = subprocess.run(
-                f'"{self.exiftool_path}" -XMP-dc:Subject -XMP-dc:Description -XMP-xmp:CreateDate -XMP-xmp:ModifyDate "{image_path}"',
-                capture_output=True,
-                text=True,
-                shell=True
-            )
+            with timer("exiftool.execute"):
+                return self.get_pool(self.exiftool_path).execute(args)
+        except (ExifToolError, OSError) as e:
+            if self.console_debug:
+                print(f"/!\\ Session ExifTool indisponible ({e}), exécution ponctuelle")
+            return self._execute_once(args)
 
+    def execute_many(self, commands):
+        """
+        Exécute plusieurs commandes ExifTool en parallèle sur le pool de workers.
+        Retourne la liste des résultats dans l'ordre des commandes.
+        """
+        commands = [list(args) for args in commands]
+        if not self.exiftool_path:
+            return [subprocess.CompletedProcess(args, 1, "", "ExifTool non trouvé") for args in commands]
+
+        count("exiftool.commands", len(commands))
+        try:
+            with timer("exiftool.execute_many"):
+                return self.get_pool(self.exiftool_path).map(commands)
+        except (ExifToolError, OSError) as e:
             if self.console_debug:
-                print("--- Sortie d'ExifTool ---")
-                for line in result.stdout.split("\n"):
-                    if line.strip():  # Affiche uniquement les lignes non vides
-                        # Nettoyage des espaces excessifs pour l'affichage
-                        parts = line.split(":", 1)
-                        if len(parts) == 2:
-                            key = parts[0].strip()
-                            value = parts[1].strip()
-                            print(f"{key}: {value}")
-                        else:
-                            print(line)
-                if result.stderr.strip():
-                    print("--- Erreurs d'ExifTool ---")
-                    print(result.stderr)
-                print("------------------------")
+                print(f"/!\\ Pool ExifTool indisponible ({e}), exécution ponctuelle")
+            return [self._execute_once(args) for args in commands]
 
-            metadata = {}
-            for line in result.stdout.split("\n"):
-                line = line.strip()
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    metadata[key.strip()] = value.strip()
+    def _execute_once(self, args):
+        """
+        Exécution ponctuelle (nouveau processus) en dernier recours.
+        Les arguments passent par un fichier d'arguments temporaire (-@), sans shell
+        ni limite de longueur de la ligne de commande.
+        """
+        argfile = ExifToolCommand(args).write_argfile()
+        count("exiftool.spawns")
+        try:
+            result = subprocess.run([self.exiftool_path, "-charset", "filename=utf8", "-@", argfile],
+                                    capture_output=True, text=True, encoding="utf-8", errors="replace")
+        finally:
+            try:
+                os.remove(argfile)
+            except OSError:
+                pass
+        return subprocess.CompletedProcess(list(args), result.returncode, result.stdout, result.stderr)
 
-            return metadata
+    # Champs lus par défaut, et nom des clés retournées (identiques à la sortie texte d'ExifTool)
+    DEFAULT_FIELDS = ["-XMP-dc:Subject", "-XMP-dc:Description", "-XMP-xmp:CreateDate", "-XMP-xmp:ModifyDate"]
+    FIELD_NAMES = {"CreateDate": "Create Date", "ModifyDate": "Modify Date"}
+    # Nombre de fichiers passés à une seule invocation d'ExifTool en lecture groupée
+    BATCH_SIZE = 200
+
+    # Propriétés XMP lues par le lecteur natif, et clés correspondantes de extract_metadata
+    NATIVE_FIELDS = {"dc:subject": "Subject", "dc:description": "Description",
+                     "xmp:CreateDate": "Create Date", "xmp:ModifyDate": "Modify Date"}
+
+    def extract_metadata(self, image_path, backend="exiftool", keep_lists=False):
+        """
+        Extrait les métadonnées XMP spécifiques d'une image.
+        backend: "exiftool", "native" (lecture directe du paquet XMP, PNG/JPEG/WebP)
+        ou "auto" (natif si le format le permet, sinon ExifTool).
+        Avec keep_lists, les valeurs multiples (Subject) restent des listes au lieu d'être
+        jointes par ', ' (un tag peut contenir une virgule).
+        Les fichiers inchangés depuis la dernière lecture sont servis par le cache.
+        """
+        variant = ("metadata", backend) + (("lists",) if keep_lists else ())
+        with timer("read.metadata"):
+            return self._cached(image_path, variant,
+                                lambda: self._extract_metadata(image_path, backend, keep_lists))
+
+    def _extract_metadata(self, image_path, backend, keep_lists=False):
+        if backend != "exiftool":
+            metadata = self.extract_native(image_path, keep_lists)
+            if metadata is not None:
+                return self._merge_sidecar(image_path, metadata, keep_lists=keep_lists)
+            if backend == "native":
+                return self._merge_sidecar(image_path, {"error": "Format non supporté par la lecture native"},
+                                           keep_lists=keep_lists)
+
+        metadata = self.extract_many([image_path], use_cache=False, keep_lists=keep_lists).get(image_path, {})
+
+        if self.console_debug:
+            print("--- Sortie d'ExifTool ---")
+            for key, value in metadata.items():
+                print(f"{key}: {value}")
+            print("------------------------")
+
+        return metadata
+
+    def _read_native_properties(self, image_path, wanted=None):
+        """Lit les propriétés du paquet XMP sans ExifTool (None si le format n'est pas géré)"""
+        if os.path.splitext(image_path)[1].lower() not in NATIVE_EXTENSIONS:
+            return None
+        try:
+            with timer("read.native_packet"):
+                packet = read_xmp_file(image_path)
+        except UnsupportedContainer:
+            return None
+        if packet is None:
+            return {}
+        count("bytes.xmp_read", len(packet))
+        return read_properties(packet, wanted)
+
+    def extract_native(self, image_path, keep_lists=False):
+        """
+        Extrait les métadonnées XMP spécifiques en lisant directement le paquet XMP
+        (sans décoder l'image ni lancer ExifTool). Même forme que extract_metadata.
+        Retourne None si le format n'est pas géré par le lecteur natif.
+        """
+        try:
+            properties = self._read_native_properties(image_path, self.NATIVE_FIELDS)
+        except FileNotFoundError:
+            return {"error": f"Fichier non trouvé - {image_path}"}
         except Exception as e:
             return {"error": str(e)}
+        if properties is None:
+            return None
+
+        metadata = self._shape_properties(properties, keep_lists)
+
+        if self.console_debug:
+            print("--- Lecture XMP native ---")
+            for key, value in metadata.items():
+                print(f"{key}: {value}")
+            print("------------------------")
+
+        return metadata
+
+    @classmethod
+    def _shape_properties(cls, properties, keep_lists=False):
+        """Convertit des propriétés XMP natives en dict de même forme que extract_metadata"""
+        metadata = {}
+        for qname, key in cls.NATIVE_FIELDS.items():
+            value = properties.get(qname)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                value = list(value) if keep_lists else ", ".join(value)
+            elif qname.startswith("xmp:"):
+                value = from_xmp_date(value)
+            metadata[key] = value
+        return metadata
+
+    @staticmethod
+    def _group_properties(properties):
+        """Convertit des propriétés XMP natives en clés groupées façon ExifTool (ex: "XMP-dc:Subject")"""
+        metadata = {}
+        for qname, value in properties.items():
+            if qname in DATE_PROPERTIES and isinstance(value, str):
+                value = from_xmp_date(value)
+            prefix, _, name = qname.rpartition(":")
+            metadata[f"XMP-{prefix}:{name[:1].upper()}{name[1:]}"] = value
+        return metadata
+
+    def _sidecar_properties(self, image_path):
+        """Propriétés du sidecar .xmp de l'image, ou None"""
+        if not self.use_sidecars:
+            return None
+        try:
+            return read_sidecar_properties(image_path, self.sidecar_directory)
+        except Exception as e:
+            if self.console_debug:
+                print(f"/!\\ Sidecar illisible pour {image_path}: {e}")
+            return None
+
+    def _merge_sidecar(self, image_path, metadata, grouped=False, keep_lists=False):
+        """Fusionne les données du sidecar (prioritaires) avec celles intégrées à l'image"""
+        properties = self._sidecar_properties(image_path)
+        if properties is None:
+            return metadata
+        sidecar_metadata = self._group_properties(properties) if grouped \
+            else self._shape_properties(properties, keep_lists)
+        if "error" in metadata or "info" in metadata:
+            # L'image elle-même n'a pas pu être lue (ou n'a pas de XMP): le sidecar fait foi
+            metadata = {}
+        merged = dict(metadata)
+        merged.update(sidecar_metadata)
+        return merged
+
+    def extract_many(self, image_paths, fields=None, use_cache=True, keep_lists=False):
+        """
+        Lit les métadonnées de nombreux fichiers en quelques invocations d'ExifTool.
+        Retourne un dict {chemin: métadonnées}, chaque entrée ayant la même forme
+        que le résultat de extract_metadata.
+        """
+        return dict(self.iter_many(image_paths, fields, use_cache, keep_lists))
 
-    def extract_all_xmp_metadata(self, image_path):
-        """Extrait toutes les métadonnées XMP d'une image"""
+    def iter_many(self, image_paths, fields=None, use_cache=True, keep_lists=False):
+        """
+        Générateur de (chemin, métadonnées) pour une liste de fichiers.
+        Les fichiers sont regroupés par lots de BATCH_SIZE (une invocation par lot),
+        les lots sont répartis sur le pool de workers et les résultats sont produits
+        au fur et à mesure, dans l'ordre des chemins fournis.
+        Seuls les fichiers absents du cache (ou modifiés depuis) sont lus par ExifTool.
+        keep_lists: voir extract_metadata.
+        """
+        image_paths = list(image_paths)
+        if not use_cache:
+            yield from self._iter_many(image_paths, fields, keep_lists)
+            return
+
+        cache = self.get_cache()
+        variant = self._cache_variant("fields", tuple(fields) if fields else None,
+                                      *(("lists",) if keep_lists else ()))
+        cached = {}
+        fingerprints = {}
+        for path in image_paths:
+            fingerprint = self.fingerprint(path, self.sidecar_directory, self.use_sidecars)
+            if fingerprint is None:
+                continue
+            fingerprints[path] = fingerprint
+            metadata = cache.get(fingerprint, variant)
+            if metadata is not None:
+                cached[path] = metadata
+        count("cache.hits", len(cached))
+        count("cache.misses", len(image_paths) - len(cached))
+
+        misses = self._iter_many([path for path in image_paths if path not in cached], fields, keep_lists)
+        for path in image_paths:
+            if path in cached:
+                yield path, cached[path]
+                continue
+            miss_path, metadata = next(misses)
+            if path in fingerprints and "error" not in metadata:
+                cache.put(fingerprints[path], variant, metadata)
+            yield miss_path, metadata
+
+    def _iter_many(self, image_paths, fields=None, keep_lists=False):
         if not self.exiftool_path:
-            return {"error": "ExifTool non trouvé"}
+            for path in image_paths:
+                yield path, self._merge_sidecar(path, {"error": "ExifTool non trouvé"}, keep_lists=keep_lists)
+            return
+
+        # Les sidecars ne sont fusionnés que pour les champs par défaut
+        merge_sidecars = not fields
+        fields = list(fields) if fields else self.DEFAULT_FIELDS
+        fields = [f if f.startswith("-") else f"-{f}" for f in fields]
+        batches = [image_paths[i:i + self.BATCH_SIZE] for i in range(0, len(image_paths), self.BATCH_SIZE)]
+        if not batches:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(len(batches), self.get_pool(self.exiftool_path).size)) as executor:
+            futures = [executor.submit(self._read_batch, batch, fields, keep_lists) for batch in batches]
+            for future in futures:
+                for path, metadata in future.result():
+                    yield path, (self._merge_sidecar(path, metadata, keep_lists=keep_lists)
+                                 if merge_sidecars else metadata)
 
+    def _read_batch(self, image_paths, fields, keep_lists=False):
+        """Lit un lot de fichiers en une seule commande ExifTool JSON"""
         try:
-            # Essayer plusieurs variantes de commandes pour récupérer les métadonnées XMP
-            commands = [
-                f'"{self.exiftool_path}" -XMP-all "{image_path}"',
-                f'"{self.exiftool_path}" -XMP:all "{image_path}"', 
-                f'"{self.exiftool_path}" -g1 -XMP "{image_path}"',
-                f'"{self.exiftool_path}" -XMP-dc:all -XMP-xmp:all -XMP-photoshop:all -XMP-lr:all -XMP-crs:all "{image_path}"'
-            ]
-            
-            best_result = {}
-            best_stdout = ""
-            
-            for cmd in commands:
-                try:
-                    result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-                    if result.returncode == 0 and result.stdout.strip():
-                        metadata = {}
-                        for line in result.stdout.split("\n"):
-                            line = line.strip()
-                            if ":" in line and line:
-                                # Exclure les lignes d'erreur ou d'information système
-                                if not any(line.startswith(x) for x in ["Warning", "Error", "File not found", "========"]):
-                                    try:
-                                        key, value = line.split(":", 1)
-                                        key = key.strip()
-                                        value = value.strip()
-                                        if key and value and not key.startswith("-"):
-                                            metadata[key] = value
-                                    except ValueError:
-                                        continue
-                        
-                        # Garder le résultat avec le plus de métadonnées
-                        if len(metadata) > len(best_result):
-                            best_result = metadata
-                            best_stdout = result.stdout
-                            
-                except Exception:
+            with timer("read.exiftool_batch"):
+                entries = self.run_json(ExifToolCommand(fields).files(image_paths))
+        except Exception as e:
+            return [(path, {"error": str(e)}) for path in image_paths]
+
+        # ExifTool peut normaliser les séparateurs dans SourceFile: indexer par chemin normalisé
+        by_path = {}
+        for entry in entries:
+            source = entry.pop("SourceFile", None)
+            if source is not None:
+                by_path[self._path_key(source)] = entry
+
+        results = []
+        for path in image_paths:
+            entry = by_path.get(self._path_key(path))
+            if entry is None:
+                results.append((path, {"error": f"Fichier non lu par ExifTool - {path}"}))
+            else:
+                results.append((path, self._flatten_entry(entry, keep_lists)))
+        return results
+
+    @staticmethod
+    def _path_key(path):
+        return os.path.normcase(os.path.normpath(str(path)))
+
+    @classmethod
+    def _flatten_entry(cls, entry, keep_lists=False):
+        """
+        Convertit une entrée JSON en dict texte (listes jointes par ', ', comme la sortie texte).
+        Avec keep_lists, les listes restent des listes de textes.
+        """
+        metadata = {}
+        for key, value in entry.items():
+            if isinstance(value, list):
+                if keep_lists:
+                    metadata[cls.FIELD_NAMES.get(key, key)] = [str(v) for v in value]
                     continue
-            
+                value = ", ".join(str(v) for v in value)
+            elif isinstance(value, dict):
+                value = json.dumps(value, ensure_ascii=False)
+            metadata[cls.FIELD_NAMES.get(key, key)] = str(value)
+        return metadata
+
+    def run_json(self, args):
+        """
+        Exécute ExifTool avec la sortie JSON (-j) et retourne la liste des objets
+        décodés (un par fichier). Lève une RuntimeError si la sortie est inexploitable.
+        """
+        result = self.execute(ExifToolCommand(["-j"]).add(*args))
+        if not result.stdout.strip():
+            raise RuntimeError(result.stderr.strip() or "Aucune sortie d'ExifTool")
+        try:
+            return json.loads(result.stdout)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Sortie JSON d'ExifTool invalide: {e}")
+
+    def extract_all_xmp_metadata(self, image_path, backend="exiftool"):
+        """
+        Extrait toutes les métadonnées XMP d'une image en un seul appel ExifTool
+        (-j -G1 -struct). Les clés sont groupées par espace de noms (ex: "XMP-dc:Subject")
+        et les valeurs conservent leur type (listes, structures, nombres).
+        Avec backend "native" ou "auto", le paquet XMP est lu directement si possible.
+        """
+        with timer("read.all_xmp"):
+            return self._cached(image_path, ("all", backend),
+                                lambda: self._extract_all_xmp_metadata(image_path, backend))
+
+    def _extract_all_xmp_metadata(self, image_path, backend):
+        if backend != "exiftool":
+            try:
+                properties = self._read_native_properties(image_path)
+            except Exception as e:
+                return {"error": str(e)}
+            if properties is not None:
+                metadata = self._merge_sidecar(image_path, self._group_properties(properties), grouped=True)
+                return metadata if metadata else {"info": "Aucune métadonnée XMP trouvée"}
+            if backend == "native":
+                return self._merge_sidecar(image_path, {"error": "Format non supporté par la lecture native"}, grouped=True)
+
+        if not self.exiftool_path:
+            return self._merge_sidecar(image_path, {"error": "ExifTool non trouvé"}, grouped=True)
+
+        try:
+            entries = self.run_json(ExifToolCommand(["-G1", "-struct", "-XMP:all"]).files([image_path]))
+            metadata = dict(entries[0]) if entries else {}
+            metadata.pop("SourceFile", None)
+            metadata = self._merge_sidecar(image_path, metadata, grouped=True)
+
             if self.console_debug:
                 print("--- Sortie d'ExifTool (ALL XMP) ---")
-                print(f"Found {len(best_result)} metadata entries:")
-                for key, value in best_result.items():
+                print(f"Found {len(metadata)} metadata entries:")
+                for key, value in metadata.items():
                     print(f"  {key}: {value}")
                 print("----------------------------------")
 
-            return best_result if best_result else {"info": "Aucune métadonnée XMP trouvée"}
-            
+            return metadata if metadata else {"info": "Aucune métadonnée XMP trouvée"}
+
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            return self._merge_sidecar(image_path, {"error": str(e)}, grouped=True)
+
+
+# Arrêt propre du processus ExifTool persistant à la fin de l'interpréteur
+atexit.register(ExifToolManager.shutdown)
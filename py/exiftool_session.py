@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import queue
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .exiftool_command import argfile_lines
+from .instrumentation import count
+
+
+class ExifToolError(RuntimeError):
+    """Erreur de communication avec un processus ExifTool persistant"""
+
+
+class ExifToolSession:
+    """
+    Processus ExifTool persistant lancé avec `-stay_open True -@ -`.
+    Les arguments de chaque commande sont envoyés ligne par ligne sur stdin,
+    terminés par `-execute{N}`, et la sortie est lue jusqu'à la sentinelle `{ready{N}}`.
+    Le coût de démarrage de Perl n'est ainsi payé qu'une seule fois.
+    stderr est vidé en continu par un thread: une commande qui écrit beaucoup
+    d'avertissements ne bloque jamais ExifTool pendant la lecture de stdout.
+    """
+
+    BLOCK_SIZE = 65536
+
+    def __init__(self, exiftool_path, common_args=None):
+        self.exiftool_path = exiftool_path
+        self.common_args = list(common_args) if common_args is not None else ["-charset", "filename=utf8"]
+        self._process = None
+        self._stderr_chunks = None
+        self._stderr_thread = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Démarre le processus ExifTool s'il ne tourne pas déjà"""
+        if self.is_alive():
+            return
+        self._terminate()
+
+        cmd = [self.exiftool_path, "-stay_open", "True", "-@", "-"]
+        if self.common_args:
+            cmd.append("-common_args")
+            cmd.extend(self.common_args)
+
+        creationflags = 0
+        if os.name == 'nt':
+            # Éviter l'ouverture d'une fenêtre console sous Windows
+            creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+        count("exiftool.spawns")
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=creationflags,
+        )
+        # Un thread par processus lit stderr au fil de l'eau (les pipes Windows ne
+        # supportent pas select): le tampon du pipe ne se remplit jamais
+        self._stderr_chunks = queue.Queue()
+        self._stderr_thread = threading.Thread(
+            target=self._pump, args=(self._process.stderr, self._stderr_chunks),
+            name="exiftool-stderr", daemon=True,
+        )
+        self._stderr_thread.start()
+
+    def _pump(self, stream, chunks):
+        """Recopie un flux dans une file jusqu'à sa fermeture (b"" signale la fin)"""
+        fd = stream.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, self.BLOCK_SIZE)
+            except OSError:
+                chunk = b""
+            chunks.put(chunk)
+            if not chunk:
+                return
+
+    def is_alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def execute(self, args):
+        """
+        Exécute une commande ExifTool dans le processus persistant.
+        Retourne un subprocess.CompletedProcess (stdout/stderr en texte).
+        Si le processus a planté, il est redémarré et la commande rejouée une fois.
+        """
+        with self._lock:
+            try:
+                return self._execute_locked(args)
+            except (ExifToolError, OSError):
+                # Processus mort ou pipe cassé: on redémarre et on réessaie une fois
+                self._terminate()
+                return self._execute_locked(args)
+
+    def _execute_locked(self, args):
+        self.start()
+        self._sequence += 1
+        sequence = self._sequence
+
+        args = list(args)
+        lines = argfile_lines(args)
+        # ${status} est remplacé par le code de retour de la commande (ExifTool >= 12.10)
+        lines.append("-echo4")
+        lines.append("{status=${status}}{ready%d}" % sequence)
+        lines.append("-execute%d" % sequence)
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+
+        self._process.stdin.write(payload)
+        self._process.stdin.flush()
+
+        stdout_fd = self._process.stdout.fileno()
+        stdout = self._read_until(lambda: os.read(stdout_fd, self.BLOCK_SIZE), b"{ready%d}" % sequence)
+        stderr = self._read_until(self._stderr_chunks.get, b"{ready%d}" % sequence)
+
+        returncode = 0
+        match = re.search(rb"\{status=([^}]*)\}\s*$", stderr)
+        if match:
+            stderr = stderr[:match.start()]
+            status = match.group(1).strip()
+            if status.isdigit():
+                returncode = int(status)
+            elif b"Error" in stderr:
+                returncode = 1
+        elif b"Error" in stderr:
+            returncode = 1
+
+        return subprocess.CompletedProcess(
+            args=args,
+            returncode=returncode,
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+        )
+
+    def _read_until(self, read, sentinel):
+        """Lit des blocs (via `read`) jusqu'à la sentinelle et retourne le contenu sans celle-ci"""
+        output = b""
+        while not output[-64:].rstrip().endswith(sentinel):
+            chunk = read()
+            if not chunk:
+                raise ExifToolError("Le processus ExifTool s'est arrêté de manière inattendue")
+            output += chunk
+        output = output.rstrip()
+        return output[:-len(sentinel)]
+
+    def close(self):
+        """Arrête proprement le processus ExifTool"""
+        with self._lock:
+            self._terminate()
+
+    def _terminate(self):
+        process = self._process
+        stderr_thread = self._stderr_thread
+        self._process = None
+        self._stderr_chunks = None
+        self._stderr_thread = None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.write(b"-stay_open\nFalse\n")
+                process.stdin.flush()
+                process.wait(timeout=5)
+        except Exception:
+            pass
+        finally:
+            if process.poll() is None:
+                process.kill()
+                try:
+                    process.wait(timeout=5)
+                except Exception:
+                    pass
+            if stderr_thread is not None:
+                # Le processus arrêté, le thread lit la fin de stderr et se termine
+                stderr_thread.join(timeout=5)
+            for stream in (process.stdin, process.stdout, process.stderr):
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+
+
+class ExifToolPool:
+    """
+    Pool borné de sessions ExifTool persistantes.
+    Les sessions sont créées à la demande jusqu'à `size`, puis les commandes attendent
+    qu'une session se libère (file d'attente), ce qui applique une contre-pression
+    naturelle aux appelants lorsque tous les workers sont occupés.
+    """
+
+    def __init__(self, exiftool_path, size=None, acquire_timeout=None, health_check_interval=30.0):
+        self.exiftool_path = exiftool_path
+        self.size = max(1, int(size or os.cpu_count() or 1))
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._all_sessions = []
+
+    def acquire(self, timeout=None):
+        """Réserve une session disponible (en crée une si le pool n'est pas plein)"""
+        if self._closed:
+            raise ExifToolError("Le pool ExifTool est fermé")
+        timeout = self.acquire_timeout if timeout is None else timeout
+
+        try:
+            session, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            session = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    session = ExifToolSession(self.exiftool_path)
+                    self._all_sessions.append(session)
+                    last_used = time.monotonic()
+            if session is None:
+                try:
+                    session, last_used = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise ExifToolError(f"Aucun worker ExifTool disponible après {timeout}s")
+
+        try:
+            return self._check_health(session, last_used)
+        except Exception:
+            # Ne pas perdre le worker: il sera redémarré à la prochaine réservation
+            self.release(session)
+            raise
+
+    def release(self, session):
+        """Remet une session dans le pool"""
+        if self._closed:
+            session.close()
+            return
+        self._idle.put((session, time.monotonic()))
+
+    def _check_health(self, session, last_used):
+        """Redémarre une session morte, et vérifie par un ping les sessions restées inactives"""
+        if not session.is_alive():
+            session.start()
+            return session
+        if self.health_check_interval and time.monotonic() - last_used > self.health_check_interval:
+            try:
+                result = session.execute(["-ver"])
+                if not result.stdout.strip():
+                    raise ExifToolError("Réponse vide au ping")
+            except (ExifToolError, OSError):
+                session.close()
+                session.start()
+        return session
+
+    def execute(self, args):
+        """Exécute une commande sur le premier worker disponible"""
+        session = self.acquire()
+        try:
+            return session.execute(args)
+        finally:
+            self.release(session)
+
+    def map(self, commands):
+        """Exécute plusieurs commandes en parallèle sur les workers du pool (ordre préservé)"""
+        commands = list(commands)
+        if len(commands) <= 1:
+            return [self.execute(args) for args in commands]
+        with ThreadPoolExecutor(max_workers=min(self.size, len(commands))) as executor:
+            return list(executor.map(self.execute, commands))
+
+    def close(self):
+        """Arrête tous les workers du pool"""
+        self._closed = True
+        with self._lock:
+            sessions = list(self._all_sessions)
+            self._all_sessions = []
+            self._created = 0
+        for session in sessions:
+            session.close()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
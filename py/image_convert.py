@@ -0,0 +1,72 @@
+import numpy as np
+import torch
+
+# Nombre de valeurs converties par bande (1 Mi valeurs float32 = 4 Mo de tampon)
+CHUNK_VALUES = 1 << 20
+
+
+def frames_to_uint8(images):
+    """
+    Convertit un tenseur IMAGE de ComfyUI (B, H, W, C) ou (H, W, C), valeurs 0-1,
+    en liste de tableaux numpy uint8 (H, W, C), ou (H, W) pour les images à un canal.
+
+    Même résultat que np.clip(i * 255, 0, 255).astype(np.uint8), sans les deux
+    temporaires float32 de la taille de l'image: la mise à l'échelle et le clip se font
+    en place dans un petit tampon float32 réutilisé (par bandes de lignes, pour toutes
+    les images du batch), puis la conversion écrit directement dans un tampon uint8
+    unique pour tout le batch.
+    Sur GPU, le calcul reste sur le périphérique et seuls les octets uint8 sont transférés.
+    """
+    if isinstance(images, np.ndarray):
+        return arrays_to_uint8(images)
+
+    frames = images if images.dim() == 4 else images.unsqueeze(0)
+    if frames.device.type == "cpu" and frames.dtype in (torch.float32, torch.float64, torch.uint8):
+        # Sur CPU, numpy travaille directement sur la mémoire du tenseur (sans copie)
+        return arrays_to_uint8(frames.numpy())
+
+    output = torch.empty(frames.shape, dtype=torch.uint8)
+    if frames.dtype == torch.uint8:
+        output.copy_(frames)
+    else:
+        scratch = torch.empty(frames.shape[1:], dtype=torch.float32, device=frames.device)
+        # Tampon uint8 sur le périphérique: le transfert vers le CPU porte sur 1 octet par valeur au lieu de 4
+        staging = torch.empty(frames.shape[1:], dtype=torch.uint8, device=frames.device)
+        for index, frame in enumerate(frames):
+            torch.mul(frame, 255.0, out=scratch)
+            scratch.clamp_(0, 255)
+            staging.copy_(scratch)
+            output[index].copy_(staging)
+
+    return _split_frames(output.numpy())
+
+
+def arrays_to_uint8(images):
+    """Équivalent numpy de frames_to_uint8 (mêmes tampons réutilisés)"""
+    frames = images if images.ndim == 4 else images[np.newaxis]
+    output = np.empty(frames.shape, dtype=np.uint8)
+
+    if frames.dtype == np.uint8:
+        output[...] = frames
+    else:
+        # Traitement par bandes de lignes: le tampon float32 reste petit (et dans le cache CPU)
+        height = frames.shape[1]
+        row_size = max(1, int(np.prod(frames.shape[2:])))
+        rows = max(1, min(height, CHUNK_VALUES // row_size))
+        scratch = np.empty((rows,) + frames.shape[2:], dtype=np.float32)
+        for index, frame in enumerate(frames):
+            for start in range(0, height, rows):
+                band = frame[start:start + rows]
+                chunk = scratch[:len(band)]
+                np.multiply(band, 255.0, out=chunk, casting="unsafe")
+                np.clip(chunk, 0, 255, out=chunk)
+                output[index, start:start + len(band)] = chunk
+
+    return _split_frames(output)
+
+
+def _split_frames(output):
+    # PIL n'accepte pas (H, W, 1): les images à un canal sont passées en (H, W)
+    if output.shape[-1] == 1:
+        output = output[..., 0]
+    return list(output)
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import functools
+import contextlib
+
+# Mesures activées par TOO_XMP_METRICS=1 (sinon les timers sont des contextes vides partagés)
+ENABLED = os.environ.get("TOO_XMP_METRICS", "").strip().lower() in ("1", "true", "yes", "on")
+# Fichier JSON écrit à la sortie du processus, si défini
+METRICS_FILE = os.environ.get("TOO_XMP_METRICS_FILE", "") or None
+
+logger = logging.getLogger("too_xmp_metadata")
+
+_NULL_TIMER = contextlib.nullcontext()
+_lock = threading.Lock()
+# Étape -> [nombre, durée totale, durée max]
+_stages = {}
+# Compteur -> valeur (lancements d'ExifTool, commandes, octets lus/écrits, succès du cache...)
+_counters = {}
+
+
+def enabled():
+    return ENABLED
+
+
+def enable(state=True):
+    """Active ou désactive les mesures (ex: benchmarks, débogage)"""
+    global ENABLED
+    ENABLED = bool(state)
+
+
+def reset():
+    """Remet toutes les mesures à zéro"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def timer(stage):
+    """
+    Context manager mesurant la durée d'une étape, ex: `with timer("tensor.encode"):`.
+    Désactivé, retourne un contexte vide partagé (aucune allocation ni appel d'horloge).
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+
+def timed(stage):
+    """Décorateur mesurant chaque appel d'une fonction (ex: la fonction d'un nœud)"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with _Timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(stage, seconds):
+    """Ajoute une durée mesurée à une étape"""
+    with _lock:
+        stats = _stages.get(stage)
+        if stats is None:
+            _stages[stage] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("stage %s %.6fs", stage, seconds, extra={"stage": stage, "seconds": seconds})
+
+
+def count(name, value=1):
+    """Incrémente un compteur (sans effet si les mesures sont désactivées)"""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def count_file(name, path):
+    """Ajoute la taille d'un fichier à un compteur d'octets (bytes.read, bytes.written)"""
+    if not ENABLED:
+        return
+    try:
+        count(name, os.path.getsize(path))
+    except OSError:
+        pass
+
+
+def snapshot():
+    """Mesures actuelles: {"stages": {étape: {count, seconds, max_seconds}}, "counters": {...}}"""
+    with _lock:
+        stages = {stage: {"count": stats[0], "seconds": round(stats[1], 6), "max_seconds": round(stats[2], 6)}
+                  for stage, stats in sorted(_stages.items())}
+        counters = dict(sorted(_counters.items()))
+    return {"enabled": ENABLED, "stages": stages, "counters": counters}
+
+
+def to_prometheus():
+    """Mesures au format texte Prometheus"""
+    data = snapshot()
+    lines = ["# HELP too_xmp_stage_seconds Durée des étapes des nœuds XMP",
+             "# TYPE too_xmp_stage_seconds summary"]
+    for stage, stats in data["stages"].items():
+        lines.append(f'too_xmp_stage_seconds_sum{{stage="{stage}"}} {stats["seconds"]}')
+        lines.append(f'too_xmp_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+    lines.append("# HELP too_xmp_stage_max_seconds Durée maximale d'une étape")
+    lines.append("# TYPE too_xmp_stage_max_seconds gauge")
+    for stage, stats in data["stages"].items():
+        lines.append(f'too_xmp_stage_max_seconds{{stage="{stage}"}} {stats["max_seconds"]}')
+    lines.append("# HELP too_xmp_events_total Compteurs (lancements d'ExifTool, commandes, octets, cache)")
+    lines.append("# TYPE too_xmp_events_total counter")
+    for name, value in data["counters"].items():
+        lines.append(f'too_xmp_events_total{{name="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def dump_json(path=None):
+    """Écrit les mesures en JSON (METRICS_FILE par défaut). Retourne le chemin écrit, ou None"""
+    path = path or METRICS_FILE
+    if not path:
+        return None
+    with open(path, "w", encoding="utf-8") as metrics_file:
+        json.dump(snapshot(), metrics_file, indent=2)
+    return path
+
+
+def register_routes():
+    """
+    Expose les mesures sur le serveur ComfyUI, si les mesures sont activées:
+    GET /too_xmp/metrics (texte Prometheus) et /too_xmp/metrics?format=json.
+    """
+    if not ENABLED:
+        return False
+    try:
+        from aiohttp import web
+        from server import PromptServer
+    except ImportError:
+        return False
+    if getattr(PromptServer, "instance", None) is None:
+        return False
+
+    @PromptServer.instance.routes.get("/too_xmp/metrics")
+    async def metrics_route(request):
+        if request.query.get("format") == "json":
+            return web.json_response(snapshot())
+        return web.Response(text=to_prometheus(), content_type="text/plain")
+
+    return True
+
+
+def _dump_at_exit():
+    if ENABLED and METRICS_FILE:
+        try:
+            dump_json()
+        except OSError as e:
+            print(f"/!\\ Écriture des mesures impossible: {e}")
+
+
+atexit.register(_dump_at_exit)
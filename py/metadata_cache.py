@@ -0,0 +1,123 @@
+import os
+import json
+import copy
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def file_fingerprint(path):
+    """
+    Empreinte d'un fichier: (chemin réel, taille, mtime en ns, inode).
+    Toute modification du fichier (ou son remplacement) change l'empreinte.
+    Retourne None si le fichier n'existe pas.
+    """
+    try:
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+    except (OSError, ValueError):
+        return None
+    return (real_path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class MetadataCache:
+    """
+    Cache LRU des métadonnées lues, indexé par (chemin réel, variante de lecture).
+    Chaque entrée mémorise l'empreinte du fichier au moment de la lecture: une entrée
+    dont l'empreinte ne correspond plus est ignorée puis remplacée.
+    Avec `db_path`, les entrées sont aussi conservées dans une base SQLite, ce qui
+    évite de relire les fichiers inchangés après un redémarrage de ComfyUI.
+    """
+
+    def __init__(self, capacity=1024, db_path=None):
+        self.capacity = max(0, int(capacity))
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata_cache ("
+            " path TEXT NOT NULL, variant TEXT NOT NULL, fingerprint TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (path, variant))"
+        )
+        self._db.commit()
+
+    def get(self, fingerprint, variant):
+        """Retourne une copie de la valeur en cache pour cette empreinte, ou None"""
+        path = fingerprint[0]
+        key = (path, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == fingerprint:
+                    self._entries.move_to_end(key)
+                    return copy.deepcopy(entry[1])
+                del self._entries[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value FROM metadata_cache WHERE path = ? AND variant = ? AND fingerprint = ?",
+                (path, json.dumps(variant), json.dumps(fingerprint)),
+            ).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            self._remember(key, fingerprint, value)
+            return copy.deepcopy(value)
+
+    def put(self, fingerprint, variant, value):
+        """Mémorise la valeur lue pour cette empreinte (remplace l'entrée précédente)"""
+        path = fingerprint[0]
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember((path, variant), fingerprint, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO metadata_cache (path, variant, fingerprint, value) VALUES (?, ?, ?, ?)",
+                    (path, json.dumps(variant), json.dumps(fingerprint), json.dumps(value, ensure_ascii=False)),
+                )
+                self._db.commit()
+
+    def _remember(self, key, fingerprint, value):
+        if self.capacity == 0:
+            return
+        self._entries[key] = (fingerprint, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        """Oublie toutes les entrées d'un fichier (après une écriture)"""
+        real_path = os.path.realpath(path)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == real_path]:
+                del self._entries[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM metadata_cache WHERE path = ?", (real_path,))
+                self._db.commit()
+
+    def clear(self):
+        """Vide le cache (mémoire et base SQLite)"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM metadata_cache")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,160 @@
+import os
+import re
+import time
+import uuid
+import string
+import hashlib
+import datetime
+import threading
+
+# Modèle par défaut des images sans nom d'origine: horodatage + compteur du dossier (jamais de collision)
+DEFAULT_TEMPLATE = "tagged_image_{timestamp}_{counter:05d}"
+# Modèle par défaut quand le nom de l'image d'entrée est connu (comportement historique)
+DEFAULT_NAMED_TEMPLATE = "{name}"
+# Champs rendant chaque nom unique: sans aucun d'eux, l'index de l'image est ajouté dans un batch
+UNIQUE_FIELDS = {"counter", "batch", "uuid", "ulid"}
+
+# Forme des valeurs de chaque champ dans un nom existant (les autres champs: n'importe quel texte)
+FIELD_PATTERNS = {
+    "timestamp": r"\d{8}_\d{6}",
+    "batch": r"\d+",
+    "counter": r"\d+",
+    "hash": r"[0-9a-f]+",
+    "uuid": r"[0-9a-f]{32}",
+    "ulid": r"[0-9A-Z]{26}",
+}
+
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_lock = threading.Lock()
+# Dossiers déjà créés (ou existants) dans ce processus: plus d'os.makedirs à chaque écriture
+_created_directories = set()
+# (dossier, modèle) -> prochaine valeur du compteur
+_counters = {}
+_formatter = string.Formatter()
+
+
+def _directory_key(directory):
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def ensure_directory(directory):
+    """Crée le dossier s'il n'existe pas, une seule fois par processus (résultat mémorisé)"""
+    key = _directory_key(directory)
+    if key in _created_directories:
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    with _lock:
+        _created_directories.add(key)
+    return directory
+
+
+def forget_directory(directory=None):
+    """
+    Oublie un dossier mémorisé (tous si None), ainsi que ses compteurs: à utiliser si le
+    dossier a été supprimé ou modifié hors du nœud (il sera recréé et parcouru à nouveau).
+    """
+    with _lock:
+        if directory is None:
+            _created_directories.clear()
+            _counters.clear()
+            return
+        key = _directory_key(directory)
+        _created_directories.discard(key)
+        for counter_key in [counter_key for counter_key in _counters if counter_key[0] == key]:
+            del _counters[counter_key]
+
+
+def new_ulid():
+    """ULID: horodatage en millisecondes (48 bits) + 80 bits aléatoires, en base 32 de Crockford (triable)"""
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), "big")
+    characters = []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        characters.append(CROCKFORD_ALPHABET[index])
+    return "".join(reversed(characters))
+
+
+def prompt_hash(prompt, length=8):
+    """Empreinte courte (hexadécimale) d'un prompt ou de métadonnées, stable d'une exécution à l'autre"""
+    return hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()[:length]
+
+
+def template_fields(template):
+    """Noms des champs d'un modèle (ex: {"name", "counter"})"""
+    return {field.split(".")[0].split("[")[0] for _, field, _, _ in _formatter.parse(template) if field}
+
+
+def _counter_pattern(template):
+    """Expression régulière retrouvant la valeur du compteur dans les noms produits par le modèle"""
+    parts = []
+    has_counter = False
+    for literal, field, _, _ in _formatter.parse(template):
+        parts.append(re.escape(literal))
+        if not field:
+            continue
+        if field == "counter" and not has_counter:
+            parts.append(r"(?P<counter>\d+)")
+            has_counter = True
+        else:
+            parts.append(f"(?:{FIELD_PATTERNS.get(field, '.*?')})")
+    return re.compile("^" + "".join(parts) + r"(?:_\d+)?(?:\.[^.]*)?$")
+
+
+def _scan_counter(directory, template):
+    """Plus grande valeur de compteur présente dans le dossier pour ce modèle (0 si aucune)"""
+    pattern = _counter_pattern(template)
+    highest = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                match = pattern.match(entry.name)
+                if match:
+                    highest = max(highest, int(match.group("counter")))
+    except OSError:
+        pass
+    return highest
+
+
+def next_counter(directory, template):
+    """
+    Prochaine valeur du compteur d'un dossier pour un modèle. Le dossier n'est parcouru
+    qu'au premier appel (pour repartir après les fichiers existants), le compteur est
+    ensuite incrémenté en mémoire: deux appels ne retournent jamais la même valeur.
+    """
+    key = (_directory_key(directory), template)
+    with _lock:
+        value = _counters.get(key)
+        if value is None:
+            value = _scan_counter(directory, template) + 1
+        _counters[key] = value + 1
+    return value
+
+
+def render_filename(template, directory, extension, name="", prompt="", batch_index=None, now=None):
+    """
+    Nom de fichier produit par un modèle, avec les champs:
+    {name} nom de l'image d'entrée sans extension (ou "tagged_image"), {timestamp} date et heure
+    (AAAAMMJJ_HHMMSS), {date} date et heure formatables (ex: {date:%Y-%m-%d}), {counter}
+    compteur du dossier, {batch} index de l'image dans le batch, {hash} empreinte du prompt,
+    {uuid} UUID4 (32 caractères hexadécimaux), {ulid} ULID (triable par date).
+    Un nombre peut être formaté, ex: {counter:05d}. Les / et \\ du nom rendu sont remplacés.
+    """
+    fields = template_fields(template)
+    now = now or datetime.datetime.now()
+    values = {
+        "name": name or "tagged_image",
+        "timestamp": now.strftime("%Y%m%d_%H%M%S"),
+        "date": now,
+        "batch": batch_index or 0,
+        "hash": prompt_hash(prompt) if "hash" in fields else "",
+        "uuid": uuid.uuid4().hex if "uuid" in fields else "",
+        "ulid": new_ulid() if "ulid" in fields else "",
+    }
+    if "counter" in fields:
+        values["counter"] = next_counter(directory, template)
+    filename = template.format(**values)
+    if batch_index is not None and not fields & UNIQUE_FIELDS:
+        # Modèle sans champ unique: chaque image du batch garde son propre fichier
+        filename = f"{filename}_{batch_index:05d}"
+    return re.sub(r"[\\/]", "_", filename) + extension
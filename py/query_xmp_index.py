@@ -0,0 +1,57 @@
+from .xmp_index import DEFAULT_INDEX_PATH, XMPIndex
+
+
+class QueryXMPIndex:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "query": ("STRING", {"default": ""}),
+                "query_mode": (["Tags", "Full text"], {"default": "Tags"}),
+                "directories": ("STRING", {"multiline": True, "default": ""}),
+                "recursive": ("BOOLEAN", {"default": True}),
+                "limit": ("INT", {"default": 1000, "min": 1, "max": 1000000}),
+            },
+            "optional": {
+                "index_path": ("STRING", {"default": ""}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "INT")
+    RETURN_NAMES = ("paths", "count")
+    OUTPUT_IS_LIST = (True, False)
+    FUNCTION = "query_index"
+    CATEGORY = "too/xmp-metadata"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Les dossiers peuvent avoir changé: toujours ré-exécuter (le crawl est incrémental)
+        return float("nan")
+
+    def query_index(self, query, query_mode, directories, recursive=True, limit=1000, index_path=""):
+        """
+        Recherche des images par tags dans l'index SQLite.
+        Les dossiers listés (un par ligne) sont d'abord (ré)indexés de façon incrémentale:
+        seuls les fichiers nouveaux ou modifiés sont relus.
+        Mode Tags: "chat | chien, portrait, -brouillon" (virgule = ET, | = OU, - = SAUF, * = préfixe).
+        Mode Full text: syntaxe FTS5 sur les tags et descriptions.
+        """
+        index = XMPIndex.open(index_path.strip() or DEFAULT_INDEX_PATH)
+
+        roots = [line.strip().strip('"') for line in directories.splitlines() if line.strip()]
+        if roots:
+            stats = index.crawl(roots, recursive)
+            print(f"[OK] Index XMP: {stats['scanned']} fichier(s) parcouru(s), "
+                  f"{stats['updated']} mis à jour, {stats['removed']} retiré(s)")
+
+        try:
+            if query_mode == "Full text":
+                paths = index.query_text(query, limit)
+            else:
+                paths = index.query_tags(query, limit)
+        except Exception as e:
+            print(f"/!\\ Requête invalide: {e}")
+            return ([f"Erreur: {e}"], 0)
+
+        print(f"[OK] {len(paths)} image(s) trouvée(s) pour: {query}")
+        return (paths, len(paths))
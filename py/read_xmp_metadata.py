@@ -1,4 +1,6 @@
+import json
 from .exiftool_manager import ExifToolManager
+from .instrumentation import timed
 
 class ReadXMPMetadata:
     @classmethod
@@ -8,6 +10,10 @@ class ReadXMPMetadata:
                 "image": ("STRING", {"default": ""}),
                 "metadata_type": (["Subject", "Description", "Create Date", "Modify Date", "Custom", "ALL"],),
                 "custom_metadata": ("STRING", {"default": ""}),
+            },
+            "optional": {
+                "backend": (["Auto", "Native", "ExifTool"], {"default": "Auto"}),
+                "sidecar_directory": ("STRING", {"default": ""}),
             }
         }
 
@@ -15,23 +21,47 @@ class ReadXMPMetadata:
     FUNCTION = "read_metadata"
     CATEGORY = "too/xmp-metadata"
 
-    def read_metadata(self, image, metadata_type, custom_metadata):
+    @classmethod
+    def IS_CHANGED(cls, image, metadata_type, custom_metadata, backend="Auto", sidecar_directory=""):
+        """
+        Empreinte du fichier (chemin réel, taille, mtime, inode, et celle du sidecar):
+        tant qu'elle ne change pas, ComfyUI réutilise le résultat sans ré-exécuter le nœud.
+        """
+        fingerprint = ExifToolManager.fingerprint(image, sidecar_directory)
+        # Fichier introuvable: NaN n'étant égal à rien, le nœud est toujours ré-exécuté
+        return str(fingerprint) if fingerprint is not None else float("nan")
+
+    @staticmethod
+    def format_value(value):
+        """Convertit une valeur typée (liste, structure, nombre) en texte lisible"""
+        if isinstance(value, list):
+            return ", ".join(ReadXMPMetadata.format_value(v) for v in value)
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False)
+        return str(value)
+
+    @timed("node.read")
+    def read_metadata(self, image, metadata_type, custom_metadata, backend="Auto", sidecar_directory=""):
         """
         Extrait une métadonnée spécifique d'une image ou toutes les métadonnées XMP.
         Cette méthode utilise ExifToolManager pour obtenir les métadonnées brutes,
         puis extrait la valeur spécifique demandée ou toutes les métadonnées.
+        En mode Auto, les PNG/JPEG/WebP sont lus directement (sans lancer ExifTool).
+        Un sidecar `.xmp` éventuel (à côté de l'image ou sous sidecar_directory) est
+        fusionné avec les métadonnées intégrées, ses valeurs étant prioritaires.
         """
         # Déterminer si on veut toutes les métadonnées
         get_all_metadata = (metadata_type == "ALL" or 
                            (metadata_type == "Custom" and custom_metadata.strip() in ["*", "ALL", "all"]))
         
         # Initialiser ExifToolManager pour lire les métadonnées
-        exiftool = ExifToolManager(console_debug=True)  # Debug temporairement activé
+        exiftool = ExifToolManager(console_debug=True, sidecar_directory=sidecar_directory)  # Debug temporairement activé
         
+        backend = backend.lower()
         if get_all_metadata:
-            metadata_dict = exiftool.extract_all_xmp_metadata(image)
+            metadata_dict = exiftool.extract_all_xmp_metadata(image, backend=backend)
         else:
-            metadata_dict = exiftool.extract_metadata(image)
+            metadata_dict = exiftool.extract_metadata(image, backend=backend)
         
         if "error" in metadata_dict:
             return (f"Error: {metadata_dict['error']}",)
@@ -49,7 +79,7 @@ class ReadXMPMetadata:
             sorted_keys = sorted(metadata_dict.keys())
             
             for key in sorted_keys:
-                value = metadata_dict[key]
+                value = self.format_value(metadata_dict[key])
                 # Nettoyer et formatter l'affichage
                 clean_key = key.replace("XMP-", "").replace(":", " > ")
                 formatted_output.append(f"{clean_key}: {value}")
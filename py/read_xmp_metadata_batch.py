@@ -0,0 +1,120 @@
+import os
+import glob
+import json
+from .exiftool_manager import ExifToolManager
+from .instrumentation import timed
+from .atomic_write import is_temp_file
+
+# Extensions reconnues lors du parcours d'un dossier
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".gif", ".heic", ".avif",
+                    ".dng", ".cr2", ".cr3", ".nef", ".arw", ".orf", ".rw2", ".raf"}
+
+
+def _is_image_name(name):
+    """Vrai pour un nom d'image lisible (extension connue, hors fichier temporaire d'écriture)"""
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not is_temp_file(name)
+
+
+def collect_image_paths(paths_spec, recursive=False):
+    """
+    Résout une liste de chemins (un par ligne) en fichiers images.
+    Chaque ligne peut être un fichier, un dossier ou un motif glob (ex: D:/images/*.png).
+    Les dossiers et les motifs ne retiennent que les images (ni temporaires, ni autres fichiers).
+    """
+    image_paths = []
+    seen = set()
+
+    def add(path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            image_paths.append(path)
+
+    for line in paths_spec.splitlines():
+        line = line.strip().strip('"')
+        if not line:
+            continue
+        if os.path.isdir(line):
+            if recursive:
+                for root, dirs, files in os.walk(line):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if _is_image_name(name):
+                            add(os.path.join(root, name))
+            else:
+                for name in sorted(os.listdir(line)):
+                    full_path = os.path.join(line, name)
+                    if _is_image_name(name) and os.path.isfile(full_path):
+                        add(full_path)
+        elif glob.has_magic(line):
+            for path in sorted(glob.glob(line, recursive=recursive)):
+                if _is_image_name(os.path.basename(path)) and os.path.isfile(path):
+                    add(path)
+        else:
+            add(line)
+    return image_paths
+
+
+class ReadXMPMetadataBatch:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "paths": ("STRING", {"multiline": True, "default": ""}),
+                "metadata_type": (["Subject", "Description", "Create Date", "Modify Date", "Custom", "ALL"],),
+                "custom_metadata": ("STRING", {"default": ""}),
+                "recursive": ("BOOLEAN", {"default": False}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("json", "paths", "values")
+    OUTPUT_IS_LIST = (False, True, True)
+    FUNCTION = "read_metadata"
+    CATEGORY = "too/xmp-metadata"
+
+    @timed("node.read_batch")
+    def read_metadata(self, paths, metadata_type, custom_metadata, recursive=False):
+        """
+        Lit les métadonnées XMP d'un ensemble de fichiers (dossier, motif glob ou liste
+        de chemins, un par ligne) en regroupant les fichiers dans quelques appels ExifTool.
+        Retourne le résultat complet en JSON, ainsi que les listes des chemins et des valeurs.
+        """
+        image_paths = collect_image_paths(paths, recursive)
+        if not image_paths:
+            return (json.dumps({}), [], [])
+
+        exiftool = ExifToolManager()
+
+        if metadata_type == "ALL":
+            fields = ["-XMP:all"]
+            lookup = None
+        elif metadata_type == "Custom":
+            custom_metadata = custom_metadata.strip()
+            if not custom_metadata:
+                return (json.dumps({"error": "Champ personnalisé requis pour le type Custom"}), [], [])
+            fields = [custom_metadata]
+            # La sortie JSON d'ExifTool utilise le nom du tag sans le groupe, renommé comme
+            # dans les résultats (ex: CreateDate -> "Create Date")
+            lookup = custom_metadata.split(":")[-1]
+            lookup = ExifToolManager.FIELD_NAMES.get(lookup, lookup)
+        else:
+            fields = None
+            lookup = metadata_type
+
+        results = {}
+        output_paths = []
+        output_values = []
+        for path, metadata in exiftool.iter_many(image_paths, fields):
+            results[path] = metadata
+            output_paths.append(path)
+            if "error" in metadata:
+                output_values.append(f"Error: {metadata['error']}")
+            elif lookup is None:
+                output_values.append(json.dumps(metadata, ensure_ascii=False))
+            else:
+                output_values.append(metadata.get(lookup, f"No {lookup} Found"))
+
+        print(f"[OK] Métadonnées XMP lues pour {len(results)} fichier(s)")
+
+        return (json.dumps(results, ensure_ascii=False, indent=2), output_paths, output_values)
@@ -0,0 +1,120 @@
+import io
+import re
+import csv
+import json
+
+# Poids de prompt autour d'un tag: (tag:1.2), ((tag)), [tag]
+WEIGHT_PATTERN = re.compile(r"^[\(\[\{]+\s*(.*?)\s*(?::\s*[-+]?(?:\d+\.?\d*|\.\d+))?\s*[\)\]\}]+$")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# Séparateurs d'une liste de tags en texte: virgules et retours à la ligne
+SEPARATOR_PATTERN = re.compile(r"[^,\r\n]+")
+
+
+def iter_tags(metadata):
+    """
+    Générateur des tags bruts d'une entrée: texte (liste séparée par des virgules et/ou
+    des retours à la ligne, CSV avec guillemets, JSON `{"tags": [...]}` ou `[...]`),
+    liste de tags, ou fichier ouvert lu ligne par ligne (sans tout charger en mémoire).
+    """
+    if metadata is None:
+        return
+    if isinstance(metadata, (list, tuple)):
+        for tag in metadata:
+            yield from iter_tags(tag) if isinstance(tag, (list, tuple)) else (str(tag),)
+        return
+    if not isinstance(metadata, str):
+        # Fichier ou itérable de lignes
+        for line in metadata:
+            yield from _iter_text_tags(line)
+        return
+
+    text = metadata.strip()
+    if text[:1] in ("{", "["):
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, dict) and "tags" in parsed:
+            tags = parsed["tags"]
+            yield from iter_tags(tags if isinstance(tags, list) else str(tags))
+            return
+        if isinstance(parsed, list):
+            yield from iter_tags(parsed)
+            return
+    yield from _iter_text_tags(metadata)
+
+
+def _iter_text_tags(text):
+    if '"' in text:
+        # Valeurs CSV entre guillemets (pouvant contenir des virgules)
+        for row in csv.reader(io.StringIO(text), skipinitialspace=True):
+            yield from row
+    else:
+        for match in SEPARATOR_PATTERN.finditer(text):
+            yield match.group()
+
+
+def subject_tags(subject):
+    """
+    Liste des tags d'une valeur Subject lue avec keep_lists (liste, ou texte pour un tag unique).
+    Les tags ne sont jamais redécoupés sur les virgules: un tag peut en contenir.
+    """
+    tags = subject if isinstance(subject, list) else [subject] if subject else []
+    return [str(tag).strip() for tag in tags if str(tag).strip()]
+
+
+def normalize_tag(tag, strip_weights=False):
+    """Nettoie un tag: espaces superflus, et poids de prompt retirés si demandé"""
+    tag = WHITESPACE_PATTERN.sub(" ", str(tag)).strip()
+    if strip_weights and tag:
+        match = WEIGHT_PATTERN.match(tag)
+        if match:
+            tag = match.group(1).strip()
+    return tag
+
+
+def tag_key_function(case_insensitive=False, underscores_as_spaces=False):
+    """
+    Fonction de comparaison des tags: deux tags de même clé sont considérés identiques
+    (la première orthographe rencontrée est conservée).
+    """
+    if not case_insensitive and not underscores_as_spaces:
+        return None
+
+    def key(tag):
+        if underscores_as_spaces:
+            tag = WHITESPACE_PATTERN.sub(" ", tag.replace("_", " ")).strip()
+        return tag.casefold() if case_insensitive else tag
+    return key
+
+
+def parse_tags(metadata, strip_weights=False, key=None):
+    """Liste des tags d'une entrée (voir iter_tags), nettoyés et sans doublons, dans l'ordre"""
+    return unique_tags((normalize_tag(tag, strip_weights) for tag in iter_tags(metadata)), key)
+
+
+def unique_tags(tags, key=None):
+    """Tags sans doublons ni vides, dans l'ordre d'apparition (en temps linéaire)"""
+    seen = {}
+    for tag in tags:
+        if not tag:
+            continue
+        seen.setdefault(key(tag) if key else tag, tag)
+    return list(seen.values())
+
+
+def merge_tags(existing, new, key=None):
+    """Union ordonnée: les tags existants, puis les nouveaux qui n'y sont pas déjà"""
+    return unique_tags(list(existing) + list(new), key)
+
+
+def remove_tags(existing, removed, key=None):
+    """Différence ordonnée: les tags existants qui ne font pas partie des tags retirés"""
+    removed = {key(tag) if key else tag for tag in removed}
+    return [tag for tag in unique_tags(existing, key) if (key(tag) if key else tag) not in removed]
+
+
+def common_tags(existing, tags, key=None):
+    """Intersection ordonnée: les tags existants qui font partie de tags (avec leur orthographe existante)"""
+    wanted = {key(tag) if key else tag for tag in tags}
+    return [tag for tag in unique_tags(existing, key) if (key(tag) if key else tag) in wanted]
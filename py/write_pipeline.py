@@ -0,0 +1,191 @@
+import os
+import queue
+import atexit
+import threading
+from collections import deque
+
+
+class WritePipeline:
+    """
+    Pipeline d'écriture en arrière-plan: encodage puis étiquetage ExifTool.
+    Les travaux sont placés dans une file bornée (la soumission attend si elle est pleine),
+    encodés par un pool de threads, puis passés à un thread unique qui applique les
+    métadonnées avec ExifTool. Le nœud appelant rend la main dès la soumission.
+    Un même chemin n'est jamais écrit par deux travaux en même temps: la soumission
+    attend la fin du travail précédent sur ce chemin, le dernier soumis l'emporte.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    # Taille de la file d'attente, surchargeable via TOO_XMP_WRITE_QUEUE
+    queue_size = int(os.environ.get("TOO_XMP_WRITE_QUEUE", "32"))
+    # Nombre d'échecs récents conservés pour le rapport d'état
+    MAX_FAILURES = 50
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self._jobs = queue.Queue(maxsize=max(1, int(queue_size or self.queue_size)))
+        self._tag_jobs = queue.Queue()
+        self._condition = threading.Condition()
+        self._reserved = {}
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._failures = deque(maxlen=self.MAX_FAILURES)
+        self._threads = []
+        for index in range(self.workers):
+            self._threads.append(threading.Thread(target=self._encode_loop, name=f"xmp-write-encode-{index}", daemon=True))
+        self._threads.append(threading.Thread(target=self._tag_loop, name="xmp-write-exiftool", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def get(cls):
+        """Retourne le pipeline partagé, en le créant au premier usage"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def submit(self, output_paths, encode, tag, finish, cleanup=None):
+        """
+        Soumet un travail d'écriture.
+        encode() sauvegarde les images et retourne les chemins restant à étiqueter par ExifTool,
+        tag(chemins) applique les métadonnées, finish() est appelé une fois tout écrit.
+        Chaque étape signale un échec en levant une exception; cleanup() est alors appelé
+        (ex: suppression des fichiers temporaires).
+        """
+        output_paths = list(output_paths)
+        with self._condition:
+            # Réserver les chemins: attendre qu'aucun travail en cours ne les écrive
+            while any(path in self._reserved for path in output_paths):
+                self._condition.wait()
+            for path in output_paths:
+                self._reserved[path] = True
+            self._pending += 1
+        self._jobs.put((output_paths, encode, tag, finish, cleanup))
+
+    def _encode_loop(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                pending_paths = job[1]()
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            if pending_paths:
+                self._tag_jobs.put((job, pending_paths))
+            else:
+                self._finish(job)
+
+    def _tag_loop(self):
+        while True:
+            job, pending_paths = self._tag_jobs.get()
+            try:
+                job[2](pending_paths)
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            self._finish(job)
+
+    def _finish(self, job):
+        try:
+            job[3]()
+        except Exception as e:
+            self._fail(job, e)
+            return
+        self._done(job[0])
+
+    def _fail(self, job, error):
+        cleanup = job[4]
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"/!\\ Nettoyage après échec impossible: {e}")
+        self._done(job[0], error)
+
+    def _done(self, output_paths, error=None):
+        if error is not None:
+            print(f"/!\\ Écriture en arrière-plan échouée pour {', '.join(output_paths)}: {error}")
+        with self._condition:
+            for path in output_paths:
+                self._reserved.pop(path, None)
+            self._pending -= 1
+            if error is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+                self._failures.append((output_paths, str(error)))
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Attend que toutes les écritures soumises soient terminées. Retourne False si le délai expire"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def status(self):
+        """État du pipeline: travaux en attente, terminés, échoués, et derniers échecs"""
+        with self._condition:
+            return {
+                "pending": self._pending,
+                "completed": self._completed,
+                "failed": self._failed,
+                "failures": [{"paths": paths, "error": error} for paths, error in self._failures],
+            }
+
+    @classmethod
+    def shutdown(cls, timeout=60.0):
+        """Termine les écritures en cours avant l'arrêt de l'interpréteur"""
+        with cls._instance_lock:
+            instance = cls._instance
+        if instance is not None and not instance.flush(timeout):
+            print("/!\\ Des écritures XMP en arrière-plan n'ont pas pu être terminées")
+
+
+class XMPWriteQueue:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "action": (["Status", "Flush"], {"default": "Flush"}),
+                "timeout": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 3600.0, "step": 1.0}),
+            },
+            "optional": {
+                # Entrée de dépendance: relier la sortie du nœud d'écriture pour attendre ses images
+                "output_path": ("STRING", {"forceInput": True}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "INT", "INT")
+    RETURN_NAMES = ("status", "pending", "failed")
+    # La liste de chemins du nœud d'écriture est reçue en une fois (un seul rapport)
+    INPUT_IS_LIST = True
+    FUNCTION = "report"
+    CATEGORY = "too/xmp-metadata"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        return float("nan")
+
+    def report(self, action, timeout=0.0, output_path=None):
+        """
+        Rapport d'état des écritures en arrière-plan (async_write du nœud Write XMP Metadata).
+        Flush attend la fin de toutes les écritures soumises (timeout 0 = sans limite).
+        """
+        action = action[0] if isinstance(action, list) else action
+        timeout = timeout[0] if isinstance(timeout, list) else timeout
+        pipeline = WritePipeline.get()
+        if action == "Flush" and not pipeline.flush(timeout or None):
+            print(f"/!\\ Écritures en arrière-plan toujours en cours après {timeout}s")
+
+        status = pipeline.status()
+        lines = [f"En attente: {status['pending']}, terminées: {status['completed']}, échouées: {status['failed']}"]
+        for failure in status["failures"]:
+            lines.append(f"  {', '.join(failure['paths'])}: {failure['error']}")
+        return ("\n".join(lines), status["pending"], status["failed"])
+
+
+# Terminer les écritures en attente à la sortie (avant l'arrêt des workers ExifTool)
+atexit.register(WritePipeline.shutdown)
@@ -1,8 +1,9 @@
 import os
-import subprocess
 import shutil
 import datetime
 import uuid
+from .exiftool_manager import ExifToolManager
+from .exiftool_command import ExifToolCommand
 
 class WriteXMPMetadataLossless:
     @classmethod
@@ -25,19 +26,8 @@ class WriteXMPMetadataLossless:
     OUTPUT_NODE = True
 
     def get_exiftool_path(self):
-        """Trouve le chemin d'ExifTool, en cherchant d'abord dans le PATH, puis localement"""
-        try:
-            result = subprocess.run(['exiftool', '-ver'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-            if result.returncode == 0:
-                return "exiftool"
-        except Exception:
-            pass
-
-        module_path = os.path.dirname(os.path.abspath(__file__))
-        exiftool_local = os.path.join(module_path, "../exiftool/exiftool.exe")
-        if os.path.exists(exiftool_local):
-            return os.path.abspath(exiftool_local)  # Utiliser le chemin absolu
-        return None
+        """Chemin d'ExifTool, recherché une seule fois par processus (voir ExifToolManager)"""
+        return ExifToolManager.get_exiftool_path()
 
     def get_output_path(self, input_image_path, output_dir=""):
         """
@@ -124,23 +114,25 @@ class WriteXMPMetadataLossless:
             tags = [t.strip() for t in metadata_dict.split(",")]
             
         # Construire la commande ExifTool pour ajouter les métadonnées XMP
-        cmd = [exiftool_path]
+        # (fichier d'arguments envoyé à la session ExifTool persistante)
+        cmd = ExifToolCommand()
         for tag in tags:
-            cmd.append(f"-XMP-dc:Subject+={tag}")
+            cmd.edit("XMP-dc:Subject", "+=", tag)
             
         if isinstance(metadata_dict, dict):
             for k, v in metadata_dict.items():
                 if k != "tags" and not isinstance(v, (dict, list)):
-                    cmd.append(f"-XMP-comfyui:{k}={v}")
+                    cmd.edit(f"XMP-comfyui:{k}", "=", v)
                     
-        cmd.append(output_path)
-        cmd.append("-overwrite_original")
+        cmd.files([output_path])
+        cmd.add("-overwrite_original")
         
         if console_debug:
-            print(f"-> Commande ExifTool: {' '.join(cmd)}")
+            print(f"-> Commande ExifTool: {exiftool_path} {' '.join(cmd)}")
             
         # Exécuter la commande pour ajouter les métadonnées
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        exiftool_manager = ExifToolManager()
+        result = exiftool_manager.execute(cmd)
         
         if result.returncode != 0:
             print(f"/!\\ Erreur lors de l'application des métadonnées: {result.stderr}")
@@ -174,6 +166,8 @@ class WriteXMPMetadataLossless:
             except Exception as e:
                 print(f"/!\\ Erreur lors de la vérification des dates: {e}")
         
+        # Le fichier réécrit ne doit pas être relu depuis le cache
+        ExifToolManager.invalidate(output_path)
         print(f"[OK] Image avec métadonnées XMP écrite: {output_path}")
         
         return (output_path,)
@@ -1,9 +1,20 @@
 import os
-import subprocess
 import shutil
 import datetime
 import uuid
+import hashlib
+import xml.etree.ElementTree as ET
 from .exiftool_manager import ExifToolManager
+from .exiftool_command import ExifToolCommand
+from .tag_list import common_tags, normalize_tag, parse_tags, remove_tags, subject_tags, tag_key_function
+from .xmp_packet import XMPDocument, UnsupportedXMPField
+from .xmp_container import (NATIVE_EXTENSIONS, UnsupportedContainer, build_splice_plan,
+                            content_digest, read_xmp_packet, write_plan)
+from .xmp_sidecar import InvalidSidecar, write_sidecar
+from .xmp_index import update_index
+from .atomic_write import AtomicOutputs
+from .output_naming import ensure_directory, forget_directory
+from .instrumentation import timer, timed, count_file
 
 class WriteXMPMetadataLossless:
     @classmethod
@@ -18,6 +29,12 @@ class WriteXMPMetadataLossless:
             "optional": {
                 "custom_field": ("STRING", {"default": "", "multiline": False}),
                 "output_directory": ("STRING", {"default": "./tagged"}),
+                "write_method": (["ExifTool", "Splice"], {"default": "ExifTool"}),
+                "output_mode": (["Tagged copy", "Sidecar (.xmp)"], {"default": "Tagged copy"}),
+                "sidecar_directory": ("STRING", {"default": ""}),
+                "strip_tag_weights": ("BOOLEAN", {"default": False}),  # (tag:1.2) -> tag
+                "case_insensitive_tags": ("BOOLEAN", {"default": False}),
+                "underscores_as_spaces": ("BOOLEAN", {"default": False}),  # black_hair = black hair
             }
         }
 
@@ -45,41 +62,63 @@ class WriteXMPMetadataLossless:
             original_dir = os.path.dirname(os.path.abspath(input_image_path))
             base_dir = os.path.join(original_dir, "tagged")
         
-        os.makedirs(base_dir, exist_ok=True)
+        # Dossier créé une seule fois par processus (pas d'os.makedirs à chaque fichier)
+        ensure_directory(base_dir)
         
         # Créer un nom de fichier avec le même nom de base mais dans le répertoire de sortie
         return os.path.join(base_dir, f"{filename_base}{file_extension}")
 
-    def parse_tags(self, metadata):
-        """Parse les tags depuis différents formats (JSON, CSV, etc.)"""
+    def write_spliced(self, input_image_path, output_path, edits):
+        """
+        Écrit la copie en une seule passe: l'original est lu une fois et recopié par blocs,
+        seul le paquet XMP est remplacé (ou inséré). Les blocs recopiés sont ensuite
+        comparés par empreinte SHA-256 pour garantir que les données d'image sont intactes.
+        Retourne False si le format, les champs ou le paquet d'origine (XML mal formé) ne sont
+        pas gérés (repli sur ExifTool), lève ValueError si la vérification échoue.
+        """
+        if os.path.splitext(input_image_path)[1].lower() not in NATIVE_EXTENSIONS:
+            return False
+
         try:
-            # Essayer de parser comme JSON
-            import json
-            try:
-                metadata_dict = json.loads(metadata)
-                if isinstance(metadata_dict, dict) and "tags" in metadata_dict:
-                    if isinstance(metadata_dict["tags"], list):
-                        return metadata_dict["tags"]
-                    else:
-                        return [t.strip() for t in str(metadata_dict["tags"]).split(",")]
-                else:
-                    return [t.strip() for t in metadata.split(",")]
-            except json.JSONDecodeError:
-                # Si ce n'est pas du JSON, traiter comme une liste séparée par des virgules
-                return [t.strip() for t in metadata.split(",")]
-        except:
-            # En cas d'erreur, utiliser le texte brut
-            return [t.strip() for t in metadata.split(",")]
-
-    def write_xmp(self, input_image_path, metadata, metadata_type="Subject", write_mode="Add to existing", custom_field="", output_directory=""):
+            with open(input_image_path, "rb") as source:
+                packet = read_xmp_packet(source)
+                document = XMPDocument.parse(packet) if packet else XMPDocument()
+                document.apply_edits(edits)
+                plan = build_splice_plan(source, document.to_bytes())
+
+                source_digest = hashlib.sha256()
+                with open(output_path, "wb") as output_file:
+                    write_plan(source, output_file, plan, source_digest)
+        except (UnsupportedContainer, UnsupportedXMPField, ET.ParseError) as e:
+            # ParseError: paquet XMP d'origine mal formé, qu'ExifTool sait réécrire
+            print(f"/!\\ Écriture par remplacement de bloc impossible ({e}), utilisation d'ExifTool")
+            return False
+
+        # Vérifier que tout ce qui n'est pas du XMP a été recopié à l'identique
+        with open(output_path, "rb") as output_file:
+            output_digest = content_digest(output_file, hashlib.sha256())
+        if output_digest.digest() != source_digest.digest():
+            os.remove(output_path)
+            raise ValueError(f"Vérification des données d'image échouée pour {output_path}")
+
+        shutil.copystat(input_image_path, output_path)
+        return True
+
+    @timed("node.write_lossless")
+    def write_xmp(self, input_image_path, metadata, metadata_type="Subject", write_mode="Add to existing", custom_field="", output_directory="", write_method="ExifTool", output_mode="Tagged copy", sidecar_directory="", strip_tag_weights=False, case_insensitive_tags=False, underscores_as_spaces=False):
         """
-        Ajoute des métadonnées XMP à une image existante, en préservant toutes les métadonnées d'origine
+        Ajoute des métadonnées XMP à une image existante, en préservant toutes les métadonnées d'origine.
+        write_method "Splice" remplace uniquement le bloc XMP en une passe (PNG/JPEG/WebP),
+        "ExifTool" copie le fichier puis le fait réécrire par ExifTool.
+        output_mode "Sidecar (.xmp)" laisse l'image intacte et écrit/fusionne un fichier
+        `<nom>.xmp` à côté de l'original (ou dans l'arborescence miroir sidecar_directory).
         """
-        # Initialiser ExifToolManager et vérifier si ExifTool est disponible
+        # Initialiser ExifToolManager (ExifTool n'est indispensable qu'avec la méthode ExifTool)
         exiftool_manager = ExifToolManager()
         exiftool_path = exiftool_manager.exiftool_path
         
-        if not exiftool_path:
+        sidecar_mode = output_mode == "Sidecar (.xmp)"
+        if not exiftool_path and write_method != "Splice" and not sidecar_mode:
             print("/!\\ ExifTool non trouvé. Installez-le pour utiliser les fonctionnalités XMP.")
             return ("Erreur: ExifTool non trouvé",)
             
@@ -94,89 +133,147 @@ class WriteXMPMetadataLossless:
             
         # Vérifier si le fichier d'entrée est dans un dossier "tagged" pour éviter les boucles
         input_dir = os.path.dirname(os.path.abspath(input_image_path)).lower()
-        if "tagged" in input_dir.split(os.path.sep):
+        if "tagged" in input_dir.split(os.path.sep) and not sidecar_mode:
             print(f"/!\\ Attention: Le fichier d'entrée est déjà dans un dossier 'tagged': {input_image_path}")
             if not output_directory or output_directory == "./tagged":  # Si aucun répertoire de sortie n'est spécifié, c'est risqué
                 print("/!\\ Traitement annulé pour éviter une boucle de traitement.")
                 return (f"Erreur: Fichier déjà dans un dossier 'tagged' - {input_image_path}",)
             
-        # Obtenir le chemin de sortie
-        output_path = self.get_output_path(input_image_path, output_directory)
-        
-        # Créer une copie du fichier original avec toutes ses propriétés
-        shutil.copy2(input_image_path, output_path)
-            
-        # Construire la commande ExifTool basée sur le type de métadonnées
-        cmd = [exiftool_path]
+        # Construire la liste des éditions (tag, opération, valeur) basée sur le type de métadonnées.
+        # Elle est traduite en arguments ExifTool, ou appliquée directement au paquet XMP (Splice).
+        edits = []
         
         if metadata_type == "Subject":
             # Gérer les tags Subject avec les différents modes
-            new_tags = self.parse_tags(metadata)
-            
+            key = tag_key_function(case_insensitive_tags, underscores_as_spaces)
+            new_tags = parse_tags(metadata, strip_tag_weights, key)
+
+            if key and write_mode in ["Add to existing", "Delete specified"]:
+                # Comparaison souple (casse, _ et espaces): les tags existants doivent être lus
+                # pour n'ajouter que les absents et retirer les présents sous leur orthographe d'origine.
+                # Ils sont lus en liste: un tag peut contenir une virgule
+                existing_metadata = exiftool_manager.extract_metadata(input_image_path, backend="auto", keep_lists=True)
+                existing_tags = [normalize_tag(tag) for tag in subject_tags(existing_metadata.get("Subject", ""))]
+                if write_mode == "Add to existing":
+                    new_tags = remove_tags(new_tags, existing_tags, key)
+                else:
+                    new_tags = common_tags(existing_tags, new_tags, key)
+
             if write_mode == "Add to existing":
                 # Simple : ajouter les nouveaux tags sans effacer
                 for tag in new_tags:
-                    if tag:
-                        cmd.append(f"-XMP-dc:Subject+={tag}")
+                    edits.append(("XMP-dc:Subject", "+=", tag))
                         
             elif write_mode == "Replace all":
-                # D'abord supprimer tous les Subject
-                clear_cmd = [exiftool_path, "-XMP-dc:Subject=", output_path, "-overwrite_original"]
-                result_clear = subprocess.run(clear_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                
-                # Puis ajouter les nouveaux tags
+                # Le premier "=" remplace la liste existante, les suivants s'y ajoutent:
+                # une seule écriture suffit, sans commande d'effacement préalable
                 if new_tags:
                     for tag in new_tags:
-                        if tag:
-                            cmd.append(f"-XMP-dc:Subject+={tag}")
-                # Si pas de nouveaux tags, on s'arrête là (Subject déjà effacé)
+                        edits.append(("XMP-dc:Subject", "=", tag))
+                else:
+                    # Si pas de nouveaux tags, on efface simplement les Subject
+                    edits.append(("XMP-dc:Subject", "=", ""))
                         
             elif write_mode == "Delete specified":
                 # Supprimer les tags spécifiés  
                 for tag in new_tags:
-                    if tag:
-                        cmd.append(f"-XMP-dc:Subject-={tag}")
+                    edits.append(("XMP-dc:Subject", "-=", tag))
                     
         elif metadata_type == "Description":
             # Pour Description, utiliser le texte entier
             if write_mode == "Replace all" or write_mode == "Add to existing":
-                cmd.append(f"-XMP-dc:Description={metadata}")
+                edits.append(("XMP-dc:Description", "=", metadata))
             elif write_mode == "Delete specified":
-                cmd.append("-XMP-dc:Description=")
+                edits.append(("XMP-dc:Description", "=", ""))
                 
         elif metadata_type == "Custom XMP":
             # Pour Custom XMP, utiliser le champ personnalisé
             if custom_field:
                 field_name = custom_field if ":" in custom_field else f"XMP-dc:{custom_field}"
                 if write_mode == "Replace all" or write_mode == "Add to existing":
-                    cmd.append(f"-{field_name}={metadata}")
+                    edits.append((field_name, "=", metadata))
                 elif write_mode == "Delete specified":
-                    cmd.append(f"-{field_name}=")
+                    edits.append((field_name, "=", ""))
             else:
                 print("/!\\ Aucun champ personnalisé spécifié pour le type Custom XMP")
                 return ("Erreur: Champ personnalisé requis pour le type Custom XMP",)
                 
-        # Ajouter les paramètres communs
-        cmd.append(output_path)
-        cmd.append("-overwrite_original")
-            
-        # Exécuter la commande pour ajouter les métadonnées
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        
-        if result.returncode != 0:
-            print(f"/!\\ Erreur lors de l'application des métadonnées: {result.stderr}")
-            return (f"Erreur: {result.stderr}",)
-            
-        # Préserver les dates après l'application des métadonnées
+        if sidecar_mode:
+            # Seul le sidecar est écrit (quelques Ko), l'image n'est ni copiée ni modifiée
+            try:
+                with timer("sidecar.write"):
+                    sidecar = write_sidecar(input_image_path, edits, sidecar_directory)
+            except (UnsupportedXMPField, InvalidSidecar) as e:
+                print(f"/!\\ Écriture du sidecar impossible: {e}")
+                return (f"Erreur: {e}",)
+            ExifToolManager.invalidate(input_image_path)
+            update_index([input_image_path], exiftool_manager)
+            print(f"[OK] Sidecar XMP écrit: {sidecar}")
+            return (sidecar,)
+
+        # Obtenir le chemin de sortie
+        output_path = self.get_output_path(input_image_path, output_directory)
+
         try:
-            # Obtenir les timestamps du fichier original
-            original_stat = os.stat(input_image_path)
-            
-            # Appliquer les timestamps au fichier de sortie
-            os.utime(output_path, (original_stat.st_atime, original_stat.st_mtime))
-        except Exception as e:
-            print(f"/!\\ Erreur lors de l'application des timestamps: {e}")
-        
+            # La copie est écrite et étiquetée sous un nom temporaire, puis renommée à sa place:
+            # un plantage ne laisse jamais de copie incomplète ou sans métadonnées
+            with AtomicOutputs([output_path]) as outputs:
+                target = outputs.temp(output_path)
+                spliced = False
+                if write_method == "Splice":
+                    # Une seule passe: l'original est recopié en remplaçant uniquement le bloc XMP
+                    with timer("lossless.splice"):
+                        spliced = self.write_spliced(input_image_path, target, edits)
+
+                if not spliced:
+                    if not exiftool_path:
+                        print("/!\\ ExifTool non trouvé. Installez-le pour utiliser les fonctionnalités XMP.")
+                        raise RuntimeError("ExifTool non trouvé")
+
+                    # Créer une copie du fichier original avec toutes ses propriétés
+                    with timer("lossless.copy"):
+                        shutil.copy2(input_image_path, target)
+
+                    # Construire la commande ExifTool (fichier d'arguments envoyé à la session persistante)
+                    cmd = ExifToolCommand().edits(edits)
+
+                    # Ajouter les paramètres communs
+                    cmd.files([target])
+                    cmd.add("-overwrite_original")
+
+                    # Exécuter la commande pour ajouter les métadonnées
+                    with timer("lossless.exiftool_write"):
+                        result = exiftool_manager.execute(cmd)
+
+                    if result.returncode != 0:
+                        print(f"/!\\ Erreur lors de l'application des métadonnées: {result.stderr}")
+                        raise RuntimeError(result.stderr)
+
+                # Préserver les dates après l'application des métadonnées (conservées par le renommage)
+                try:
+                    # Obtenir les timestamps du fichier original
+                    original_stat = os.stat(input_image_path)
+
+                    # Appliquer les timestamps au fichier de sortie
+                    os.utime(target, (original_stat.st_atime, original_stat.st_mtime))
+                except Exception as e:
+                    print(f"/!\\ Erreur lors de l'application des timestamps: {e}")
+        except ValueError as e:
+            print(f"/!\\ {e}")
+            return (f"Erreur: {e}",)
+        except RuntimeError as e:
+            return (f"Erreur: {e}",)
+        except OSError as e:
+            print(f"/!\\ Écriture de la copie impossible: {e}")
+            # Le dossier a pu être supprimé depuis sa création: il sera recréé au prochain essai
+            forget_directory(os.path.dirname(output_path))
+            return (f"Erreur: {e}",)
+
+        # Les dates étant préservées, l'empreinte seule ne suffit pas à détecter la réécriture
+        count_file("bytes.read", input_image_path)
+        count_file("bytes.written", output_path)
+        ExifToolManager.invalidate(output_path)
+        update_index([output_path], exiftool_manager)
         print(f"[OK] Image avec métadonnées XMP écrite: {output_path}")
         
         return (output_path,)
\ No newline at end of file
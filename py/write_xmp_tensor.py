@@ -1,11 +1,20 @@
+import io
 import os
-import subprocess
 import shutil
-import datetime
-import numpy as np
-import torch
-from PIL import Image
+import xml.etree.ElementTree as ET
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
 from .exiftool_manager import ExifToolManager
+from .exiftool_command import ExifToolCommand
+from .tag_list import merge_tags, normalize_tag, parse_tags, remove_tags, subject_tags, tag_key_function
+from .xmp_packet import XMPDocument, UnsupportedXMPField
+from .xmp_container import NATIVE_EXTENSIONS, UnsupportedContainer, build_splice_plan, read_xmp_file, write_plan
+from .xmp_sidecar import write_sidecar
+from .xmp_index import update_index
+from .write_pipeline import WritePipeline
+from .atomic_write import AtomicOutputs, path_locks
+from .output_naming import DEFAULT_NAMED_TEMPLATE, DEFAULT_TEMPLATE, ensure_directory, forget_directory, render_filename
+from .instrumentation import timer, timed, count_file
 
 class WriteXMPMetadataTensor:
     @classmethod
@@ -22,34 +31,77 @@ class WriteXMPMetadataTensor:
                 "custom_metadata": ("STRING", {"default": "", "multiline": False}),
                 "input_image_path": ("STRING", {"default": ""}),  # Pour préserver le nom si disponible
                 "output_directory": ("STRING", {"default": "./tagged"}),
+                "backend": (["ExifTool", "Native"], {"default": "ExifTool"}),
+                "output_mode": (["Embedded", "Sidecar (.xmp)"], {"default": "Embedded"}),
+                "sidecar_directory": ("STRING", {"default": ""}),
+                "photo_min_std": ("FLOAT", {"default": 40.0, "min": 0.0, "max": 128.0, "step": 1.0}),
+                "photo_min_unique_ratio": ("FLOAT", {"default": 0.5, "min": 0.0, "max": 1.0, "step": 0.05}),
+                "async_write": ("BOOLEAN", {"default": False}),
+                "encoder_preset": (["Default", "Fastest", "Balanced", "Smallest"], {"default": "Default"}),
+                "quality": ("INT", {"default": 0, "min": 0, "max": 100}),  # 0 = valeur du preset
+                "png_compress_level": ("INT", {"default": -1, "min": -1, "max": 9}),  # -1 = valeur du preset
+                "optimize": (["Preset", "On", "Off"], {"default": "Preset"}),
+                "jpeg_subsampling": (["Preset", "4:4:4", "4:2:2", "4:2:0"], {"default": "Preset"}),
+                "jpeg_progressive": (["Preset", "On", "Off"], {"default": "Preset"}),
+                "webp_method": ("INT", {"default": -1, "min": -1, "max": 6}),  # -1 = valeur du preset
+                "webp_lossless": (["Preset", "On", "Off"], {"default": "Preset"}),
+                "strip_tag_weights": ("BOOLEAN", {"default": False}),  # (tag:1.2) -> tag
+                "case_insensitive_tags": ("BOOLEAN", {"default": False}),
+                "underscores_as_spaces": ("BOOLEAN", {"default": False}),  # black_hair = black hair
+                "filename_template": ("STRING", {"default": ""}),  # ex: {name}_{counter:05d}, vide = défaut
             }
         }
 
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("output_path",)
+    OUTPUT_IS_LIST = (True,)
     FUNCTION = "write_xmp"
     CATEGORY = "too/xmp-metadata"
     OUTPUT_NODE = True
 
-    def get_output_path(self, output_directory="", output_format=".png", input_image_path=""):
+    # Réglages des encodeurs PIL par preset ("Default" = réglages historiques du nœud)
+    ENCODER_PRESETS = {
+        "Default": {
+            "png": {},
+            "jpeg": {"quality": 95},
+            "webp": {"quality": 95},
+        },
+        "Fastest": {
+            "png": {"compress_level": 1},
+            "jpeg": {"quality": 92, "subsampling": "4:2:0"},
+            "webp": {"quality": 90, "method": 0},
+        },
+        "Balanced": {
+            "png": {"compress_level": 4},
+            "jpeg": {"quality": 95, "subsampling": "4:2:0", "optimize": True},
+            "webp": {"quality": 92, "method": 4},
+        },
+        "Smallest": {
+            "png": {"compress_level": 9, "optimize": True},
+            "jpeg": {"quality": 90, "subsampling": "4:2:0", "optimize": True, "progressive": True},
+            "webp": {"quality": 85, "method": 6},
+        },
+    }
+
+    def get_output_path(self, output_directory="", output_format=".png", input_image_path="", batch_index=None,
+                        filename_template="", prompt=""):
         """
-        Génère un chemin de sortie pour l'image traitée, en préservant le nom du fichier
-        original si disponible
+        Génère un chemin de sortie pour l'image traitée à partir d'un modèle de nom (voir
+        render_filename). Par défaut, le nom du fichier original est préservé s'il est connu,
+        sinon le nom est horodaté et numéroté par un compteur propre au dossier, pour que
+        deux images écrites dans la même seconde ne s'écrasent jamais. Pour un batch de
+        plusieurs images, l'index de l'image est ajouté au nom si le modèle ne le rend pas unique.
         """
-        # Déterminer le nom du fichier
+        # Déterminer le nom du fichier d'origine
+        name = ""
         if input_image_path:
             # Supprimer les guillemets autour du chemin s'ils sont présents
             if input_image_path.startswith('"') and input_image_path.endswith('"'):
                 input_image_path = input_image_path[1:-1]
                 
             # Préserver le nom du fichier original sans son extension
-            original_name = os.path.basename(input_image_path)
-            filename_no_ext, _ = os.path.splitext(original_name)
-            filename = f"{filename_no_ext}{output_format}"
-        else:
-            # Sinon, générer un nom basé sur le timestamp
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"tagged_image_{timestamp}{output_format}"
+            name, _ = os.path.splitext(os.path.basename(input_image_path))
+        template = filename_template or (DEFAULT_NAMED_TEMPLATE if name else DEFAULT_TEMPLATE)
         
         # Déterminer le répertoire de sortie
         if output_directory and output_directory != "./tagged":
@@ -65,251 +117,463 @@ class WriteXMPMetadataTensor:
             parent_dir = os.path.dirname(module_path)  # Remonter au répertoire parent
             base_dir = os.path.join(parent_dir, "tagged")
         
-        os.makedirs(base_dir, exist_ok=True)
+        # Dossier créé une seule fois par processus (pas d'os.makedirs à chaque image)
+        ensure_directory(base_dir)
+        filename = render_filename(template, base_dir, output_format, name=name, prompt=prompt,
+                                   batch_index=batch_index)
         return os.path.join(base_dir, filename)
 
-    def parse_tags(self, metadata):
-        """Parse les tags depuis différents formats (JSON, CSV, etc.)"""
-        try:
-            # Essayer de parser comme JSON
-            import json
-            try:
-                metadata_dict = json.loads(metadata)
-                if isinstance(metadata_dict, dict) and "tags" in metadata_dict:
-                    if isinstance(metadata_dict["tags"], list):
-                        return metadata_dict["tags"]
-                    else:
-                        return [t.strip() for t in str(metadata_dict["tags"]).split(",")]
-                else:
-                    return [t.strip() for t in metadata.split(",")]
-            except json.JSONDecodeError:
-                # Si ce n'est pas du JSON, traiter comme une liste séparée par des virgules
-                return [t.strip() for t in metadata.split(",")]
-        except:
-            # En cas d'erreur, utiliser le texte brut
-            return [t.strip() for t in metadata.split(",")]
-
-    def write_xmp(self, image, metadata, format_mode="Preserve format", metadata_type="Subject", write_mode="Add to existing", custom_metadata="", input_image_path="", output_directory=""):
+    @timed("node.write_tensor")
+    def write_xmp(self, image, metadata, format_mode="Preserve format", metadata_type="Subject", write_mode="Add to existing", custom_metadata="", input_image_path="", output_directory="", backend="ExifTool", output_mode="Embedded", sidecar_directory="", photo_min_std=40.0, photo_min_unique_ratio=0.5, async_write=False, encoder_preset="Default", quality=0, png_compress_level=-1, optimize="Preset", jpeg_subsampling="Preset", jpeg_progressive="Preset", webp_method=-1, webp_lossless="Preset", strip_tag_weights=False, case_insensitive_tags=False, underscores_as_spaces=False, filename_template=""):
         """
-        Écrit les métadonnées XMP sur une image, en choisissant le format selon le mode
+        Écrit les métadonnées XMP sur toutes les images du batch, en choisissant le format
+        selon le mode. Avec le backend ExifTool, les images sont encodées en parallèle puis
+        les métadonnées sont appliquées à tous les fichiers en un seul appel ExifTool.
+        Avec le backend Native, le paquet XMP est inséré pendant l'encodage (PNG/JPEG/WebP).
+        En mode Sidecar, les images sont sauvegardées sans métadonnées et un fichier
+        `<nom>.xmp` est écrit à côté de chacune (ou dans l'arborescence sidecar_directory).
+        photo_min_std / photo_min_unique_ratio règlent la détection photo du mode Smart format.
+        Avec async_write, l'encodage et l'étiquetage se font en arrière-plan et les chemins
+        réservés sont retournés immédiatement (voir le nœud XMP Write Queue pour attendre).
+        encoder_preset et les options d'encodage qui suivent règlent la compression (voir encoder_settings).
+        Chaque image est encodée et étiquetée sous un nom temporaire, puis renommée à sa place
+        une fois complète (voir AtomicOutputs).
+        filename_template règle le nom des fichiers ({name}, {counter}, {batch}, {hash}, {uuid}, {ulid}...).
         """
-        # Initialiser ExifToolManager et vérifier si ExifTool est disponible
+        # Initialiser ExifToolManager (ExifTool n'est indispensable qu'avec le backend ExifTool)
         exiftool_manager = ExifToolManager()
         exiftool_path = exiftool_manager.exiftool_path
         
-        if not exiftool_path:
+        sidecar_mode = output_mode == "Sidecar (.xmp)"
+        if not exiftool_path and backend != "Native" and not sidecar_mode:
             print("/!\\ ExifTool non trouvé. Installez-le pour utiliser les fonctionnalités XMP.")
-            return ("Erreur: ExifTool non trouvé",)
+            return (["Erreur: ExifTool non trouvé"],)
 
-        # Convertir le tenseur en image PIL
-        if len(image.shape) == 4:
-            i = image[0].cpu().numpy()
-        else:
-            i = image.cpu().numpy()
-        i = np.clip(i * 255.0, 0, 255).astype(np.uint8)
-        img = Image.fromarray(i)
-        
-        # Déterminer le format de sortie selon le mode sélectionné
-        if format_mode == "Force PNG":
-            output_format = ".png"
-        elif format_mode == "Force JPG":
-            output_format = ".jpg"
-        elif format_mode == "Preserve format" and input_image_path:
-            # Supprimer les guillemets autour du chemin s'ils sont présents
-            if input_image_path.startswith('"') and input_image_path.endswith('"'):
-                input_image_path = input_image_path[1:-1]
-                
-            # Utiliser l'extension du fichier d'entrée si disponible
-            output_format = os.path.splitext(input_image_path)[1].lower()
-            # Vérifier que le format est supporté
-            if output_format not in ['.jpg', '.jpeg', '.png', '.webp']:
-                output_format = ".png"
-        elif format_mode == "Smart format":
-            # Détection intelligente du format optimal
-            has_alpha = len(i.shape) > 2 and i.shape[2] == 4
-            is_photo_like = self._is_photo_like(i)
-            
-            if has_alpha:
-                output_format = ".png"  # Garder PNG pour les images avec canal alpha
-            elif is_photo_like:
-                output_format = ".jpg"  # Utiliser JPEG pour les photos
-            else:
-                output_format = ".png"  # PNG par défaut pour les illustrations
-        else:
-            # Par défaut ou si le chemin d'entrée n'est pas fourni
-            output_format = ".png"
-        
-        # Obtenir le chemin de sortie
-        output_path = self.get_output_path(output_directory, output_format, input_image_path)
-        
-        # IMPORTANT: Lire TOUTES les métadonnées AVANT de sauvegarder l'image
-        # car une fois sauvegardée, TOUTES les métadonnées originales sont perdues
-        existing_tags = []
-        existing_metadata_to_preserve = {}
-        
-        if input_image_path and os.path.exists(input_image_path.strip('"')):
-            clean_input_path = input_image_path.strip('"')
-            all_existing_metadata = exiftool_manager.extract_metadata(clean_input_path)
-            
-            # Extraire les Subject pour la logique write_mode si on modifie Subject
-            if metadata_type == "Subject" and write_mode in ["Add to existing", "Delete specified"] and "Subject" in all_existing_metadata:
-                existing_subject = all_existing_metadata["Subject"]
-                if ";" in existing_subject:
-                    existing_tags = [t.strip() for t in existing_subject.split(";")]
-                else:
-                    existing_tags = [t.strip() for t in existing_subject.split(",")]
-            
-            # Préserver TOUTES les métadonnées pour les réécrire après (sauf celle qu'on modifie)
-            for key, value in all_existing_metadata.items():
-                existing_metadata_to_preserve[key] = value
-        
-        # Sauvegarder l'image dans le format approprié
-        if output_format.lower() in ['.jpg', '.jpeg']:
-            img.save(output_path, format="JPEG", quality=95)
-        elif output_format.lower() == '.webp':
-            img.save(output_path, format="WEBP", quality=95)
-        else:
-            img.save(output_path, format="PNG")
-            
-        # Construire la commande ExifTool basée sur le type de métadonnées
-        cmd = [exiftool_path]
+        # Supprimer les guillemets autour du chemin s'ils sont présents
+        if input_image_path.startswith('"') and input_image_path.endswith('"'):
+            input_image_path = input_image_path[1:-1]
+
+        encoder = self.encoder_settings(encoder_preset, quality=quality, png_compress_level=png_compress_level,
+                                        optimize=optimize, jpeg_subsampling=jpeg_subsampling,
+                                        jpeg_progressive=jpeg_progressive, webp_method=webp_method,
+                                        webp_lossless=webp_lossless)
+
+        # Convertir chaque image du batch en tableau uint8 (tampons réutilisés, sans temporaires float)
+        # Import à l'usage: numpy/torch/PIL ne ralentissent pas le chargement des nœuds au démarrage
+        from .image_convert import frames_to_uint8
+        with timer("tensor.convert"):
+            arrays = frames_to_uint8(image)
+        batch_size = len(arrays)
+
+        # Déterminer le format et le chemin de sortie de chaque image
+        output_paths = []
+        for index, i in enumerate(arrays):
+            with timer("tensor.select_format"):
+                output_format = self._select_format(i, format_mode, input_image_path,
+                                                    photo_min_std, photo_min_unique_ratio)
+            try:
+                output_paths.append(self.get_output_path(output_directory, output_format, input_image_path,
+                                                         batch_index=index if batch_size > 1 else None,
+                                                         filename_template=filename_template, prompt=metadata))
+            except (KeyError, IndexError, ValueError) as e:
+                print(f"/!\\ Modèle de nom de fichier invalide: {filename_template} ({e!r})")
+                return ([f"Erreur: Modèle de nom de fichier invalide - {filename_template}"],)
         
+        # Les métadonnées d'origine sont recopiées depuis l'image d'entrée pendant l'écriture
+        # (-tagsFromFile dans la même commande ExifTool, ou paquet XMP + EXIF + ICC d'origine
+        # en natif). Seul le champ modifié est lu, et seulement si le mode d'écriture a besoin
+        # de sa valeur actuelle.
+        source_path = input_image_path if input_image_path and os.path.exists(input_image_path) else None
+        existing_metadata = {}
+        if source_path and write_mode in ["Add to existing", "Delete specified"]:
+            # Lecture native du paquet XMP si possible (sans lancer ExifTool).
+            # Les tags sont lus en liste: un tag peut contenir une virgule
+            with timer("tensor.metadata_read"):
+                existing_metadata = exiftool_manager.extract_metadata(
+                    source_path, backend="auto", keep_lists=metadata_type == "Subject")
+            existing_metadata.pop("error", None)
+
+        # Construire la liste des éditions (tag, opération, valeur) du champ modifié.
+        # Elle est traduite en arguments ExifTool, ou appliquée directement au paquet XMP natif.
+        edits = []
+
         if metadata_type == "Subject":
             # Gérer les tags Subject avec les différents modes
-            new_tags = self.parse_tags(metadata)
-            
+            # Fusion et différence par ensembles (ordre conservé), en temps linéaire
+            key = tag_key_function(case_insensitive_tags, underscores_as_spaces)
+            new_tags = parse_tags(metadata, strip_tag_weights, key)
+            existing_tags = [normalize_tag(t) for t in subject_tags(existing_metadata.get("Subject", ""))]
+
             if write_mode == "Add to existing":
-                # Combiner avec les tags existants lus AVANT la sauvegarde
-                combined_tags = existing_tags.copy()
-                for tag in new_tags:
-                    if tag and tag not in combined_tags:
-                        combined_tags.append(tag)
-                
-                # Ajouter tous les tags (existants + nouveaux)
-                for tag in combined_tags:
-                    if tag:
-                        cmd.append(f"-XMP-dc:Subject+={tag}")
-                        
+                # Combiner avec les tags existants
+                final_tags = merge_tags(existing_tags, new_tags, key)
             elif write_mode == "Replace all":
                 # Remplacer par les nouveaux tags seulement
-                if new_tags:
-                    for tag in new_tags:
-                        if tag:
-                            cmd.append(f"-XMP-dc:Subject+={tag}")
-                        
-            elif write_mode == "Delete specified":
+                final_tags = new_tags
+            else:
                 # Supprimer les tags spécifiés des tags existants
-                remaining_tags = [tag for tag in existing_tags if tag not in new_tags]
-                
-                # Ajouter seulement les tags restants
-                for tag in remaining_tags:
-                    if tag:
-                        cmd.append(f"-XMP-dc:Subject+={tag}")
-                    
+                final_tags = remove_tags(existing_tags, new_tags, key)
+
+            # Vider la liste recopiée de l'original, puis y mettre la liste finale
+            edits.append(("XMP-dc:Subject", "=", ""))
+            edits.extend(("XMP-dc:Subject", "+=", tag) for tag in final_tags)
+
         elif metadata_type == "Description":
             # Pour Description, appliquer write_mode
-            existing_desc = existing_metadata_to_preserve.get("Description", "")
-            
-            if write_mode == "Add to existing":
-                if existing_desc:
-                    combined_desc = f"{existing_desc} {metadata}"
-                    cmd.append(f"-XMP-dc:Description={combined_desc}")
-                else:
-                    cmd.append(f"-XMP-dc:Description={metadata}")
-            elif write_mode == "Replace all":
-                cmd.append(f"-XMP-dc:Description={metadata}")
-            elif write_mode == "Delete specified":
-                # Ne pas ajouter de commande Description = elle sera absente
-                pass
-                
+            existing_desc = existing_metadata.get("Description", "")
+
+            if write_mode == "Add to existing" and existing_desc:
+                edits.append(("XMP-dc:Description", "=", f"{existing_desc} {metadata}"))
+            elif write_mode in ["Add to existing", "Replace all"]:
+                edits.append(("XMP-dc:Description", "=", metadata))
+            else:
+                # Delete specified: la description recopiée est supprimée
+                edits.append(("XMP-dc:Description", "=", ""))
+
         elif metadata_type == "Custom XMP":
             # Pour Custom XMP, appliquer write_mode
             if custom_metadata:
                 field_name = custom_metadata if ":" in custom_metadata else f"XMP-dc:{custom_metadata}"
-                existing_value = existing_metadata_to_preserve.get(custom_metadata, "")
-                
-                if write_mode == "Add to existing":
-                    if existing_value:
-                        combined_value = f"{existing_value} {metadata}"
-                        cmd.append(f"-{field_name}={combined_value}")
-                    else:
-                        cmd.append(f"-{field_name}={metadata}")
-                elif write_mode == "Replace all":
-                    cmd.append(f"-{field_name}={metadata}")
-                elif write_mode == "Delete specified":
-                    # Ne pas ajouter de commande = ce champ sera absent
-                    pass
-            else:
-                print("/!\\ Aucun champ personnalisé spécifié pour le type Custom XMP")
-                return ("Erreur: Champ personnalisé requis pour le type Custom XMP",)
-        
-        # Réécrire toutes les autres métadonnées existantes qui ont été perdues lors de la sauvegarde PIL
-        for key, value in existing_metadata_to_preserve.items():
-            # Ne pas réécrire la métadonnée qu'on vient de modifier
-            if key == "Subject" and metadata_type == "Subject":
-                continue  # Subject géré par la logique write_mode ci-dessus
-            elif key == "Description" and metadata_type == "Description":
-                continue  # Description gérée par la logique write_mode ci-dessus
-            elif metadata_type == "Custom XMP" and key == custom_metadata:
-                continue  # Champ custom géré par la logique write_mode ci-dessus
-            
-            # Réécriture spéciale pour Subject (un tag par commande)
-            if key == "Subject":
-                if ";" in value:
-                    subject_tags = [t.strip() for t in value.split(";")]
+                existing_value = existing_metadata.get(custom_metadata, "")
+
+                if write_mode == "Add to existing" and existing_value:
+                    edits.append((field_name, "=", f"{existing_value} {metadata}"))
+                elif write_mode in ["Add to existing", "Replace all"]:
+                    edits.append((field_name, "=", metadata))
                 else:
-                    subject_tags = [t.strip() for t in value.split(",")]
-                for tag in subject_tags:
-                    if tag:
-                        cmd.append(f"-XMP-dc:Subject+={tag}")
-            # Réécrire les autres métadonnées normalement
-            elif key in ["Description"]:
-                cmd.append(f"-XMP-dc:{key}={value}")
-            elif key in ["Create Date", "Modify Date"]:
-                cmd.append(f"-XMP-xmp:{key.replace(' ', '')}={value}")
+                    # Delete specified: ce champ recopié est supprimé
+                    edits.append((field_name, "=", ""))
             else:
-                # Pour les autres champs, essayer tel quel
-                cmd.append(f"-{key}={value}")
-            
-        # Ajouter les paramètres communs
-        cmd.append(output_path)
-        cmd.append("-overwrite_original")
-            
+                print("/!\\ Aucun champ personnalisé spécifié pour le type Custom XMP")
+                return (["Erreur: Champ personnalisé requis pour le type Custom XMP"],)
+
+        if async_write:
+            # Écriture en arrière-plan: les chemins sont réservés et retournés immédiatement,
+            # les images n'apparaissent sous leur nom qu'une fois complètes
+            outputs = AtomicOutputs(output_paths)
+            WritePipeline.get().submit(
+                output_paths,
+                lambda: self._encode_frames(arrays, output_paths, edits, backend, sidecar_mode, sidecar_directory,
+                                            encoder, source_path, outputs.temps()),
+                lambda pending_paths: self._tag_frames(pending_paths, edits, exiftool_manager, source_path),
+                lambda: self._commit_frames(outputs, exiftool_manager, sidecar_mode),
+                outputs.discard,
+            )
+            print(f"[OK] {batch_size} image(s) en cours d'écriture en arrière-plan")
+            return (output_paths,)
+
+        try:
+            # Écriture sous des noms temporaires, renommés à la sortie du bloc si tout a réussi
+            with AtomicOutputs(output_paths) as outputs:
+                pending_paths = self._encode_frames(arrays, output_paths, edits, backend, sidecar_mode,
+                                                    sidecar_directory, encoder, source_path, outputs.temps())
+                if pending_paths:
+                    self._tag_frames(pending_paths, edits, exiftool_manager, source_path)
+        except OSError as e:
+            print(f"/!\\ Écriture des images impossible: {e}")
+            # Le dossier a pu être supprimé depuis sa création: il sera recréé au prochain essai
+            forget_directory(os.path.dirname(output_paths[0]))
+            return ([f"Erreur: {e}"],)
+        except UnsupportedXMPField as e:
+            print(f"/!\\ Écriture du sidecar impossible: {e}")
+            return ([f"Erreur: {e}"],)
+        except RuntimeError as e:
+            return ([f"Erreur: {e}"],)
+
+        self._finish_frames(output_paths, exiftool_manager, sidecar_mode)
+        return (output_paths,)
+
+    def _encode_frames(self, arrays, output_paths, edits, backend, sidecar_mode, sidecar_directory,
+                       encoder=None, source_path=None, temp_paths=None):
+        """
+        Sauvegarde les images du batch. En mode Sidecar, les métadonnées sont écrites dans
+        les sidecars; avec le backend Native, dans le paquet XMP inséré à l'encodage.
+        Les métadonnées de source_path (image d'entrée) sont conservées.
+        Les images sont écrites dans temp_paths s'ils sont fournis (les sidecars restent
+        nommés d'après output_paths).
+        Retourne les chemins (temporaires) restant à étiqueter par ExifTool.
+        """
+        temp_paths = temp_paths or output_paths
+        if sidecar_mode:
+            # Sauvegarder les images telles quelles, les métadonnées vont dans les sidecars
+            max_workers = min(len(arrays), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(self._save_image, arrays, temp_paths, repeat(None), repeat(encoder)))
+            for output_path in output_paths:
+                # Le sidecar part du XMP de l'image d'entrée (s'il est lisible nativement)
+                document = self._source_document(source_path)
+                with timer("sidecar.write"):
+                    sidecar = write_sidecar(output_path, edits, sidecar_directory, merge=False, document=document)
+                print(f"[OK] Image écrite: {output_path} (sidecar XMP: {sidecar})")
+            return []
+
+        # Backend natif: le paquet XMP est écrit pendant l'encodage, sans processus externe.
+        # Les images que le mode natif ne sait pas traiter repassent par ExifTool.
+        pending_paths = temp_paths
+        pending_arrays = arrays
+        if backend == "Native":
+            pending_paths, pending_arrays = self._write_native(arrays, temp_paths, edits, encoder, source_path)
+
+        if pending_paths:
+            # Sauvegarder les images en parallèle (les encodeurs PIL libèrent le GIL)
+            max_workers = min(len(pending_arrays), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(self._save_image, pending_arrays, pending_paths, repeat(None), repeat(encoder)))
+        return pending_paths
+
+    # Tags jamais recopiés de l'image d'entrée: ComfyUI redresse déjà l'image au chargement
+    EXCLUDED_SOURCE_TAGS = ["Orientation"]
+
+    def _tag_frames(self, pending_paths, edits, exiftool_manager, source_path=None):
+        """
+        Applique les métadonnées à toutes les images en une seule commande ExifTool.
+        Avec source_path, toutes les métadonnées de l'image d'entrée sont recopiées dans
+        la même commande (-tagsFromFile), sauf les champs modifiés qui sont réécrits.
+        """
+        if not exiftool_manager.exiftool_path:
+            print("/!\\ ExifTool non trouvé. Installez-le pour utiliser les fonctionnalités XMP.")
+            raise RuntimeError("ExifTool non trouvé")
+
+        # Construire la commande ExifTool (fichier d'arguments envoyé à la session persistante)
+        cmd = ExifToolCommand()
+        if source_path:
+            cmd.tags_from_file(source_path, exclude=[tag for tag, _, _ in edits] + self.EXCLUDED_SOURCE_TAGS)
+        cmd.edits(edits)
+
+        # Ajouter les paramètres communs: les mêmes métadonnées sont appliquées
+        # à toutes les images du batch en une seule commande
+        cmd.files(pending_paths)
+        cmd.add("-overwrite_original")
+
         # Exécuter la commande pour ajouter les métadonnées
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        
+        with timer("tensor.exiftool_write"):
+            result = exiftool_manager.execute(cmd)
+
         if result.returncode != 0:
             print(f"/!\\ Erreur lors de l'application des métadonnées: {result.stderr}")
-            return (f"Erreur: {result.stderr}",)
+            raise RuntimeError(result.stderr)
+
+    def _commit_frames(self, outputs, exiftool_manager, sidecar_mode=False):
+        """Renomme les images écrites en arrière-plan à leur place, puis termine l'écriture"""
+        with path_locks(outputs.output_paths):
+            outputs.commit()
+        self._finish_frames(outputs.output_paths, exiftool_manager, sidecar_mode)
+
+    def _finish_frames(self, output_paths, exiftool_manager, sidecar_mode=False):
+        """Invalide le cache de lecture et met à jour l'index une fois les images écrites"""
+        ExifToolManager.invalidate(*output_paths)
+        update_index(output_paths, exiftool_manager)
+        if not sidecar_mode:
+            for output_path in output_paths:
+                print(f"[OK] Image avec métadonnées XMP écrite: {output_path}")
+
+    def _source_document(self, source_path, strict=False):
+        """
+        Document XMP de l'image d'entrée (vide si absente, sans XMP, illisible nativement ou à
+        paquet mal formé). Avec strict, UnsupportedContainer (ex: XMP étendu) et ParseError (paquet
+        mal formé) sont propagées pour repasser par ExifTool.
+        """
+        document = None
+        if source_path and os.path.splitext(source_path)[1].lower() in NATIVE_EXTENSIONS:
+            try:
+                packet = read_xmp_file(source_path)
+                if packet:
+                    document = XMPDocument.parse(packet)
+            except OSError:
+                document = None
+            except (UnsupportedContainer, ET.ParseError) as e:
+                if strict:
+                    raise
+                if isinstance(e, ET.ParseError):
+                    print(f"/!\\ XMP de l'image d'entrée mal formé, ignoré ({e})")
+                document = None
+        if document is None:
+            return XMPDocument()
+        for tag in self.EXCLUDED_SOURCE_TAGS:
+            document.delete(f"tiff:{tag}")
+        return document
+
+    def _source_embedded(self, source_path):
+        """Profil ICC et bloc EXIF de l'image d'entrée, en options de sauvegarde PIL"""
+        from PIL import Image
+        options = {}
+        try:
+            with Image.open(source_path) as source:
+                icc_profile = source.info.get("icc_profile")
+                if icc_profile:
+                    options["icc_profile"] = icc_profile
+                exif = source.getexif()
+                # Orientation (0x0112): l'image du tenseur est déjà redressée
+                exif.pop(0x0112, None)
+                if len(exif):
+                    options["exif"] = exif.tobytes()
+        except Exception as e:
+            print(f"/!\\ Métadonnées EXIF/ICC de l'original illisibles ({e})")
+        return options
+
+    def _write_native(self, arrays, output_paths, edits, encoder=None, source_path=None):
+        """
+        Encode les images en mémoire et y insère directement le paquet XMP
+        (chunk iTXt PNG, segment APP1 JPEG, chunk XMP WebP).
+        Avec source_path, le paquet part du XMP de l'image d'entrée, dont l'EXIF et
+        le profil ICC sont aussi recopiés à l'encodage.
+        Retourne les chemins et tableaux que le mode natif n'a pas pu traiter.
+        """
+        if source_path and os.path.splitext(source_path)[1].lower() not in NATIVE_EXTENSIONS:
+            # XMP d'origine illisible nativement: ExifTool le recopiera
+            print(f"/!\\ Format d'origine non géré en natif, utilisation d'ExifTool")
+            return output_paths, arrays
+
+        try:
+            document = self._source_document(source_path, strict=True)
+            document.apply_edits(edits)
+            packet = document.to_bytes()
+        except (UnsupportedContainer, UnsupportedXMPField, ET.ParseError) as e:
+            print(f"/!\\ Écriture native impossible ({e}), utilisation d'ExifTool")
+            return output_paths, arrays
+
+        native_encoder = encoder or self.ENCODER_PRESETS["Default"]
+        if source_path:
+            embedded = self._source_embedded(source_path)
+            native_encoder = {name: dict(options, **embedded) for name, options in native_encoder.items()}
+
+        native_items = []
+        fallback_paths, fallback_arrays = [], []
+        for i, output_path in zip(arrays, output_paths):
+            if os.path.splitext(output_path)[1].lower() in NATIVE_EXTENSIONS:
+                native_items.append((i, output_path))
+            else:
+                fallback_paths.append(output_path)
+                fallback_arrays.append(i)
+
+        def save_native(item):
+            i, output_path = item
+            try:
+                self._save_image(i, output_path, packet, native_encoder)
+                return None
+            except UnsupportedContainer as e:
+                print(f"/!\\ Écriture native impossible pour {output_path} ({e}), utilisation d'ExifTool")
+                return item
+
+        if native_items:
+            max_workers = min(len(native_items), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for failed in executor.map(save_native, native_items):
+                    if failed is not None:
+                        fallback_arrays.append(failed[0])
+                        fallback_paths.append(failed[1])
+
+        return fallback_paths, fallback_arrays
+
+    def _select_format(self, i, format_mode, input_image_path="", photo_min_std=40.0, photo_min_unique_ratio=0.5):
+        """Détermine le format de sortie selon le mode sélectionné"""
+        if format_mode == "Force PNG":
+            return ".png"
+        elif format_mode == "Force JPG":
+            return ".jpg"
+        elif format_mode == "Preserve format" and input_image_path:
+            # Utiliser l'extension du fichier d'entrée si disponible
+            output_format = os.path.splitext(input_image_path)[1].lower()
+            # Vérifier que le format est supporté
+            if output_format not in ['.jpg', '.jpeg', '.png', '.webp']:
+                output_format = ".png"
+            return output_format
+        elif format_mode == "Smart format":
+            # Détection intelligente du format optimal
+            has_alpha = len(i.shape) > 2 and i.shape[2] == 4
+            is_photo_like = self._is_photo_like(i, photo_min_std, photo_min_unique_ratio)
             
-        print(f"[OK] Image avec métadonnées XMP écrite: {output_path}")
-        
-        return (output_path,)
+            if has_alpha:
+                return ".png"  # Garder PNG pour les images avec canal alpha
+            elif is_photo_like:
+                return ".jpg"  # Utiliser JPEG pour les photos
+            else:
+                return ".png"  # PNG par défaut pour les illustrations
+        # Par défaut ou si le chemin d'entrée n'est pas fourni
+        return ".png"
+
+    @classmethod
+    def encoder_settings(cls, preset="Default", quality=0, png_compress_level=-1, optimize="Preset",
+                         jpeg_subsampling="Preset", jpeg_progressive="Preset", webp_method=-1, webp_lossless="Preset"):
+        """
+        Options de sauvegarde PIL par format ({"png": {...}, "jpeg": {...}, "webp": {...}}):
+        celles du preset, remplacées par les options explicites qui ne valent pas "Preset" / 0 / -1.
+        """
+        settings = {name: dict(options) for name, options in cls.ENCODER_PRESETS.get(preset, cls.ENCODER_PRESETS["Default"]).items()}
+        if quality > 0:
+            settings["jpeg"]["quality"] = quality
+            settings["webp"]["quality"] = quality
+        if png_compress_level >= 0:
+            settings["png"]["compress_level"] = png_compress_level
+        if optimize != "Preset":
+            settings["png"]["optimize"] = optimize == "On"
+            settings["jpeg"]["optimize"] = optimize == "On"
+        if jpeg_subsampling != "Preset":
+            settings["jpeg"]["subsampling"] = jpeg_subsampling
+        if jpeg_progressive != "Preset":
+            settings["jpeg"]["progressive"] = jpeg_progressive == "On"
+        if webp_method >= 0:
+            settings["webp"]["method"] = webp_method
+        if webp_lossless != "Preset":
+            settings["webp"]["lossless"] = webp_lossless == "On"
+        return settings
+
+    def _save_image(self, i, output_path, xmp_packet=None, encoder=None):
+        """
+        Sauvegarde un tableau uint8 dans le format correspondant à l'extension du chemin,
+        avec les options d'encodage fournies (voir encoder_settings).
+        Si un paquet XMP est fourni, l'image est encodée en mémoire puis écrite avec le
+        paquet inséré, en une seule écriture sur le disque.
+        """
+        from PIL import Image
+        encoder = encoder or self.ENCODER_PRESETS["Default"]
+        img = Image.fromarray(i)
+        destination = io.BytesIO() if xmp_packet is not None else output_path
+        output_format = os.path.splitext(output_path)[1].lower()
+        with timer("tensor.encode"):
+            if output_format in ['.jpg', '.jpeg']:
+                img.save(destination, format="JPEG", **encoder["jpeg"])
+            elif output_format == '.webp':
+                img.save(destination, format="WEBP", **encoder["webp"])
+            else:
+                img.save(destination, format="PNG", **encoder["png"])
+
+        if xmp_packet is not None:
+            with timer("tensor.native_xmp_insert"):
+                plan = build_splice_plan(destination, xmp_packet)
+                with open(output_path, "wb") as output_file:
+                    write_plan(destination, output_file, plan)
+        count_file("bytes.written", output_path)
         
-    def _is_photo_like(self, img_array):
+    # Taille de la grille d'échantillonnage de la détection photo (environ 100 x 100 pixels)
+    PHOTO_SAMPLE_SIZE = 100
+
+    @timed("tensor.photo_detect")
+    def _is_photo_like(self, img_array, min_std=40.0, min_unique_ratio=0.5):
         """
         Détecte si une image ressemble plus à une photo qu'à une illustration
         en analysant sa distribution de couleurs et sa complexité.
+        L'analyse porte sur une grille d'environ 100 x 100 pixels prélevés à pas fixe
+        (sans rééchantillonnage PIL), les couleurs RGB étant regroupées en entiers 24 bits.
         """
-        try:
-            # Réduire la taille pour l'analyse
-            from PIL import Image
-            img = Image.fromarray(img_array)
-            img_small = img.resize((100, 100))
-            img_array_small = np.array(img_small)
-            
-            # Analyser la variance des couleurs (les photos ont souvent une plus grande variance)
-            if len(img_array_small.shape) == 3:
-                std_dev = np.std(img_array_small)
-                
-                # Calculer le nombre de couleurs uniques (normalisé par la taille)
-                flat = img_array_small.reshape(-1, img_array_small.shape[2])
-                unique_colors = np.unique(flat, axis=0).shape[0]
-                unique_ratio = unique_colors / flat.shape[0]
-                
-                # Les photos ont souvent une grande variance et beaucoup de couleurs uniques
-                return std_dev > 40 and unique_ratio > 0.5
+        import numpy as np
+        if img_array.ndim != 3 or img_array.shape[2] < 3:
+            return False
+
+        # Sous-échantillonnage à pas fixe: une vue, sans copie ni interpolation
+        height, width = img_array.shape[:2]
+        step_y = max(1, height // self.PHOTO_SAMPLE_SIZE)
+        step_x = max(1, width // self.PHOTO_SAMPLE_SIZE)
+        sample = img_array[::step_y, ::step_x, :3]
+
+        # Analyser la variance des couleurs (les photos ont souvent une plus grande variance)
+        if np.std(sample) <= min_std:
             return False
-        except Exception:
-            # En cas d'erreur, considérer comme non-photo par défaut
-            return False
\ No newline at end of file
+
+        # Nombre de couleurs uniques (normalisé par la taille), sur les couleurs regroupées en 24 bits
+        sample = sample.astype(np.uint32)
+        packed = (sample[..., 0] << 16) | (sample[..., 1] << 8) | sample[..., 2]
+        unique_ratio = np.unique(packed).size / packed.size
+
+        # Les photos ont souvent une grande variance et beaucoup de couleurs uniques
+        return unique_ratio > min_unique_ratio
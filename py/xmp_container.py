@@ -0,0 +1,384 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_XMP_KEYWORD = b"XML:com.adobe.xmp"
+JPEG_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+JPEG_XMP_EXT_HEADER = b"http://ns.adobe.com/xmp/extension/\x00"
+JPEG_EXIF_HEADER = b"Exif\x00\x00"
+# Taille maximale d'un paquet XMP dans un segment APP1 (au-delà: XMP étendu, non géré ici)
+JPEG_MAX_XMP_SIZE = 65533 - len(JPEG_XMP_HEADER)
+WEBP_IMAGE_CHUNKS = {b"VP8 ", b"VP8L", b"ALPH", b"ANIM", b"ANMF"}
+# Extensions gérées par l'écriture/lecture XMP native
+NATIVE_EXTENSIONS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class UnsupportedContainer(ValueError):
+    """Format de fichier (ou cas particulier) que l'écriture XMP native ne sait pas traiter"""
+
+
+class Segment:
+    """
+    Bloc d'un fichier image: chunk PNG, segment JPEG ou chunk RIFF/WebP.
+    `kind` vaut "header", "xmp", "xmp_ext", "exif", "jfif", "vp8x", "image" ou "other".
+    """
+    __slots__ = ("kind", "offset", "size", "name")
+
+    def __init__(self, kind, offset, size, name=b""):
+        self.kind = kind
+        self.offset = offset
+        self.size = size
+        self.name = name
+
+    def __repr__(self):
+        return f"Segment({self.kind!r}, offset={self.offset}, size={self.size}, name={self.name!r})"
+
+
+def detect_format(header):
+    """Identifie le conteneur à partir des premiers octets du fichier"""
+    if header.startswith(PNG_SIGNATURE):
+        return "png"
+    if header.startswith(b"\xff\xd8"):
+        return "jpeg"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def iter_segments(stream):
+    """
+    Parcourt paresseusement les blocs d'un fichier PNG, JPEG ou WebP sans lire les pixels:
+    seuls les en-têtes des blocs (et quelques octets pour identifier les segments APP1
+    et iTXt) sont lus, le reste est sauté par seek().
+    """
+    stream.seek(0)
+    header = stream.read(12)
+    fmt = detect_format(header)
+    if fmt == "png":
+        yield from _iter_png(stream)
+    elif fmt == "jpeg":
+        yield from _iter_jpeg(stream)
+    elif fmt == "webp":
+        yield from _iter_webp(stream)
+    else:
+        raise UnsupportedContainer("Format d'image non supporté par le mode natif")
+
+
+def _iter_png(stream):
+    yield Segment("header", 0, len(PNG_SIGNATURE), b"PNG")
+    offset = len(PNG_SIGNATURE)
+    while True:
+        stream.seek(offset)
+        chunk_header = stream.read(8)
+        if len(chunk_header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", chunk_header)
+        size = length + 12
+        kind = "other"
+        if chunk_type == b"IDAT":
+            kind = "image"
+        elif chunk_type == b"iTXt":
+            keyword = stream.read(min(length, len(PNG_XMP_KEYWORD) + 1))
+            if keyword == PNG_XMP_KEYWORD + b"\x00":
+                kind = "xmp"
+        yield Segment(kind, offset, size, chunk_type)
+        offset += size
+        if chunk_type == b"IEND":
+            return
+
+
+def _iter_jpeg(stream):
+    file_size = _stream_size(stream)
+    yield Segment("header", 0, 2, b"SOI")
+    offset = 2
+    while offset < file_size:
+        stream.seek(offset)
+        marker = stream.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            # Données inattendues: tout le reste est conservé tel quel
+            yield Segment("image", offset, file_size - offset, b"")
+            return
+        code = marker[1]
+        if code == 0xFF:
+            # Octet de remplissage
+            yield Segment("other", offset, 1, b"\xff")
+            offset += 1
+            continue
+        if code == 0xDA or code == 0xD9:
+            # Début des données compressées (SOS) ou fin d'image: le reste du fichier est conservé
+            yield Segment("image", offset, file_size - offset, bytes([code]))
+            return
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            yield Segment("other", offset, 2, bytes([code]))
+            offset += 2
+            continue
+
+        length_bytes = stream.read(2)
+        if len(length_bytes) < 2:
+            yield Segment("image", offset, file_size - offset, bytes([code]))
+            return
+        length = struct.unpack(">H", length_bytes)[0]
+        kind = "other"
+        if code == 0xE1:
+            prefix = stream.read(min(length - 2, len(JPEG_XMP_EXT_HEADER)))
+            if prefix.startswith(JPEG_XMP_HEADER):
+                kind = "xmp"
+            elif prefix.startswith(JPEG_XMP_EXT_HEADER):
+                kind = "xmp_ext"
+            elif prefix.startswith(JPEG_EXIF_HEADER):
+                kind = "exif"
+        elif code == 0xE0:
+            kind = "jfif"
+        elif 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            # SOFn: paramètres de l'image, indispensables au décodage
+            kind = "image"
+        yield Segment(kind, offset, 2 + length, bytes([code]))
+        offset += 2 + length
+
+
+def _iter_webp(stream):
+    stream.seek(4)
+    riff_size = struct.unpack("<I", stream.read(4))[0]
+    end = 8 + riff_size
+    yield Segment("header", 0, 12, b"RIFF")
+    offset = 12
+    while offset + 8 <= end:
+        stream.seek(offset)
+        chunk_header = stream.read(8)
+        if len(chunk_header) < 8:
+            return
+        fourcc, length = struct.unpack("<4sI", chunk_header)
+        size = 8 + length + (length & 1)
+        if fourcc == b"XMP ":
+            kind = "xmp"
+        elif fourcc == b"VP8X":
+            kind = "vp8x"
+        elif fourcc in WEBP_IMAGE_CHUNKS:
+            kind = "image"
+        else:
+            kind = "other"
+        yield Segment(kind, offset, size, fourcc)
+        offset += size
+
+
+def _png_xmp_chunk(packet):
+    data = PNG_XMP_KEYWORD + b"\x00" + b"\x00\x00" + b"\x00" + b"\x00" + packet
+    crc = zlib.crc32(b"iTXt" + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + b"iTXt" + data + struct.pack(">I", crc)
+
+
+def _jpeg_xmp_segment(packet):
+    if len(packet) > JPEG_MAX_XMP_SIZE:
+        raise UnsupportedContainer("Paquet XMP trop grand pour un segment APP1 JPEG (XMP étendu)")
+    payload = JPEG_XMP_HEADER + packet
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _webp_chunk(fourcc, data):
+    chunk = fourcc + struct.pack("<I", len(data)) + data
+    if len(data) & 1:
+        chunk += b"\x00"
+    return chunk
+
+
+def _webp_vp8x_from_image(stream, segment):
+    """Construit un chunk VP8X (format étendu) à partir du premier chunk d'image simple"""
+    stream.seek(segment.offset + 8)
+    data = stream.read(10)
+    flags = 0
+    if segment.name == b"VP8L" and len(data) >= 5 and data[0] == 0x2F:
+        bits = int.from_bytes(data[1:5], "little")
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        if (bits >> 28) & 1:
+            flags |= 0x10
+    elif segment.name == b"VP8 " and len(data) >= 10 and data[3:6] == b"\x9d\x01\x2a":
+        width = struct.unpack("<H", data[6:8])[0] & 0x3FFF
+        height = struct.unpack("<H", data[8:10])[0] & 0x3FFF
+    else:
+        raise UnsupportedContainer("Chunk d'image WebP inattendu")
+    flags |= 0x04
+    payload = bytes([flags, 0, 0, 0]) + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    return _webp_chunk(b"VP8X", payload)
+
+
+def build_splice_plan(stream, packet):
+    """
+    Calcule le plan d'écriture d'une copie du fichier avec un nouveau paquet XMP.
+    Le plan est une liste d'éléments ("copy", segment) (bloc recopié tel quel)
+    ou ("data", bytes) (bloc inséré ou modifié). Les anciens paquets XMP sont retirés.
+    """
+    segments = list(iter_segments(stream))
+    header = segments[0]
+    plan = []
+
+    if header.name == b"PNG":
+        plan.append(("copy", header))
+        inserted = False
+        for segment in segments[1:]:
+            if segment.kind == "xmp":
+                continue
+            plan.append(("copy", segment))
+            if not inserted and segment.name == b"IHDR":
+                plan.append(("data", _png_xmp_chunk(packet)))
+                inserted = True
+        if not inserted:
+            raise UnsupportedContainer("Chunk IHDR introuvable")
+
+    elif header.name == b"SOI":
+        if any(segment.kind == "xmp_ext" for segment in segments):
+            # Le nouveau paquet ne reprend que le segment principal: le XMP étendu serait perdu
+            raise UnsupportedContainer("XMP étendu (plusieurs segments APP1) non supporté par le mode natif")
+        plan.append(("copy", header))
+        xmp_segment = _jpeg_xmp_segment(packet)
+        inserted = False
+        for segment in segments[1:]:
+            if segment.kind == "xmp":
+                continue
+            if not inserted and segment.kind not in ("jfif", "exif"):
+                # Le XMP se place après les segments JFIF/EXIF de tête
+                plan.append(("data", xmp_segment))
+                inserted = True
+            plan.append(("copy", segment))
+        if not inserted:
+            plan.append(("data", xmp_segment))
+
+    else:
+        body = []
+        vp8x = next((s for s in segments if s.kind == "vp8x"), None)
+        if vp8x is None:
+            first_image = next((s for s in segments if s.name in (b"VP8 ", b"VP8L")), None)
+            if first_image is None:
+                raise UnsupportedContainer("Aucune donnée d'image WebP trouvée")
+            body.append(("data", _webp_vp8x_from_image(stream, first_image)))
+        for segment in segments[1:]:
+            if segment.kind == "xmp":
+                continue
+            if segment.kind == "vp8x":
+                stream.seek(segment.offset)
+                chunk = bytearray(stream.read(segment.size))
+                chunk[8] |= 0x04  # Drapeau "XMP présent"
+                body.append(("data", bytes(chunk)))
+            else:
+                body.append(("copy", segment))
+        body.append(("data", _webp_chunk(b"XMP ", packet)))
+        riff_size = 4 + sum(len(item) if kind == "data" else item.size for kind, item in body)
+        plan.append(("data", b"RIFF" + struct.pack("<I", riff_size) + b"WEBP"))
+        plan.extend(body)
+
+    return plan
+
+
+def write_plan(src, dst, plan, digest=None):
+    """
+    Exécute un plan d'écriture: recopie les blocs source par morceaux et écrit les blocs
+    insérés. Si `digest` (objet hashlib) est fourni, il est mis à jour avec tous les blocs
+    recopiés (hors en-têtes et XMP), pour vérifier ensuite qu'ils sont intacts.
+    Retourne le nombre d'octets écrits.
+    """
+    written = 0
+    for kind, item in plan:
+        if kind == "data":
+            dst.write(item)
+            written += len(item)
+            continue
+        src.seek(item.offset)
+        remaining = item.size
+        while remaining > 0:
+            block = src.read(min(COPY_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            dst.write(block)
+            if digest is not None and item.kind not in _REWRITTEN_KINDS:
+                digest.update(block)
+            remaining -= len(block)
+            written += len(block)
+    return written
+
+
+def splice_xmp(src, dst, packet, digest=None):
+    """Recopie `src` dans `dst` en remplaçant (ou insérant) le paquet XMP"""
+    plan = build_splice_plan(src, packet)
+    return write_plan(src, dst, plan, digest)
+
+
+def _segment_payload(stream, segment):
+    """Retourne le contenu d'un bloc XMP (sans les en-têtes propres au conteneur)"""
+    if segment.name == b"iTXt":
+        stream.seek(segment.offset + 8)
+        data = stream.read(segment.size - 12)
+        # mot-clé \0, drapeau de compression, méthode, langue \0, mot-clé traduit \0, texte
+        keyword_end = data.index(b"\x00")
+        compressed = data[keyword_end + 1]
+        rest = data[keyword_end + 3:]
+        rest = rest[rest.index(b"\x00") + 1:]
+        text = rest[rest.index(b"\x00") + 1:]
+        return zlib.decompress(text) if compressed else text
+    if segment.name == b"\xe1":
+        stream.seek(segment.offset + 4 + len(JPEG_XMP_HEADER))
+        return stream.read(segment.size - 4 - len(JPEG_XMP_HEADER))
+    # Chunk RIFF "XMP "
+    stream.seek(segment.offset + 4)
+    length = struct.unpack("<I", stream.read(4))[0]
+    return stream.read(length)
+
+
+def read_xmp_packet(stream):
+    """
+    Retourne le premier paquet XMP du fichier (bytes), ou None s'il n'y en a pas.
+    Le parcours s'arrête au premier paquet trouvé: pour un JPEG, seuls les segments
+    de tête sont lus, jamais les données compressées. Lève UnsupportedContainer si
+    le JPEG contient du XMP étendu (le paquet principal seul serait incomplet).
+    """
+    packet = None
+    for segment in iter_segments(stream):
+        if segment.kind == "xmp" and packet is None:
+            packet = _segment_payload(stream, segment)
+            if segment.name != b"\xe1":
+                return packet
+        elif segment.kind == "xmp_ext":
+            raise UnsupportedContainer("XMP étendu (plusieurs segments APP1) non supporté par le mode natif")
+        elif segment.kind == "image" and segment.name in (b"\xda", b"\xd9"):
+            # JPEG: le XMP (principal et étendu) se trouve toujours avant les données d'image
+            return packet
+    return packet
+
+
+def read_xmp_file(path):
+    """Lit le paquet XMP d'un fichier PNG/JPEG/WebP sans décoder l'image"""
+    with open(path, "rb") as stream:
+        return read_xmp_packet(stream)
+
+
+# Blocs qui peuvent légitimement différer entre l'original et la copie réécrite
+_REWRITTEN_KINDS = ("header", "xmp", "xmp_ext", "vp8x")
+
+
+def content_digest(stream, digest):
+    """
+    Met à jour `digest` (objet hashlib) avec tous les blocs du fichier hors en-tête
+    et métadonnées XMP: deux fichiers de même empreinte ont des données d'image
+    (et autres blocs) identiques octet pour octet.
+    """
+    for segment in list(iter_segments(stream)):
+        if segment.kind in _REWRITTEN_KINDS:
+            continue
+        stream.seek(segment.offset)
+        remaining = segment.size
+        while remaining > 0:
+            block = stream.read(min(COPY_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
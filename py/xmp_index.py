@@ -0,0 +1,325 @@
+import os
+import time
+import sqlite3
+import threading
+from .exiftool_manager import ExifToolManager
+from .xmp_container import NATIVE_EXTENSIONS
+from .read_xmp_metadata_batch import IMAGE_EXTENSIONS
+from .atomic_write import is_temp_file
+from .tag_list import subject_tags
+
+# Base d'index par défaut (surchargeable via TOO_XMP_INDEX_DB)
+DEFAULT_INDEX_PATH = os.environ.get("TOO_XMP_INDEX_DB") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xmp_index.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    subject TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    create_date TEXT NOT NULL DEFAULT '',
+    modify_date TEXT NOT NULL DEFAULT '',
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    tag_key TEXT NOT NULL,
+    PRIMARY KEY (tag_key, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_by_path ON tags (path);
+"""
+
+# Chaque ligne FTS porte le rowid de sa ligne `files`: mise à jour et suppression par clé, sans parcours.
+# VACUUM pouvant renuméroter ces rowid, la base n'est jamais compactée.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(subject, description);
+"""
+
+
+def parse_tag_query(expression):
+    """
+    Convertit une expression de tags en clauses (négation, [termes]).
+    Les clauses séparées par des virgules doivent toutes correspondre, les termes
+    séparés par '|' sont des alternatives, une clause préfixée par '-' exclut les
+    images correspondantes, et un terme terminé par '*' est un préfixe.
+    Ex: "portrait, chat | chien, -brouillon, projet:*"
+    """
+    clauses = []
+    for clause in expression.split(","):
+        clause = clause.strip()
+        negate = clause.startswith("-")
+        if negate:
+            clause = clause[1:].strip()
+        terms = [term.strip().lower() for term in clause.split("|") if term.strip()]
+        if terms:
+            clauses.append((negate, terms))
+    return clauses
+
+
+class XMPIndex:
+    """
+    Index SQLite des métadonnées XMP d'une bibliothèque d'images.
+    Les tags (dc:subject) sont stockés un par ligne pour les recherches exactes,
+    et une table FTS5 couvre Subject et Description pour la recherche plein texte.
+    L'indexation est incrémentale: les fichiers dont la taille et la date de
+    modification n'ont pas changé ne sont pas relus.
+    """
+
+    # Index ouverts dans ce processus (chemin de la base -> index), tous mis à jour après une écriture
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        try:
+            self._migrate_fts()
+            self._db.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite compilé sans FTS5: la recherche plein texte utilise LIKE
+            self.has_fts = False
+        self._db.commit()
+
+    def _migrate_fts(self):
+        """
+        Anciennes bases: la table FTS indexée par chemin (colonne path) est reconstruite
+        à partir de `files`, ses lignes étant désormais repérées par le rowid de `files`
+        """
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(files_fts)")]
+        if "path" not in columns:
+            return
+        with self._db:
+            self._db.execute("DROP TABLE files_fts")
+            self._db.executescript(FTS_SCHEMA)
+            self._db.execute(
+                "INSERT INTO files_fts (rowid, subject, description) SELECT rowid, subject, description FROM files")
+
+    @classmethod
+    def open(cls, db_path=None):
+        """Retourne l'index partagé pour cette base (une connexion par fichier)"""
+        db_path = os.path.abspath(db_path or DEFAULT_INDEX_PATH)
+        with cls._instances_lock:
+            index = cls._instances.get(db_path)
+            if index is None:
+                index = cls(db_path)
+                cls._instances[db_path] = index
+            return index
+
+    @classmethod
+    def opened(cls):
+        """Index ouverts dans ce processus (par défaut et via index_path)"""
+        with cls._instances_lock:
+            return list(cls._instances.values())
+
+    @staticmethod
+    def _path_key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def crawl(self, directories, recursive=True, manager=None):
+        """
+        Indexe les images des dossiers donnés. Seuls les fichiers nouveaux ou modifiés
+        (taille / mtime) sont relus, et les fichiers disparus sont retirés de l'index.
+        Retourne des statistiques {"scanned", "updated", "removed"}.
+        """
+        stats = {"scanned": 0, "updated": 0, "removed": 0}
+        for directory in directories:
+            root = self._path_key(directory)
+            if not os.path.isdir(root):
+                # Dossier absent (disque débranché...): ne pas vider son index
+                print(f"/!\\ Dossier introuvable, ignoré: {directory}")
+                continue
+            found = dict(self._scan(root, recursive))
+            stats["scanned"] += len(found)
+
+            known = self._known_files(root, recursive)
+            changed = [path for path, signature in found.items() if known.get(path) != signature]
+            removed = [path for path in known if path not in found]
+
+            stats["updated"] += self.update_files(changed, manager=manager, stats=found)
+            self.remove(removed)
+            stats["removed"] += len(removed)
+        return stats
+
+    def _scan(self, directory, recursive):
+        """Génère (chemin, (taille, mtime_ns)) pour les images d'un dossier"""
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        yield from self._scan(entry.path, recursive)
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and not is_temp_file(entry.name):
+                    stat = entry.stat()
+                    yield self._path_key(entry.path), (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+
+    def _known_files(self, root, recursive):
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+        known = {}
+        for path, size, mtime_ns in rows:
+            if recursive or os.path.dirname(path) == root.rstrip(os.sep):
+                known[path] = (size, mtime_ns)
+        return known
+
+    def update_files(self, paths, manager=None, stats=None):
+        """
+        (Ré)indexe une liste de fichiers. Les PNG/JPEG/WebP sont lus directement,
+        les autres formats par lots ExifTool. Retourne le nombre de fichiers indexés.
+        """
+        rows = self.read_files(paths, manager, stats)
+        self._store(rows)
+        return len(rows)
+
+    @classmethod
+    def read_files(cls, paths, manager=None, stats=None):
+        """Lit les fichiers à indexer: liste de (chemin, (taille, mtime_ns), métadonnées)"""
+        paths = [cls._path_key(path) for path in paths]
+        if not paths:
+            return []
+        manager = manager or ExifToolManager()
+
+        # Les tags sont lus en liste (un tag peut contenir une virgule)
+        native = [path for path in paths if os.path.splitext(path)[1].lower() in NATIVE_EXTENSIONS]
+        others = [path for path in paths if os.path.splitext(path)[1].lower() not in NATIVE_EXTENSIONS]
+        results = [(path, manager.extract_metadata(path, backend="auto", keep_lists=True)) for path in native]
+        if others:
+            results.extend(manager.iter_many(others, keep_lists=True))
+
+        rows = []
+        for path, metadata in results:
+            if "error" in metadata:
+                continue
+            signature = (stats or {}).get(path)
+            if signature is None:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+            rows.append((path, signature, metadata))
+        return rows
+
+    def _store(self, rows):
+        now = time.time()
+        with self._lock, self._db:
+            for path, (size, mtime_ns), metadata in rows:
+                tag_list = subject_tags(metadata.get("Subject", ""))
+                subject = ", ".join(tag_list)
+                description = metadata.get("Description", "")
+                self._delete_locked(path)
+                cursor = self._db.execute(
+                    "INSERT INTO files (path, size, mtime_ns, subject, description, create_date, modify_date, indexed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, subject, description,
+                     metadata.get("Create Date", ""), metadata.get("Modify Date", ""), now),
+                )
+                tags = {tag.lower(): tag for tag in tag_list}
+                self._db.executemany(
+                    "INSERT INTO tags (path, tag, tag_key) VALUES (?, ?, ?)",
+                    [(path, tag, tag_key) for tag_key, tag in tags.items()],
+                )
+                if self.has_fts:
+                    self._db.execute(
+                        "INSERT INTO files_fts (rowid, subject, description) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, subject, description),
+                    )
+
+    def _delete_locked(self, path):
+        if self.has_fts:
+            row = self._db.execute("SELECT rowid FROM files WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                self._db.execute("DELETE FROM files_fts WHERE rowid = ?", row)
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._db.execute("DELETE FROM tags WHERE path = ?", (path,))
+
+    def remove(self, paths):
+        """Retire des fichiers de l'index"""
+        if not paths:
+            return
+        with self._lock, self._db:
+            for path in paths:
+                self._delete_locked(self._path_key(path))
+
+    def query_tags(self, expression, limit=1000):
+        """Retourne les chemins dont les tags correspondent à l'expression (voir parse_tag_query)"""
+        clauses = parse_tag_query(expression)
+        if not clauses:
+            return []
+
+        conditions = []
+        params = []
+        for negate, terms in clauses:
+            matches = []
+            for term in terms:
+                if term.endswith("*"):
+                    # Préfixe: bornes de l'intervalle, pour profiter de l'index sur tag_key
+                    prefix = term[:-1]
+                    matches.append("(tag_key >= ? AND tag_key < ?)")
+                    params.extend([prefix, prefix + "\U0010ffff"])
+                else:
+                    matches.append("tag_key = ?")
+                    params.append(term)
+            operator = "NOT IN" if negate else "IN"
+            conditions.append(f"path {operator} (SELECT path FROM tags WHERE {' OR '.join(matches)})")
+
+        sql = f"SELECT path FROM files WHERE {' AND '.join(conditions)} ORDER BY path LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, params)]
+
+    def query_text(self, expression, limit=1000):
+        """Recherche plein texte (syntaxe FTS5) dans les tags et descriptions"""
+        expression = expression.strip()
+        if not expression:
+            return []
+        with self._lock:
+            if self.has_fts:
+                sql = ("SELECT files.path FROM files_fts JOIN files ON files.rowid = files_fts.rowid"
+                       " WHERE files_fts MATCH ? ORDER BY files_fts.rank LIMIT ?")
+                return [row[0] for row in self._db.execute(sql, (expression, int(limit)))]
+            pattern = f"%{expression}%"
+            sql = "SELECT path FROM files WHERE subject LIKE ? OR description LIKE ? ORDER BY path LIMIT ?"
+            return [row[0] for row in self._db.execute(sql, (pattern, pattern, int(limit)))]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def update_index(paths, manager=None):
+    """
+    Met à jour les index après une écriture (appelé par les nœuds d'écriture): tous les
+    index ouverts dans ce processus (QueryXMPIndex, y compris avec index_path), et l'index
+    par défaut s'il existe. Les fichiers ne sont lus qu'une fois pour tous les index.
+    Ne fait rien tant qu'aucun index n'a été créé, pour ne pas ajouter de coût aux
+    utilisateurs qui ne s'en servent pas.
+    """
+    try:
+        if os.path.exists(DEFAULT_INDEX_PATH):
+            XMPIndex.open(DEFAULT_INDEX_PATH)
+        indexes = XMPIndex.opened()
+        if not indexes:
+            return
+        rows = XMPIndex.read_files(paths, manager)
+        for index in indexes:
+            index._store(rows)
+    except Exception as e:
+        print(f"/!\\ Mise à jour de l'index XMP impossible: {e}")
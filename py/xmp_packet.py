@@ -0,0 +1,337 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+# Espaces de noms XMP connus, indexés par préfixe
+NAMESPACES = {
+    "x": "adobe:ns:meta/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "xml": "http://www.w3.org/XML/1998/namespace",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "xmp": "http://ns.adobe.com/xap/1.0/",
+    "xmpMM": "http://ns.adobe.com/xap/1.0/mm/",
+    "xmpRights": "http://ns.adobe.com/xap/1.0/rights/",
+    "photoshop": "http://ns.adobe.com/photoshop/1.0/",
+    "lr": "http://ns.adobe.com/lightroom/1.0/",
+    "exif": "http://ns.adobe.com/exif/1.0/",
+    "tiff": "http://ns.adobe.com/tiff/1.0/",
+    "digiKam": "http://www.digikam.org/ns/1.0/",
+    "MicrosoftPhoto": "http://ns.microsoft.com/photo/1.0/",
+}
+
+# Type des propriétés tableau (les autres sont des valeurs simples)
+ARRAY_TYPES = {
+    "dc:subject": "Bag",
+    "dc:creator": "Seq",
+    "dc:contributor": "Bag",
+    "dc:publisher": "Bag",
+    "dc:language": "Bag",
+    "dc:type": "Bag",
+    "dc:date": "Seq",
+    "dc:description": "Alt",
+    "dc:title": "Alt",
+    "dc:rights": "Alt",
+    "lr:hierarchicalSubject": "Bag",
+    "digiKam:TagsList": "Seq",
+    "MicrosoftPhoto:LastKeywordXMP": "Bag",
+    "xmpRights:UsageTerms": "Alt",
+}
+
+# Noms de propriétés XMP qui commencent par une minuscule hors de l'espace "dc"
+LOWERCASE_PROPERTIES = {"lr:hierarchicalSubject"}
+
+# Propriétés de date (format XMP ISO 8601, format ExifTool "AAAA:MM:JJ HH:MM:SS")
+DATE_PROPERTIES = {"xmp:CreateDate", "xmp:ModifyDate", "xmp:MetadataDate", "photoshop:DateCreated"}
+
+XMP_TOOLKIT = "comfyui-too-xmp-metadata"
+PACKET_ID = "W5M0MpCehiHzreSzNTczkc9d"
+
+RDF = "{%s}" % NAMESPACES["rdf"]
+_LANG_ATTR = "{%s}lang" % NAMESPACES["xml"]
+
+for _prefix, _uri in NAMESPACES.items():
+    if _prefix != "xml":
+        ET.register_namespace(_prefix, _uri)
+
+
+class UnsupportedXMPField(ValueError):
+    """Champ que l'écriture XMP native ne sait pas traiter (l'appelant repasse par ExifTool)"""
+
+
+def property_from_tag(tag):
+    """
+    Convertit un nom de tag ExifTool ("XMP-dc:Subject", "dc:Subject", "Subject")
+    en nom qualifié de propriété XMP ("dc:subject").
+    """
+    tag = tag.strip().lstrip("-")
+    if ":" in tag:
+        group, name = tag.rsplit(":", 1)
+        if group.upper().startswith("XMP-"):
+            group = group[4:]
+        elif group.upper() == "XMP":
+            group = "dc" if name.lower() in ("subject", "description", "title", "creator", "rights") else "xmp"
+    else:
+        group, name = "dc", tag
+
+    prefix = next((p for p in NAMESPACES if p.lower() == group.lower()), None)
+    if prefix is None or prefix in ("x", "rdf", "xml"):
+        raise UnsupportedXMPField(f"Espace de noms XMP inconnu: {tag}")
+
+    qname = f"{prefix}:{name}"
+    lower_qname = f"{prefix}:{name[:1].lower()}{name[1:]}"
+    if prefix == "dc" or lower_qname in LOWERCASE_PROPERTIES:
+        return lower_qname
+    return qname
+
+
+def to_xmp_date(value):
+    """Convertit une date au format ExifTool ("2024:01:31 12:00:00") au format XMP"""
+    match = re.match(r"^(\d{4}):(\d{2}):(\d{2})(?:[ T](\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?))?(.*)$", value.strip())
+    if not match:
+        return value
+    year, month, day, time_part, zone = match.groups()
+    result = f"{year}-{month}-{day}"
+    if time_part:
+        result += f"T{time_part}{zone.strip()}"
+    return result
+
+
+def from_xmp_date(value):
+    """Convertit une date XMP ("2024-01-31T12:00:00") au format affiché par ExifTool"""
+    match = re.match(r"^(\d{4})-(\d{2})-(\d{2})(?:T(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?))?(.*)$", value.strip())
+    if not match:
+        return value
+    year, month, day, time_part, zone = match.groups()
+    result = f"{year}:{month}:{day}"
+    if time_part:
+        if time_part.count(":") == 1:
+            time_part += ":00"
+        result += f" {time_part}{zone.strip()}"
+    return result
+
+
+def _clark(qname):
+    prefix, name = qname.split(":", 1)
+    return "{%s}%s" % (NAMESPACES[prefix], name)
+
+
+class XMPDocument:
+    """
+    Paquet XMP modifiable. Les propriétés non touchées (y compris d'espaces de noms
+    inconnus) sont conservées telles quelles lors de la réécriture.
+    """
+
+    def __init__(self, root=None):
+        if root is None:
+            root = ET.Element(_clark("x:xmpmeta"), {_clark("x:xmptk"): XMP_TOOLKIT})
+            ET.SubElement(root, RDF + "RDF")
+        self.root = root
+
+    @classmethod
+    def parse(cls, data):
+        """Construit un document depuis un paquet XMP (bytes ou str)"""
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        # Retirer les instructions <?xpacket?> et le BOM éventuel
+        data = re.sub(r"<\?xpacket[^>]*\?>", "", data).strip().lstrip("\ufeff")
+        if not data:
+            return cls()
+        root = None
+        for event, item in ET.iterparse(io.StringIO(data), events=("start", "start-ns")):
+            if event == "start-ns":
+                # Conserver les préfixes d'origine des espaces de noms à la réécriture
+                prefix, uri = item
+                if prefix and uri not in NAMESPACES.values() and not re.match(r"ns\d+$", prefix):
+                    ET.register_namespace(prefix, uri)
+            elif root is None:
+                root = item
+        if root.tag == RDF + "RDF":
+            wrapper = ET.Element(_clark("x:xmpmeta"), {_clark("x:xmptk"): XMP_TOOLKIT})
+            wrapper.append(root)
+            root = wrapper
+        return cls(root)
+
+    def _rdf(self):
+        rdf = self.root.find(RDF + "RDF")
+        if rdf is None:
+            rdf = ET.SubElement(self.root, RDF + "RDF")
+        return rdf
+
+    def _descriptions(self):
+        return self._rdf().findall(RDF + "Description")
+
+    def _main_description(self):
+        descriptions = self._descriptions()
+        if descriptions:
+            return descriptions[0]
+        return ET.SubElement(self._rdf(), RDF + "Description", {RDF + "about": ""})
+
+    def get(self, qname):
+        """Retourne la valeur d'une propriété: liste pour les tableaux, texte sinon, None si absente"""
+        key = _clark(qname)
+        for description in self._descriptions():
+            if key in description.attrib:
+                return description.attrib[key]
+            element = description.find(key)
+            if element is not None:
+                container = next(iter(element), None)
+                if container is not None and container.tag in (RDF + "Bag", RDF + "Seq", RDF + "Alt"):
+                    items = [li.text or "" for li in container.findall(RDF + "li")]
+                    if container.tag == RDF + "Alt":
+                        return items[0] if items else ""
+                    return items
+                return element.text or ""
+        return None
+
+    def delete(self, qname):
+        """Supprime une propriété de toutes les descriptions RDF"""
+        key = _clark(qname)
+        for description in self._descriptions():
+            description.attrib.pop(key, None)
+            for element in description.findall(key):
+                description.remove(element)
+
+    def set(self, qname, value):
+        """Définit une propriété (liste pour les tableaux Bag/Seq, texte sinon)"""
+        self.delete(qname)
+        if value is None:
+            return
+        description = self._main_description()
+        element = ET.SubElement(description, _clark(qname))
+        array_type = ARRAY_TYPES.get(qname)
+        if array_type is None:
+            if isinstance(value, (list, tuple)):
+                value = ", ".join(str(v) for v in value)
+            element.text = str(value)
+            return
+
+        container = ET.SubElement(element, RDF + array_type)
+        if array_type == "Alt":
+            text = ", ".join(str(v) for v in value) if isinstance(value, (list, tuple)) else str(value)
+            li = ET.SubElement(container, RDF + "li", {_LANG_ATTR: "x-default"})
+            li.text = text
+        else:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for item in values:
+                li = ET.SubElement(container, RDF + "li")
+                li.text = str(item)
+
+    def apply_edits(self, edits):
+        """
+        Applique une liste d'éditions (tag, opération, valeur) au format ExifTool:
+        "=" remplace (valeur vide = suppression), "+=" ajoute à une liste, "-=" retire d'une liste.
+        Lève UnsupportedXMPField pour un tag hors des espaces de noms connus.
+        """
+        cleared = set()
+        for tag, operation, value in edits:
+            qname = property_from_tag(tag)
+            if qname in DATE_PROPERTIES and value:
+                value = to_xmp_date(value)
+            is_array = ARRAY_TYPES.get(qname) in ("Bag", "Seq")
+            current = self.get(qname)
+
+            if operation == "=":
+                if not value:
+                    self.delete(qname)
+                elif is_array:
+                    # Comme ExifTool, plusieurs "=" successifs sur une liste ajoutent des éléments
+                    items = current if isinstance(current, list) and qname in cleared else []
+                    self.set(qname, items + [value])
+                else:
+                    self.set(qname, value)
+                cleared.add(qname)
+            elif operation == "+=":
+                if is_array:
+                    items = current if isinstance(current, list) else ([] if current is None else [current])
+                    self.set(qname, items + [value])
+                else:
+                    self.set(qname, value)
+            elif operation == "-=":
+                if is_array and isinstance(current, list):
+                    self.set(qname, [item for item in current if item != value])
+                elif current == value:
+                    self.delete(qname)
+            else:
+                raise UnsupportedXMPField(f"Opération non supportée: {operation}")
+
+    def to_bytes(self, padding=0):
+        """Sérialise le document en paquet XMP complet (avec les instructions xpacket)"""
+        if not self.root.get(_clark("x:xmptk")):
+            self.root.set(_clark("x:xmptk"), XMP_TOOLKIT)
+        body = ET.tostring(self.root, encoding="unicode")
+        packet = (f'<?xpacket begin="\ufeff" id="{PACKET_ID}"?>\n'
+                  f"{body}\n"
+                  f"{' ' * padding}"
+                  '<?xpacket end="w"?>')
+        return packet.encode("utf-8")
+
+
+def _qname_from_clark(tag):
+    """Convertit "{uri}nom" en "préfixe:nom" (l'URI est conservée si le préfixe est inconnu)"""
+    if not tag.startswith("{"):
+        return tag
+    uri, name = tag[1:].split("}", 1)
+    prefix = _PREFIXES.get(uri)
+    return f"{prefix}:{name}" if prefix else tag
+
+
+_PREFIXES = {uri: prefix for prefix, uri in NAMESPACES.items()}
+
+
+def read_properties(data, wanted=None, chunk_size=4096):
+    """
+    Extrait les propriétés d'un paquet XMP avec un parseur XML incrémental.
+    Retourne un dict {"préfixe:nom": valeur} (liste pour Bag/Seq, texte sinon).
+    Si `wanted` est fourni, l'analyse s'arrête dès que toutes ces propriétés sont lues.
+    """
+    wanted = set(wanted) if wanted else None
+    properties = {}
+    parser = ET.XMLPullParser(events=("start", "end"))
+    description_tag = RDF + "Description"
+    depth_stack = []
+    current = None
+    items = None
+    array_type = None
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    # Le parseur XML refuse les octets parasites éventuels avant le paquet
+    start = data.find(b"<")
+    data = data[start:] if start > 0 else data
+
+    for offset in range(0, len(data), chunk_size):
+        parser.feed(data[offset:offset + chunk_size])
+        for event, element in parser.read_events():
+            if event == "start":
+                parent = depth_stack[-1] if depth_stack else None
+                depth_stack.append(element.tag)
+                if element.tag == description_tag:
+                    # Propriétés simples écrites en attributs de rdf:Description
+                    for key, value in element.attrib.items():
+                        qname = _qname_from_clark(key)
+                        if not qname.startswith(("rdf:", "x:", "{")):
+                            properties[qname] = value
+                elif parent == description_tag:
+                    current = _qname_from_clark(element.tag)
+                    items = None
+                    array_type = None
+                elif current is not None and element.tag in (RDF + "Bag", RDF + "Seq", RDF + "Alt"):
+                    items = []
+                    array_type = element.tag
+            else:
+                depth_stack.pop()
+                if current is None:
+                    continue
+                if element.tag == RDF + "li" and items is not None:
+                    items.append(element.text or "")
+                elif depth_stack and depth_stack[-1] == description_tag:
+                    if items is not None:
+                        value = (items[0] if items else "") if array_type == RDF + "Alt" else items
+                    else:
+                        value = (element.text or "").strip()
+                    properties[current] = value
+                    current = None
+                    element.clear()
+                    if wanted is not None and wanted.issubset(properties):
+                        return properties
+    return properties
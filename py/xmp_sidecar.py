@@ -0,0 +1,87 @@
+import os
+import xml.etree.ElementTree as ET
+from .xmp_packet import XMPDocument, read_properties
+from .xmp_container import NATIVE_EXTENSIONS, UnsupportedContainer, read_xmp_file
+from .atomic_write import AtomicOutputs
+
+
+class InvalidSidecar(ValueError):
+    """Sidecar existant qui n'est pas du XML bien formé (modifié à la main, tronqué...)"""
+
+
+def sidecar_path(image_path, sidecar_directory=""):
+    """
+    Chemin du fichier sidecar d'une image: `<nom>.xmp` à côté de l'original, ou, si
+    `sidecar_directory` est fourni, dans une arborescence miroir sous ce dossier
+    (ex: D:/photos/2024/a.jpg -> <sidecar_directory>/D/photos/2024/a.xmp).
+    """
+    base, _ = os.path.splitext(os.path.abspath(image_path))
+    if not sidecar_directory:
+        return f"{base}.xmp"
+    drive, rest = os.path.splitdrive(base)
+    relative = os.path.join(drive.replace(":", ""), rest.lstrip("\\/"))
+    return os.path.join(os.path.abspath(sidecar_directory), f"{relative}.xmp")
+
+
+def find_sidecar(image_path, sidecar_directory=""):
+    """Retourne le chemin du sidecar existant (miroir en priorité), ou None"""
+    candidates = []
+    if sidecar_directory:
+        candidates.append(sidecar_path(image_path, sidecar_directory))
+    candidates.append(sidecar_path(image_path))
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def read_sidecar_properties(image_path, sidecar_directory=""):
+    """Propriétés XMP du sidecar de l'image ({"préfixe:nom": valeur}), ou None s'il n'existe pas"""
+    path = find_sidecar(image_path, sidecar_directory)
+    if path is None:
+        return None
+    with open(path, "rb") as sidecar_file:
+        return read_properties(sidecar_file.read())
+
+
+def write_sidecar(image_path, edits, sidecar_directory="", merge=True, document=None):
+    """
+    Crée ou met à jour le sidecar `.xmp` d'une image en appliquant les éditions
+    (tag, opération, valeur). Un sidecar existant est fusionné; sinon, le nouveau
+    sidecar reprend le XMP intégré à l'image (PNG/JPEG/WebP) pour rester complet.
+    Avec merge=False, le sidecar est réécrit à partir des seules éditions, appliquées
+    au document XMP fourni s'il y en a un.
+    Un sidecar existant mal formé n'est jamais écrasé (InvalidSidecar); un XMP intégré
+    mal formé est ignoré, le sidecar partant alors d'un document vide.
+    Retourne le chemin du sidecar écrit.
+    """
+    path = sidecar_path(image_path, sidecar_directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Lecture, fusion et écriture sous le verrou du sidecar; il est remplacé d'un coup (renommage)
+    with AtomicOutputs([path]) as outputs:
+        existing = find_sidecar(image_path, sidecar_directory) if merge else None
+
+        if existing is not None:
+            with open(existing, "rb") as sidecar_file:
+                try:
+                    document = XMPDocument.parse(sidecar_file.read())
+                except ET.ParseError as e:
+                    raise InvalidSidecar(f"Sidecar XMP mal formé, non modifié: {existing} ({e})")
+        elif merge and os.path.splitext(image_path)[1].lower() in NATIVE_EXTENSIONS:
+            try:
+                packet = read_xmp_file(image_path)
+                if packet:
+                    document = XMPDocument.parse(packet)
+            except (OSError, UnsupportedContainer):
+                document = None
+            except ET.ParseError as e:
+                print(f"/!\\ XMP intégré mal formé, ignoré pour le sidecar de {image_path} ({e})")
+                document = None
+        if document is None:
+            document = XMPDocument()
+
+        document.apply_edits(edits)
+
+        with open(outputs.temp(path), "wb") as sidecar_file:
+            sidecar_file.write(document.to_bytes())
+    return path
@@ -0,0 +1,388 @@
+import os
+import json
+import atexit
+import time
+import queue
+import fnmatch
+import hashlib
+import threading
+from .exiftool_manager import ExifToolManager
+from .read_xmp_metadata_batch import IMAGE_EXTENSIONS
+from .write_xmp_metadata_lossless import WriteXMPMetadataLossless
+from .xmp_index import update_index
+from .atomic_write import is_temp_file
+
+# Dossier des points de reprise (un fichier JSON par ensemble de dossiers surveillés)
+CHECKPOINT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "watch_checkpoints")
+
+
+def parse_tag_rules(rules_spec):
+    """
+    Lit les règles de tags, une par ligne: `motif => tag1, tag2`.
+    Le motif (fnmatch) est comparé au nom du fichier et à son chemin relatif au
+    dossier surveillé, ex: `*.png => généré`, `portraits/* => portrait, humain`.
+    Les lignes vides ou commençant par # sont ignorées.
+    """
+    rules = []
+    for line in rules_spec.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=>" not in line:
+            continue
+        pattern, _, tags = line.partition("=>")
+        pattern = pattern.strip()
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+        if pattern and tags:
+            rules.append((pattern, tags))
+    return rules
+
+
+def _watchdog_observer(watcher):
+    """
+    Observateur watchdog qui transmet les événements (création, modification, déplacement)
+    au watcher, ou None si watchdog n'est pas installé (surveillance par scrutation).
+    watchdog n'est importé qu'au démarrage d'une surveillance, jamais au chargement des nœuds.
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class EventHandler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                watcher.notify(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                watcher.notify(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                watcher.notify(event.dest_path)
+
+    observer = Observer()
+    handler = EventHandler()
+    for directory in watcher.directories:
+        observer.schedule(handler, directory, recursive=watcher.recursive)
+    return observer
+
+
+class DirectoryWatcher:
+    """
+    Surveille des dossiers et applique des règles de tags aux images nouvelles ou modifiées.
+    Les événements (watchdog, ou scrutation périodique à défaut) sont regroupés pendant
+    `debounce` secondes par fichier, puis envoyés dans une file bornée traitée par
+    `workers` threads. Chaque fichier traité est noté dans un point de reprise JSON
+    (taille, mtime): après un redémarrage, seuls les fichiers nouveaux ou modifiés
+    depuis sont traités.
+    """
+
+    def __init__(self, directories, rules, recursive=True, debounce=2.0, workers=2, queue_size=1000,
+                 poll_interval=5.0, metadata_type="Subject", write_mode="Add to existing",
+                 write_method="Splice", output_mode="Tagged copy", checkpoint_path=None):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.rules = rules
+        self.recursive = recursive
+        self.debounce = debounce
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.metadata_type = metadata_type
+        self.write_mode = write_mode
+        self.write_method = write_method
+        self.output_mode = output_mode
+        self.checkpoint_path = checkpoint_path or self.default_checkpoint_path(self.directories)
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._checkpoint = {}
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint_dirty = False
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+        self._snapshot = {}
+        self.stats = {"queued": 0, "tagged": 0, "indexed": 0, "errors": 0}
+
+    @staticmethod
+    def default_checkpoint_path(directories):
+        key = "\n".join(sorted(os.path.normcase(directory) for directory in directories))
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(CHECKPOINT_DIRECTORY, f"{digest}.json")
+
+    def is_running(self):
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self):
+        """Charge le point de reprise, met en file les fichiers modifiés depuis, puis démarre la surveillance"""
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._load_checkpoint()
+
+        # Rattrapage: tout ce qui a changé pendant l'arrêt
+        self._snapshot = self._scan_all()
+        with self._checkpoint_lock:
+            changed = [path for path, signature in self._snapshot.items()
+                       if self._checkpoint.get(path) != list(signature)]
+        for path in changed:
+            self.notify(path)
+
+        self._threads = [threading.Thread(target=self._debounce_loop, name="xmp-watch-debounce", daemon=True)]
+        for index in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker_loop, name=f"xmp-watch-worker-{index}", daemon=True))
+
+        self._observer = _watchdog_observer(self)
+        if self._observer is not None:
+            self._observer.start()
+        else:
+            self._threads.append(threading.Thread(target=self._poll_loop, name="xmp-watch-poll", daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+        print(f"[OK] Surveillance XMP démarrée ({'watchdog' if self._observer else 'scrutation'}): "
+              f"{', '.join(self.directories)} - {len(changed)} fichier(s) à traiter")
+
+    def stop(self):
+        """Arrête la surveillance et enregistre le point de reprise"""
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+        self._save_checkpoint()
+
+    def notify(self, path):
+        """Signale un fichier nouveau ou modifié (regroupé avec les événements suivants)"""
+        if not self._is_candidate(path):
+            return
+        with self._pending_lock:
+            self._pending[path] = time.monotonic()
+
+    def _is_candidate(self, path):
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS or is_temp_file(path):
+            return False
+        # Les copies écrites par le nœud Lossless ne doivent pas être retraitées
+        return "tagged" not in os.path.dirname(os.path.abspath(path)).split(os.path.sep)
+
+    def _scan_all(self):
+        snapshot = {}
+        for directory in self.directories:
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [name for name in dirs if name != "tagged"] if self.recursive else []
+                for name in files:
+                    path = os.path.join(root, name)
+                    if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS or is_temp_file(name):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _poll_loop(self):
+        """Repli sans watchdog: compare périodiquement l'état des dossiers"""
+        while not self._stop.wait(self.poll_interval):
+            snapshot = self._scan_all()
+            for path, signature in snapshot.items():
+                if self._snapshot.get(path) != signature:
+                    self.notify(path)
+            self._snapshot = snapshot
+
+    def _debounce_loop(self):
+        """Envoie dans la file les fichiers sans nouvel événement depuis `debounce` secondes"""
+        last_save = time.monotonic()
+        while not self._stop.wait(min(0.5, self.debounce or 0.5)):
+            now = time.monotonic()
+            with self._pending_lock:
+                ready = [path for path, last_event in self._pending.items() if now - last_event >= self.debounce]
+            for path in ready:
+                try:
+                    # File pleine: le fichier reste en attente jusqu'au prochain passage
+                    self._queue.put_nowait(path)
+                except queue.Full:
+                    break
+                with self._pending_lock:
+                    if self._pending.get(path, now) <= now - self.debounce:
+                        del self._pending[path]
+                self.stats["queued"] += 1
+            if now - last_save >= 5.0:
+                self._save_checkpoint()
+                last_save = now
+
+    def _worker_loop(self):
+        manager = ExifToolManager()
+        while not self._stop.is_set():
+            try:
+                path = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.process(path, manager)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"/!\\ Surveillance XMP: échec pour {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def tags_for(self, path):
+        """Tags des règles correspondant au fichier (nom ou chemin relatif), sans doublons"""
+        name = os.path.basename(path)
+        relative = name
+        for directory in self.directories:
+            if os.path.abspath(path).startswith(directory + os.sep):
+                relative = os.path.relpath(path, directory).replace(os.sep, "/")
+                break
+        tags = []
+        for pattern, rule_tags in self.rules:
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative, pattern):
+                tags.extend(tag for tag in rule_tags if tag not in tags)
+        return tags
+
+    def process(self, path, manager=None):
+        """Applique les règles à un fichier, ou met simplement à jour le cache et l'index"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._checkpoint_lock:
+            if self._checkpoint.get(path) == signature:
+                return
+
+        manager = manager or ExifToolManager()
+        tags = self.tags_for(path)
+        if tags:
+            result = WriteXMPMetadataLossless().write_xmp(
+                path, ", ".join(tags), self.metadata_type, self.write_mode,
+                write_method=self.write_method, output_mode=self.output_mode)[0]
+            if result.startswith("Erreur"):
+                self.stats["errors"] += 1
+                return
+            self.stats["tagged"] += 1
+        else:
+            # Aucune règle: préchauffer le cache de lecture et l'index
+            manager.extract_metadata(path, backend="auto")
+            update_index([path], manager)
+            self.stats["indexed"] += 1
+
+        with self._checkpoint_lock:
+            self._checkpoint[path] = signature
+            self._checkpoint_dirty = True
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            data = {}
+        with self._checkpoint_lock:
+            self._checkpoint = data.get("files", {})
+            self._checkpoint_dirty = False
+
+    def _save_checkpoint(self):
+        """Écrit le point de reprise (fichier temporaire puis remplacement atomique)"""
+        with self._checkpoint_lock:
+            if not self._checkpoint_dirty:
+                return
+            data = {"directories": self.directories, "saved_at": time.time(), "files": dict(self._checkpoint)}
+            self._checkpoint_dirty = False
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(data, checkpoint_file, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def status(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        state = "active" if self.is_running() else "arrêtée"
+        return (f"Surveillance {state}: {pending} en attente, {self._queue.qsize()} en file, "
+                f"{self.stats['tagged']} taggé(s), {self.stats['indexed']} indexé(s), {self.stats['errors']} erreur(s)")
+
+
+class WatchXMPDirectory:
+    # Surveillances actives du processus, par ensemble de dossiers
+    _watchers = {}
+    _watchers_lock = threading.Lock()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "directories": ("STRING", {"multiline": True, "default": ""}),
+                "rules": ("STRING", {"multiline": True, "default": "*.png => generated"}),
+                "action": (["Start", "Stop", "Status"], {"default": "Start"}),
+            },
+            "optional": {
+                "metadata_type": (["Subject", "Description"], {"default": "Subject"}),
+                "write_mode": (["Add to existing", "Replace all"], {"default": "Add to existing"}),
+                "output_mode": (["Tagged copy", "Sidecar (.xmp)"], {"default": "Tagged copy"}),
+                "recursive": ("BOOLEAN", {"default": True}),
+                "debounce": ("FLOAT", {"default": 2.0, "min": 0.0, "max": 600.0, "step": 0.5}),
+                "workers": ("INT", {"default": 2, "min": 1, "max": 32}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("status",)
+    FUNCTION = "watch"
+    CATEGORY = "too/xmp-metadata"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def stop_all(cls):
+        """Arrête toutes les surveillances (appelé à la sortie pour enregistrer les points de reprise)"""
+        with cls._watchers_lock:
+            watchers = list(cls._watchers.values())
+            cls._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Le statut évolue en arrière-plan: toujours ré-exécuter
+        return float("nan")
+
+    def watch(self, directories, rules, action, metadata_type="Subject", write_mode="Add to existing",
+              output_mode="Tagged copy", recursive=True, debounce=2.0, workers=2):
+        """
+        Démarre, arrête ou interroge une surveillance de dossiers en arrière-plan.
+        Les images nouvelles ou modifiées reçoivent les tags des règles correspondantes
+        (`motif => tag1, tag2`, une règle par ligne) via la logique du nœud Lossless;
+        les autres sont simplement ajoutées au cache de lecture et à l'index.
+        """
+        roots = [line.strip().strip('"') for line in directories.splitlines() if line.strip()]
+        missing = [root for root in roots if not os.path.isdir(root)]
+        if not roots or missing:
+            return (f"Erreur: dossier introuvable - {', '.join(missing) or '(aucun)'}",)
+        key = tuple(sorted(os.path.normcase(os.path.abspath(root)) for root in roots))
+
+        with self._watchers_lock:
+            watcher = self._watchers.get(key)
+            if action == "Stop":
+                if watcher is None:
+                    return ("Aucune surveillance active pour ces dossiers",)
+                watcher.stop()
+                del self._watchers[key]
+                return (watcher.status(),)
+            if action == "Status":
+                return (watcher.status() if watcher else "Aucune surveillance active pour ces dossiers",)
+
+            if watcher is not None:
+                # Redémarrer avec les nouveaux réglages (le point de reprise est conservé)
+                watcher.stop()
+            watcher = DirectoryWatcher(roots, parse_tag_rules(rules), recursive=recursive, debounce=debounce,
+                                       workers=workers, metadata_type=metadata_type, write_mode=write_mode,
+                                       output_mode=output_mode)
+            watcher.start()
+            self._watchers[key] = watcher
+            return (watcher.status(),)
+
+
+atexit.register(WatchXMPDirectory.stop_all)
@@ -0,0 +1,10 @@
+import os
+import sys
+import types
+
+# ComfyUI charge le dossier du nœud comme un paquet: on fait de même sous un nom fixe
+# (le nom "py" du sous-dossier est déjà pris par le module de compatibilité de pytest)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package = types.ModuleType("too_xmp_metadata")
+package.__path__ = [ROOT]
+sys.modules.setdefault("too_xmp_metadata", package)
@@ -0,0 +1,20 @@
+import io
+
+from PIL import Image
+
+from too_xmp_metadata.py.xmp_container import splice_xmp
+from too_xmp_metadata.py.xmp_packet import XMPDocument
+
+
+def write_image(path, edits=None, packet=None, size=(8, 8)):
+    """Écrit une petite image (format selon l'extension) avec un paquet XMP construit par `edits`"""
+    encoded = io.BytesIO()
+    Image.new("RGB", size, (120, 60, 30)).save(encoded, Image.registered_extensions()[path.suffix.lower()])
+    if packet is None:
+        document = XMPDocument()
+        document.apply_edits(edits or [])
+        packet = document.to_bytes()
+    encoded.seek(0)
+    with open(path, "wb") as output_file:
+        splice_xmp(encoded, output_file, packet)
+    return path
@@ -0,0 +1,21 @@
+import json
+
+from helpers import write_image
+from too_xmp_metadata.py.bulk_writer import BulkWriter
+from too_xmp_metadata.py.xmp_container import read_xmp_file
+from too_xmp_metadata.py.xmp_packet import read_properties
+
+
+def test_same_name_from_two_folders_is_not_overwritten(tmp_path):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        write_image(tmp_path / folder / "x.png")
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text("\n".join(json.dumps({"path": f"{folder}/x.png", "tags": folder}) for folder in ("a", "b")))
+
+    stats = BulkWriter(write_method="Splice", output_directory=str(tmp_path / "out")).run(str(manifest))
+
+    assert (stats["ok"], stats["failed"]) == (1, 1)
+    results = [json.loads(line) for line in open(stats["result_path"], encoding="utf-8")]
+    assert [result["status"] for result in results] == ["ok", "failed"]
+    assert read_properties(read_xmp_file(str(tmp_path / "out" / "x.png")))["dc:subject"] == ["a"]
@@ -0,0 +1,23 @@
+import pytest
+
+from too_xmp_metadata.py.exiftool_manager import ExifToolManager
+
+
+@pytest.mark.parametrize("value, expected", [("", None), ("4", 4), (" 3 ", 3), ("0", None), ("auto", None), ("2.5", None)])
+def test_pool_size_from_environment(monkeypatch, value, expected):
+    monkeypatch.setattr(ExifToolManager, "pool_size", None)
+    monkeypatch.setenv("TOO_XMP_EXIFTOOL_WORKERS", value)
+    assert ExifToolManager.get_pool_size() == expected
+
+
+def test_configured_pool_size_wins(monkeypatch):
+    monkeypatch.setattr(ExifToolManager, "pool_size", 2)
+    monkeypatch.setenv("TOO_XMP_EXIFTOOL_WORKERS", "8")
+    assert ExifToolManager.get_pool_size() == 2
+
+
+@pytest.mark.parametrize("value, expected", [("", 1024), ("64", 64), ("0", 0), ("big", 1024)])
+def test_cache_size_from_environment(monkeypatch, value, expected):
+    monkeypatch.setattr(ExifToolManager, "cache_size", None)
+    monkeypatch.setenv("TOO_XMP_CACHE_SIZE", value)
+    assert ExifToolManager.get_cache_size() == expected
@@ -0,0 +1,19 @@
+from too_xmp_metadata.py.read_xmp_metadata_batch import collect_image_paths
+
+
+def test_glob_keeps_only_images(tmp_path):
+    for name in ["a.png", "b.JPG", ".c.xmptmp-0123456789ab.png", "notes.txt", "a.xmp"]:
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / "sub.png").mkdir()
+
+    # "*" ne couvre pas les fichiers cachés: ".*" vise les temporaires
+    paths = collect_image_paths("\n".join([str(tmp_path / "*"), str(tmp_path / ".*")]))
+
+    assert paths == [str(tmp_path / "a.png"), str(tmp_path / "b.JPG")]
+
+
+def test_directory_and_glob_agree(tmp_path):
+    for name in ["a.png", ".a.xmptmp-0123456789ab.png", "readme.md"]:
+        (tmp_path / name).write_bytes(b"")
+
+    assert collect_image_paths(str(tmp_path)) == collect_image_paths(str(tmp_path / "*"))
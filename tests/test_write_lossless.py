@@ -0,0 +1,42 @@
+from helpers import write_image
+from too_xmp_metadata.py.write_xmp_metadata_lossless import WriteXMPMetadataLossless
+from too_xmp_metadata.py.xmp_container import read_xmp_file
+from too_xmp_metadata.py.xmp_packet import read_properties
+
+CORRUPT_PACKET = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF'
+
+
+def test_splice_falls_back_on_corrupt_packet(tmp_path):
+    image = write_image(tmp_path / "a.png", packet=CORRUPT_PACKET)
+    output = tmp_path / "out.png"
+
+    spliced = WriteXMPMetadataLossless().write_spliced(str(image), str(output), [("XMP-dc:Subject", "+=", "renard")])
+
+    assert spliced is False
+    assert not output.exists()
+
+
+def test_splice_replaces_packet(tmp_path):
+    image = write_image(tmp_path / "a.jpg", [("XMP-dc:Subject", "+=", "renard")])
+    output = tmp_path / "out.jpg"
+
+    spliced = WriteXMPMetadataLossless().write_spliced(str(image), str(output), [("XMP-dc:Subject", "+=", "hibou")])
+
+    assert spliced is True
+    assert b"hibou" in output.read_bytes() and b"renard" in output.read_bytes()
+
+
+def _subject(path):
+    return read_properties(read_xmp_file(str(path)))["dc:subject"]
+
+
+def test_existing_tags_with_commas_are_matched(tmp_path):
+    image = write_image(tmp_path / "a.png", [("XMP-dc:Subject", "+=", "one, two"), ("XMP-dc:Subject", "+=", "three")])
+    node = WriteXMPMetadataLossless()
+    options = dict(write_method="Splice", output_directory=str(tmp_path / "out"), case_insensitive_tags=True)
+
+    output = node.write_xmp(str(image), '"ONE, TWO", four', **options)[0]
+    assert _subject(output) == ["one, two", "three", "four"]
+
+    output = node.write_xmp(str(image), '"One, Two"', write_mode="Delete specified", **options)[0]
+    assert _subject(output) == ["three"]
@@ -0,0 +1,40 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from helpers import write_image
+from too_xmp_metadata.py.write_xmp_tensor import WriteXMPMetadataTensor
+from too_xmp_metadata.py.xmp_container import read_xmp_file
+from too_xmp_metadata.py.xmp_packet import read_properties
+
+CORRUPT_PACKET = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF'
+
+
+def test_source_document_ignores_corrupt_packet(tmp_path):
+    source = write_image(tmp_path / "source.png", packet=CORRUPT_PACKET)
+    node = WriteXMPMetadataTensor()
+
+    assert node._source_document(str(source)).to_bytes() == node._source_document(None).to_bytes()
+    with pytest.raises(ET.ParseError):
+        node._source_document(str(source), strict=True)
+
+
+def test_native_backend_falls_back_on_corrupt_source(tmp_path):
+    source = write_image(tmp_path / "source.png", packet=CORRUPT_PACKET)
+    output_paths = [str(tmp_path / "out.png")]
+
+    pending_paths, pending_arrays = WriteXMPMetadataTensor()._write_native(
+        ["frame"], output_paths, [("XMP-dc:Subject", "+=", "renard")], source_path=str(source))
+
+    assert pending_paths == output_paths and pending_arrays == ["frame"]
+
+
+def test_existing_tags_with_commas_are_kept(tmp_path):
+    torch = pytest.importorskip("torch")
+    source = write_image(tmp_path / "source.png", [("XMP-dc:Subject", "+=", "one, two"), ("XMP-dc:Subject", "+=", "three")])
+
+    output = WriteXMPMetadataTensor().write_xmp(
+        torch.zeros((1, 8, 8, 3)), '"ONE, TWO", four', input_image_path=str(source),
+        output_directory=str(tmp_path / "out"), backend="Native", case_insensitive_tags=True)[0][0]
+
+    assert read_properties(read_xmp_file(output))["dc:subject"] == ["one, two", "three", "four"]
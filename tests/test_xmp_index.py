@@ -0,0 +1,48 @@
+import os
+
+from helpers import write_image
+from too_xmp_metadata.py.xmp_index import XMPIndex
+
+
+def test_reindex_replaces_fts_row(tmp_path):
+    image = write_image(tmp_path / "a.png", [("XMP-dc:Subject", "+=", "renard"), ("XMP-dc:Description", "=", "forêt")])
+    index = XMPIndex(str(tmp_path / "index.db"))
+    index.update_files([str(image)])
+    assert index.query_text("renard") == [os.path.normcase(str(image))]
+
+    write_image(image, [("XMP-dc:Subject", "+=", "hibou")])
+    index.update_files([str(image)])
+
+    assert index.query_text("renard") == []
+    assert index.query_text("hibou") == [os.path.normcase(str(image))]
+    if index.has_fts:
+        assert index._db.execute("SELECT COUNT(*) FROM files_fts").fetchone()[0] == 1
+
+
+def test_remove_deletes_fts_row(tmp_path):
+    image = write_image(tmp_path / "a.png", [("XMP-dc:Subject", "+=", "renard")])
+    index = XMPIndex(str(tmp_path / "index.db"))
+    index.update_files([str(image)])
+    index.remove([str(image)])
+
+    assert index.query_text("renard") == []
+    assert len(index) == 0
+
+
+def test_migrates_path_keyed_fts_table(tmp_path):
+    image = write_image(tmp_path / "a.png", [("XMP-dc:Subject", "+=", "renard")])
+    db_path = str(tmp_path / "index.db")
+    index = XMPIndex(db_path)
+    index.update_files([str(image)])
+    if not index.has_fts:
+        return
+    # Ancien schéma: lignes FTS repérées par une colonne path non indexée
+    with index._db:
+        index._db.execute("DROP TABLE files_fts")
+        index._db.execute("CREATE VIRTUAL TABLE files_fts USING fts5(path UNINDEXED, subject, description)")
+    index._db.close()
+
+    index = XMPIndex(db_path)
+    columns = [row[1] for row in index._db.execute("PRAGMA table_info(files_fts)")]
+    assert "path" not in columns
+    assert index.query_text("renard") == [os.path.normcase(str(image))]
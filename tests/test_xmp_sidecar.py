@@ -0,0 +1,38 @@
+import pytest
+
+from helpers import write_image
+from too_xmp_metadata.py.write_xmp_metadata_lossless import WriteXMPMetadataLossless
+from too_xmp_metadata.py.xmp_sidecar import InvalidSidecar, read_sidecar_properties, write_sidecar
+
+CORRUPT_PACKET = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF'
+
+
+def test_corrupt_sidecar_is_kept(tmp_path):
+    image = write_image(tmp_path / "a.png", [("XMP-dc:Subject", "+=", "renard")])
+    sidecar = tmp_path / "a.xmp"
+    sidecar.write_bytes(CORRUPT_PACKET)
+
+    with pytest.raises(InvalidSidecar):
+        write_sidecar(str(image), [("XMP-dc:Subject", "+=", "hibou")])
+
+    assert sidecar.read_bytes() == CORRUPT_PACKET
+    # Aucun fichier temporaire laissé à côté
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.png", "a.xmp"]
+
+
+def test_corrupt_sidecar_returns_node_error(tmp_path):
+    image = write_image(tmp_path / "a.png", [("XMP-dc:Subject", "+=", "renard")])
+    (tmp_path / "a.xmp").write_bytes(CORRUPT_PACKET)
+
+    result = WriteXMPMetadataLossless().write_xmp(str(image), "hibou", output_mode="Sidecar (.xmp)")
+
+    assert result[0].startswith("Erreur: Sidecar XMP mal formé")
+
+
+def test_corrupt_embedded_packet_starts_empty_sidecar(tmp_path):
+    image = write_image(tmp_path / "a.png", packet=CORRUPT_PACKET)
+
+    path = write_sidecar(str(image), [("XMP-dc:Subject", "+=", "hibou")])
+
+    assert path == str(tmp_path / "a.xmp")
+    assert read_sidecar_properties(str(image))["dc:subject"] == ["hibou"]
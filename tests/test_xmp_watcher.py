@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys, types
+package = types.ModuleType("too_xmp_metadata")
+package.__path__ = [sys.argv[1]]
+sys.modules["too_xmp_metadata"] = package
+import too_xmp_metadata.py.xmp_watcher
+print("watchdog" in sys.modules)
+"""
+
+
+def test_import_does_not_load_watchdog():
+    # Interpréteur neuf: pytest ou un autre test a pu importer watchdog
+    result = subprocess.run([sys.executable, "-c", CHILD, ROOT], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"